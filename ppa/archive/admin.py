@@ -13,6 +13,7 @@ from ppa.archive.models import (
     Cluster,
     Collection,
     DigitizedWork,
+    IndexJob,
     ProtectedWorkFieldFlags,
 )
 from ppa.archive.views import ImportView
@@ -382,6 +383,42 @@ class ClusterAdmin(admin.ModelAdmin):
         )
 
 
+class IndexJobAdmin(admin.ModelAdmin):
+    list_display = ("digwork", "action", "status", "created", "started", "finished")
+    list_filter = ("status", "action")
+    search_fields = ("digwork__source_id",)
+    readonly_fields = (
+        "digwork",
+        "action",
+        "status",
+        "created",
+        "started",
+        "finished",
+        "error",
+    )
+    actions = ["requeue_jobs"]
+
+    def has_add_permission(self, request):
+        # jobs are queued by indexing changes, not created manually
+        return False
+
+    def requeue_jobs(self, request, queryset):
+        """Queue selected jobs to be run again; jobs already
+        queued are not duplicated."""
+        queued = 0
+        for action in queryset.order_by().values_list("action", flat=True).distinct():
+            digworks = DigitizedWork.objects.filter(
+                indexjob__in=queryset.filter(action=action)
+            ).distinct()
+            queued += IndexJob.enqueue(action, digworks)
+        self.message_user(
+            request, "Queued %d indexing job%s." % (queued, "" if queued == 1 else "s")
+        )
+
+    requeue_jobs.short_description = "Queue selected jobs to run again"
+
+
 admin.site.register(DigitizedWork, DigitizedWorkAdmin)
 admin.site.register(Collection, CollectionAdmin)
 admin.site.register(Cluster, ClusterAdmin)
+admin.site.register(IndexJob, IndexJobAdmin)
@@ -1,7 +1,20 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save
 
 from ppa.archive import solr
 
 
 class ArchiveConfig(AppConfig):
     name = "ppa.archive"
+
+    def ready(self):
+        from ppa.archive.models import Collection, SearchRegistry, SourceNote
+
+        # reload search registry when collections or source notes change
+        for model in [Collection, SourceNote]:
+            post_save.connect(SearchRegistry.invalidate, sender=model)
+            post_delete.connect(SearchRegistry.invalidate, sender=model)
+        # check search registry version once per request
+        request_started.connect(SearchRegistry.request_started)
+        request_finished.connect(SearchRegistry.request_finished)
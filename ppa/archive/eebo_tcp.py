@@ -3,12 +3,21 @@ Code for working with EEBO-TCP (Text Creation Partnership) content.
 """
 
 from collections import namedtuple
+import hashlib
+import logging
+import os
 from pathlib import Path
+import pickle
 import string
+import tempfile
+import zlib
 
 from django.conf import settings
+from lxml import etree
 from neuxml import xmlmap
 
+logger = logging.getLogger(__name__)
+
 
 def short_id(volume_id):
     # volume ids in import spreadsheet are in this format: A25820.0001.001
@@ -106,16 +115,17 @@ class Page(MixedText):
     note_marks = ["*", "†", "‡", "§"]
     num_note_marks = len(note_marks)
 
-    def get_note_mark(self, i):
+    @classmethod
+    def get_note_mark(cls, i):
         """Generate a note marker based on note index and :attr:`note_marks`;
         symbols are used in order and then doubled, tripled, etc as needed.
         (Fallback, for use when a note does not have an N attribute.)"""
 
         # use modulo to map to the list of available marks
-        mark_index = i % self.num_note_marks
+        mark_index = i % cls.num_note_marks
         # use division to determine how many times to repeat the mark
-        repeat = int(i / self.num_note_marks) + 1
-        return self.note_marks[mark_index] * repeat
+        repeat = int(i / cls.num_note_marks) + 1
+        return cls.note_marks[mark_index] * repeat
 
     def page_contents(self):
         """generator of text strings between this page beginning tag and
@@ -239,7 +249,7 @@ class Note(TeiXmlObject):
         return f"Note {self.place}"
 
     def __str__(self):
-        return self.text.replace(MixedText.divSider, "")
+        return self.text.replace(MixedText.divider, "")
 
 
 class QuotedPoem(MixedText):
@@ -360,6 +370,169 @@ class QuotedPoem(MixedText):
             yield chunk if has_text(chunk) else ""
 
 
+#: xpath for page beginning tags within the body of a P4 or P5 TCP text
+PAGES_XPATH = "EEBO//TEXT//PB|.//t:text//t:pb"
+
+#: page text and metadata extracted by :class:`PageExtractor`
+PageText = namedtuple("PageText", ["number", "section_type", "content"])
+
+
+class _PageState:
+    """Running state for a single page while :class:`PageExtractor` walks
+    the document; equivalent to the local variables in
+    :meth:`Page.page_contents`."""
+
+    __slots__ = ["index", "has_notes", "text_count", "note_index", "parts", "notes"]
+
+    def __init__(self, index, has_notes):
+        self.index = index
+        self.has_notes = has_notes
+        # number of text nodes encountered since the page beginning tag
+        self.text_count = 0
+        self.note_index = 0
+        self.parts = []
+        self.notes = []
+
+    def add_text(self, text, owner, is_tail, within_note):
+        """Add a text node to this page; returns False when the text
+        marks the beginning of the next page."""
+        if within_note is not None and self.has_notes:
+            note, first_text = within_note
+            if text == first_text:
+                note_mark = note.get("N", Page.get_note_mark(self.note_index))
+                self.parts.append(note_mark)
+                self.notes.append(f"{note_mark} ")
+                self.note_index += 1
+            self.notes.append(text)
+            self.text_count += 1
+            return True
+
+        if is_tail and owner.tag == "GAP":
+            self.parts.append(owner.get("DISP"))
+        if is_tail and owner.tag == "PB" and self.text_count > 0:
+            return False
+
+        self.parts.append(text)
+        self.text_count += 1
+        return True
+
+    def content(self):
+        parts = self.parts
+        if self.notes:
+            parts = parts + ["\n\n"] + self.notes
+        return "".join(parts).replace(MixedText.divider, "")
+
+
+class PageExtractor:
+    """Extract text for all pages of an EEBO-TCP text in a single pass.
+
+    :meth:`Page.page_contents` evaluates ``following::text()`` for every
+    page beginning tag, which makes extracting all the pages in a volume
+    quadratic in document size.  This walks the parsed document once
+    with :func:`lxml.etree.iterwalk`, keeping track of enclosing notes
+    and divisions, and splits text into pages as it goes. Page content
+    is identical to ``str(page)`` for the corresponding :class:`Page`.
+
+    :param tcp_text: :class:`Text` instance
+    """
+
+    def __init__(self, tcp_text):
+        self.node = tcp_text.node
+        #: page beginning elements, in document order
+        self.page_nodes = self.node.xpath(
+            PAGES_XPATH, namespaces=tcp_text.ROOT_NAMESPACES
+        )
+
+    def __len__(self):
+        return len(self.page_nodes)
+
+    def __iter__(self):
+        """Generator of :class:`PageText` for each page, in document order"""
+        page_index = {node: i for i, node in enumerate(self.page_nodes)}
+        # pages only check for notes when there is a NOTE after
+        # the page beginning (see :attr:`MixedText.has_notes`)
+        all_notes = self.node.xpath("//NOTE")
+        last_note = all_notes[-1] if all_notes else None
+        notes_following = last_note is not None
+
+        # pages still collecting text; usually only one, but a page
+        # beginning with no tail text does not end the page before it
+        open_pages = []
+        page_info = {}
+        completed = {}
+        next_page = 0
+
+        # open P4 notes as [element, first text within the note]
+        notes = []
+        # open DIV1 elements, for section type
+        divs = []
+
+        def add_text(text, owner, is_tail):
+            if not text:
+                return
+            for note in notes:
+                if note[1] is None:
+                    note[1] = text
+
+            if not is_tail and owner.tag == P5_TAG.note:
+                within_note = (owner, text)
+            else:
+                within_note = notes[-1] if notes else None
+
+            for state in list(open_pages):
+                if not state.add_text(text, owner, is_tail, within_note):
+                    open_pages.remove(state)
+                    completed[state.index] = state.content()
+
+        for event, el in etree.iterwalk(
+            self.node, events=("start", "end", "comment", "pi")
+        ):
+            if event == "start":
+                if el is last_note:
+                    notes_following = False
+                if el.tag == "NOTE":
+                    notes.append([el, None])
+                elif el.tag == "DIV1":
+                    divs.append(el)
+                add_text(el.text, el, is_tail=False)
+                continue
+
+            if event == "end":
+                if el.tag == "NOTE":
+                    notes.pop()
+                elif el.tag == "DIV1":
+                    divs.pop()
+                if el in page_index:
+                    index = page_index[el]
+                    number = el.get("N")
+                    if number is None:
+                        number = el.get("n")
+                    section_type = next(
+                        (
+                            div.get("TYPE")
+                            for div in divs
+                            if div.get("TYPE") is not None
+                        ),
+                        None,
+                    )
+                    page_info[index] = (number, section_type)
+                    open_pages.append(_PageState(index, notes_following))
+
+            # lxml stores text after an element as its tail
+            add_text(el.tail, el, is_tail=True)
+
+            while next_page in completed:
+                yield PageText(*page_info[next_page], completed.pop(next_page))
+                next_page += 1
+
+        # any pages still open continue to the end of the document
+        for state in open_pages:
+            completed[state.index] = state.content()
+        while next_page in completed:
+            yield PageText(*page_info[next_page], completed.pop(next_page))
+            next_page += 1
+
+
 class Text(TeiXmlObject):
     """:class:~`neuxml.xmlmap.XmlObject` for extracting page text from
     EEBO-TCP P4 xml or P5 xml"""
@@ -370,32 +543,153 @@ class Text(TeiXmlObject):
     # various levels nested within divs, paragraphs, etc
 
     #: list of page objects, identified by page beginning tag (PB)
-    pages = xmlmap.NodeListField("EEBO//TEXT//PB|.//t:text//t:pb", Page)
+    pages = xmlmap.NodeListField(PAGES_XPATH, Page)
     #: list of quoted poems, identified by Q that contains LG or L
     quoted_poems = xmlmap.NodeListField(
         "EEBO//TEXT//Q[LG or L]|.//t:text//t:q[t:lg or t:l]", QuotedPoem
     )
 
 
+def tcp_xml_path(volume_id):
+    """Path to the local EEBO-TCP P4 xml file for a volume"""
+    return Path(settings.EEBO_DATA) / f"{short_id(volume_id)}.P4.xml"
+
+
+def content_fingerprint(volume_id):
+    """Fingerprint of the local EEBO-TCP xml file for a volume, based
+    on file modification time and size (so the file does not need to be
+    read); used to determine when pages need to be reindexed."""
+    xml_stat = os.stat(tcp_xml_path(volume_id))
+    return hashlib.sha1(
+        f"{xml_stat.st_mtime_ns}:{xml_stat.st_size}".encode()
+    ).hexdigest()
+
+
 def load_tcp_text(volume_id):
-    xml_path = Path(settings.EEBO_DATA) / f"{short_id(volume_id)}.P4.xml"
-    return xmlmap.load_xmlobject_from_file(xml_path, Text)
+    return xmlmap.load_xmlobject_from_file(tcp_xml_path(volume_id), Text)
+
+
+#: quoted poem content and metadata as needed for poem excerpt export
+QuotedPoemData = namedtuple(
+    "QuotedPoemData", ["start_page", "text_chunks", "source", "languages", "notes"]
+)
+#: text content extracted from a TCP xml file; pages are a list of
+#: :class:`PageText` and quoted poems a list of :class:`QuotedPoemData`
+TextData = namedtuple("TextData", ["pages", "quoted_poems"])
+
+#: version for cached text data; increment when extraction logic changes
+TEXT_DATA_VERSION = 1
+
+
+def extract_text_data(tcp_text, quoted_poems=True):
+    """Extract page text and (optionally) quoted poems from a :class:`Text`
+    in the form returned by :func:`load_text_data`."""
+    # page text is only extracted for P4 (EEBO-TCP) content, since P5 page
+    # beginning tags do not delimit text in :meth:`Page.page_contents`
+    # and PPA page text for ECCO-TCP works comes from Gale OCR
+    pages = []
+    if tcp_text.node.tag == "ETS":
+        pages = list(PageExtractor(tcp_text))
+
+    poems = extract_quoted_poems(tcp_text) if quoted_poems else None
+    return TextData(pages, poems)
+
+
+def extract_quoted_poems(tcp_text):
+    """Extract quoted poems from a :class:`Text` as a list of
+    :class:`QuotedPoemData`."""
+    return [
+        QuotedPoemData(
+            start_page=int(qpoem.start_page.index),
+            text_chunks=list(qpoem.text_by_page()),
+            source=qpoem.source,
+            languages=[lg.language for lg in qpoem.line_groups if lg.language],
+            notes=[f"{note.label}: {note}" for note in qpoem.notes],
+        )
+        for qpoem in tcp_text.quoted_poems
+    ]
+
+
+def text_data_cache_path(xml_path):
+    """Path for cached :class:`TextData` for the specified xml file,
+    if a cache directory is configured via **TCP_DATA_CACHE**.
+    The cache key is based on file path, modification time, and size,
+    so any change to the xml file results in a new cache entry."""
+    cache_dir = getattr(settings, "TCP_DATA_CACHE", None)
+    if not cache_dir:
+        return None
+    xml_path = Path(xml_path).resolve()
+    stat = xml_path.stat()
+    cache_key = hashlib.sha1(
+        f"{xml_path}:{stat.st_mtime_ns}:{stat.st_size}:{TEXT_DATA_VERSION}".encode()
+    ).hexdigest()
+    return Path(cache_dir) / f"{xml_path.stem}-{cache_key}.pickle.z"
+
+
+def load_text_data(xml_path, quoted_poems=True):
+    """Load :class:`TextData` for a TCP xml file, parsing the xml only
+    when there is no cached copy. When **TCP_DATA_CACHE** is configured,
+    quoted poems are also extracted when not requested and saved with pages
+    as compressed pickle, so that page counts, page indexing, and quoted poem
+    export can share a single parse. Errors extracting quoted poems that were
+    not requested are logged and do not prevent loading pages; quoted poems
+    are not cached in that case. Otherwise, quoted poems are only
+    extracted when requested."""
+    cache_path = text_data_cache_path(xml_path)
+    if cache_path and cache_path.exists():
+        try:
+            with cache_path.open("rb") as cachefile:
+                pages, poems = pickle.loads(zlib.decompress(cachefile.read()))
+            # if quoted poems were not cached but are requested, parse the xml
+            if poems is not None or not quoted_poems:
+                return TextData(
+                    [PageText(*page) for page in pages],
+                    None if poems is None else [QuotedPoemData(*qp) for qp in poems],
+                )
+        except (OSError, zlib.error, pickle.UnpicklingError, TypeError) as err:
+            logger.warning(f"Error loading cached text data {cache_path}: {err}")
+
+    tcp_text = xmlmap.load_xmlobject_from_file(xml_path, Text)
+    text_data = extract_text_data(tcp_text, quoted_poems)
+    if cache_path and not quoted_poems:
+        # extract quoted poems for the cache, but don't let errors
+        # in quoted poem extraction prevent page counts or indexing
+        try:
+            text_data = text_data._replace(quoted_poems=extract_quoted_poems(tcp_text))
+        except Exception as err:
+            logger.warning(f"Error extracting quoted poems from {xml_path}: {err}")
+
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and rename, so that parallel processes
+        # never read a partially written cache file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as cachefile:
+            # store as plain tuples so cached data does not depend on class names
+            data = (
+                [tuple(page) for page in text_data.pages],
+                None
+                if text_data.quoted_poems is None
+                else [tuple(qpoem) for qpoem in text_data.quoted_poems],
+            )
+            cachefile.write(zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)))
+        os.replace(tmp_path, cache_path)
+
+    return text_data
 
 
 def page_data(volume_id):
-    tcp_text = load_tcp_text(volume_id)
-    for page in tcp_text.pages:
+    text_data = load_text_data(tcp_xml_path(volume_id), quoted_poems=False)
+    for page in text_data.pages:
         page_info = {
             "label": page.number,
-            "content": str(page),
+            "content": page.content,
             "tags": [page.section_type],
         }
         yield page_info
 
 
 def page_count(volume_id):
-    xml_path = Path(settings.EEBO_DATA) / f"{short_id(volume_id)}.P4.xml"
-    tcp_text = xmlmap.load_xmlobject_from_file(xml_path, Text)
     # provisional page count based on number of page beginning tags
     # NOTE: for simplicity, we include pages with no content
-    return len(tcp_text.pages)
+    return len(load_text_data(tcp_xml_path(volume_id), quoted_poems=False).pages)
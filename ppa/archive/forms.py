@@ -4,7 +4,12 @@ from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db.models import Max, Min
 
-from ppa.archive.models import NO_COLLECTION_LABEL, Collection, DigitizedWork
+from ppa.archive.models import (
+    NO_COLLECTION_LABEL,
+    Collection,
+    DigitizedWork,
+    SearchRegistry,
+)
 from ppa.common.utils import simplify_quotes
 
 
@@ -173,6 +178,10 @@ class ModelMultipleChoiceFieldWithEmpty(forms.ModelMultipleChoiceField):
     EMPTY_VALUE = NO_COLLECTION_LABEL
     EMPTY_ID = 0
 
+    #: optional list of preloaded model instances to validate against
+    #: instead of querying the database
+    objects = None
+
     def clean(self, value):
         """Extend clean to use default validation on all values but
         the empty id."""
@@ -181,11 +190,26 @@ class ModelMultipleChoiceFieldWithEmpty(forms.ModelMultipleChoiceField):
         except ValueError:
             # non-integer will raise value error
             raise ValidationError("Invalid collection")
-        qs = super()._check_values(pk_values)
+        qs = self._check_values(pk_values)
         if self.EMPTY_ID in value or str(self.EMPTY_ID) in value:
             return [self.EMPTY_VALUE] + list(qs)
         return qs
 
+    def _check_values(self, value):
+        """Extend default validation to use preloaded objects, if set."""
+        if self.objects is None:
+            return super()._check_values(value)
+        selected = set(str(val) for val in value)
+        available = set(str(obj.pk) for obj in self.objects)
+        for val in selected - available:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": val},
+            )
+        # return in the same order as preloaded objects
+        return [obj for obj in self.objects if str(obj.pk) in selected]
+
 
 class SearchForm(forms.Form):
     """Simple search form for digitized works."""
@@ -304,9 +328,11 @@ class SearchForm(forms.Form):
             "sort": "title_asc",
             # always include uncategorized collections; no harm if not present
             "collections": [ModelMultipleChoiceFieldWithEmpty.EMPTY_ID]
-            + list(
-                Collection.objects.filter(exclude=False).values_list("id", flat=True)
-            ),
+            + [
+                collection.pk
+                for collection in SearchRegistry.collections()
+                if not collection.exclude
+            ],
         }
 
     def __init__(self, data=None, *args, **kwargs):
@@ -315,6 +341,14 @@ class SearchForm(forms.Form):
         """
         super().__init__(data=data, *args, **kwargs)
 
+        # use preloaded collections for choices and validation,
+        # to avoid querying the database
+        collections = SearchRegistry.collections()
+        self.fields["collections"].objects = collections
+        self.fields["collections"].choices = [
+            (collection.pk, collection.name) for collection in collections
+        ]
+
         pubdate_range = self.pub_date_minmax()
         self.pubdate_validation_msg = (
             "Enter sequential years between {} and {}.".format(
@@ -343,7 +377,8 @@ class SearchForm(forms.Form):
                 {"label": "Relevance", "disabled": True},
             )
 
-    def has_keyword_query(self, data):
+    @staticmethod
+    def has_keyword_query(data):
         """check if any of the keyword search fields have search terms"""
         return any(
             data.get(query_field, None) for query_field in ["query", "title", "author"]
@@ -1,7 +1,19 @@
+import gzip
+import hashlib
 import json
 import logging
+import mmap
+import os
 import pathlib
+import random
+import struct
+import tempfile
+import threading
 import time
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 import pymarc
 import requests
@@ -14,9 +26,9 @@ from ppa import __version__ as ppa_version
 logger = logging.getLogger(__name__)
 
 
-def get_local_ocr(item_id):
+def local_ocr_path(item_id):
     """
-    Load local OCR page text for the specified Gale volume, if available.
+    Path to local OCR page text for the specified Gale volume.
     This requires a base directory (specified by GALE_LOCAL_OCR) to be configured and
     assumes the following organization:
 
@@ -26,24 +38,233 @@ def get_local_ocr(item_id):
 
         * Page text is stored as a JSON dictionary with keys based on Gale page numbers,
           which is a 4-digit string (e.g., "0004").
-
-    Raises a FileNotFoundError if the local OCR page text does not exist.
     """
     ocr_dir = getattr(settings, "GALE_LOCAL_OCR", None)
     if not ocr_dir:
         raise ImproperlyConfigured(
             "GALE_LOCAL_OCR configuration is required for indexing Gale page content"
         )
+    return pathlib.Path(ocr_dir, stub_dir(item_id), f"{item_id}.json")
+
+
+def stub_dir(item_id):
+    """Stub directory name for the specified Gale volume, following
+    conventions set in ppa-nlp (every third number of the id).
+    Raises a ValueError if the id is not a valid Gale item identifier."""
     # check that the id looks as expected (appease github codeql security concerns)
     # first two characters are CW or CB; rest of the id is numeric
     if not all([item_id[:2] in ["CW", "CB"], item_id[2:].isnumeric()]):
         raise ValueError(f"{item_id} is not a valid Gale item identifier")
+    return item_id[::3][1:]
+
 
-    # files are in stub directories; following conventions set in ppa-nlp
-    stub_dir = item_id[::3][1:]
-    ocr_path = pathlib.Path(ocr_dir, stub_dir, f"{item_id}.json")
+def get_local_ocr(item_id):
+    """
+    Load local OCR page text for the specified Gale volume, if available;
+    see :func:`local_ocr_path` for configuration and file organization.
+    Returns a mapping of page number to page text.
+
+    When **GALE_OCR_CACHE** is configured, page text is loaded from a
+    compact cache file (see :class:`LocalOCR`), so that text for a single page
+    can be accessed without parsing the full volume. The cache is created
+    or updated from the JSON file when it is missing or out of date.
+
+    Raises a FileNotFoundError if the local OCR page text does not exist.
+    """
+    ocr_path = local_ocr_path(item_id)
+    cache_path = local_ocr_cache_path(item_id)
+    if cache_path is None:
+        with ocr_path.open() as ocrfile:
+            return json.load(ocrfile)
+
+    # raises file not found if there is no local ocr
+    ocr_stat = ocr_path.stat()
+    try:
+        local_ocr = LocalOCR(cache_path)
+        if local_ocr.source == [ocr_stat.st_mtime_ns, ocr_stat.st_size]:
+            return local_ocr
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, struct.error) as err:
+        logger.warning(f"Error loading cached local OCR {cache_path}: {err}")
+    return convert_local_ocr(item_id)
+
+
+def local_ocr_cache_path(item_id):
+    """Path for the compact cached copy of local OCR for the specified
+    Gale volume, if a cache directory is configured via **GALE_OCR_CACHE**."""
+    cache_dir = getattr(settings, "GALE_OCR_CACHE", None)
+    if not cache_dir:
+        return None
+    return pathlib.Path(cache_dir, stub_dir(item_id), f"{item_id}.ocr")
+
+
+class LocalOCR(Mapping):
+    """Read-only mapping of page number to page text for a Gale volume,
+    loaded from a compact local OCR cache file as created by
+    :func:`convert_local_ocr`.
+
+    The cache file starts with an identifying prefix and a JSON header
+    with the size and modification time of the source JSON file and
+    the offset and length of each page; page text follows as UTF-8.
+    The file is memory-mapped, and page text is only read and decoded
+    when it is accessed."""
+
+    #: prefix to identify cache files; change if the file format changes
+    file_prefix = b"PPAOCR1\n"
+
+    #: struct format for the length of the JSON header
+    header_size = struct.Struct("<I")
+
+    def __init__(self, path):
+        with open(path, "rb") as cachefile:
+            self._data = mmap.mmap(cachefile.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix_len = len(self.file_prefix)
+        if self._data[:prefix_len] != self.file_prefix:
+            raise ValueError("not a local OCR cache file")
+        header_start = prefix_len + self.header_size.size
+        (header_len,) = self.header_size.unpack(self._data[prefix_len:header_start])
+        header = json.loads(self._data[header_start : header_start + header_len])
+        #: size and modification time of the source JSON file
+        self.source = header["source"]
+        self._pages = header["pages"]
+        self._text_start = header_start + header_len
+
+    @classmethod
+    def write(cls, path, content, source):
+        """Write page content (a dictionary of page number and text)
+        to a cache file, with source file information for checking whether
+        the cache is current."""
+        pages = {}
+        text = []
+        offset = 0
+        for page_number, page_text in content.items():
+            page_bytes = page_text.encode("utf-8")
+            pages[page_number] = [offset, len(page_bytes)]
+            text.append(page_bytes)
+            offset += len(page_bytes)
+        header = json.dumps({"source": source, "pages": pages}).encode("utf-8")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and then move into place, so that
+        # a partially written cache file is never read
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as cachefile:
+            cachefile.write(cls.file_prefix)
+            cachefile.write(cls.header_size.pack(len(header)))
+            cachefile.write(header)
+            cachefile.writelines(text)
+        os.replace(tmp_path, path)
+
+    def __getitem__(self, page_number):
+        offset, length = self._pages[page_number]
+        start = self._text_start + offset
+        return self._data[start : start + length].decode("utf-8")
+
+    def __contains__(self, page_number):
+        # check the page index without reading page text
+        return page_number in self._pages
+
+    def __iter__(self):
+        return iter(self._pages)
+
+    def __len__(self):
+        return len(self._pages)
+
+
+def convert_local_ocr(item_id):
+    """Convert local OCR JSON for the specified Gale volume to a compact cache
+    file, when **GALE_OCR_CACHE** is configured (see :class:`LocalOCR`).
+    Returns the page content loaded from the JSON file."""
+    ocr_path = local_ocr_path(item_id)
+    ocr_stat = ocr_path.stat()
     with ocr_path.open() as ocrfile:
-        return json.load(ocrfile)
+        content = json.load(ocrfile)
+    cache_path = local_ocr_cache_path(item_id)
+    if cache_path is not None:
+        LocalOCR.write(cache_path, content, [ocr_stat.st_mtime_ns, ocr_stat.st_size])
+    return content
+
+
+def local_ocr_fingerprint(item_id):
+    """
+    Fingerprint of the local OCR page text for the specified Gale volume,
+    based on file modification time and size (so the file does not need to
+    be read); used to determine when pages need to be reindexed.
+    Returns a fingerprint for empty content when there is no local OCR,
+    since page text will come from the Gale API.
+    """
+    try:
+        ocr_stat = os.stat(local_ocr_path(item_id))
+    except FileNotFoundError:
+        return hashlib.sha1(b"").hexdigest()
+    return hashlib.sha1(
+        f"{ocr_stat.st_mtime_ns}:{ocr_stat.st_size}".encode()
+    ).hexdigest()
+
+
+def item_record_path(item_id):
+    """
+    Path to the locally stored item record for the specified Gale volume,
+    if a directory is configured via **GALE_ITEM_STORE**. Records are
+    organized in stub directories, like local OCR content.
+    """
+    store_dir = getattr(settings, "GALE_ITEM_STORE", None)
+    if not store_dir:
+        return None
+    return pathlib.Path(store_dir, stub_dir(item_id), f"{item_id}.json.gz")
+
+
+def compact_item_record(gale_record):
+    """Reduce an item record as returned by the Gale API to the page
+    information needed for page indexing (page and folio numbers,
+    image ids and urls), without document metadata or OCR text.
+    Page information is kept in the same structure as the API response."""
+    pages = []
+    for page in gale_record["pageResponse"]["pages"]:
+        page_info = {
+            "pageNumber": page["pageNumber"],
+            "image": {
+                key: value
+                for key, value in page["image"].items()
+                if key in ("id", "url")
+            },
+        }
+        if page.get("folioNumber"):
+            page_info["folioNumber"] = page["folioNumber"]
+        pages.append(page_info)
+    return {"pageResponse": {"pages": pages}}
+
+
+def save_item_record(item_id, gale_record):
+    """Save a compact copy of an item record from the Gale API to the local
+    item store (see :func:`item_record_path`), when one is configured."""
+    record_path = item_record_path(item_id)
+    if record_path is None:
+        return
+    record_path.parent.mkdir(parents=True, exist_ok=True)
+    # write to a temporary file and then move into place, so that
+    # a partially written record is never read
+    fd, tmp_path = tempfile.mkstemp(dir=record_path.parent, suffix=".tmp")
+    with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8") as recordfile:
+        json.dump(compact_item_record(gale_record), recordfile)
+    os.replace(tmp_path, record_path)
+
+
+def load_item_record(item_id):
+    """Load a compact item record from the local item store, if configured.
+    Returns None if there is no stored record for this item."""
+    record_path = item_record_path(item_id)
+    if record_path is None:
+        return None
+    try:
+        with gzip.open(record_path, "rt", encoding="utf-8") as recordfile:
+            return json.load(recordfile)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, json.decoder.JSONDecodeError) as err:
+        logger.warning(f"Error loading stored item record for {item_id}: {err}")
+        return None
 
 
 class GaleAPIError(Exception):
@@ -73,7 +294,10 @@ class GaleAPI:
     be included in request headers when making API calls.
 
     Implemented as a singleton; instanciating the class will return the
-    same shared instance every time.
+    same shared instance every time. Safe to use from multiple threads
+    and processes: each thread and process uses its own request session,
+    and API key refresh is shared by all threads behind a lock. Failed
+    requests are retried with exponential backoff and jitter.
     """
 
     #: base URL for all API requests
@@ -82,23 +306,45 @@ class GaleAPI:
     #: maximum number of retry attempts for API requests
     max_retries = 3
 
+    #: base delay in seconds for exponential backoff between retries
+    backoff_factor = 1
+
+    #: maximum delay in seconds between retries
+    max_backoff = 30
+
+    #: response status codes for temporary errors that should be retried
+    retry_status = (
+        requests.codes.too_many_requests,
+        requests.codes.bad_gateway,
+        requests.codes.service_unavailable,
+        requests.codes.gateway_timeout,
+    )
+
+    #: default number of items to retrieve in parallel with :meth:`get_items`
+    max_workers = 4
+
     #: shared singleton instance; populated on first instantiation
     instance = None
 
+    #: lock for api key refresh, shared by all threads
+    _api_key_lock = threading.Lock()
+
     def __new__(cls):
         # implement as a singleton
         # adapted from https://softwareengineering.stackexchange.com/a/333710
 
         # if no instance has been initialized, create and store on the class
         if cls.instance is None:
-            cls.instance = super().__new__(cls)
+            instance = super().__new__(cls)
+            # each thread uses its own request session, created on first use;
+            # initialize once, since __init__ runs on every instantiation
+            instance._local = threading.local()
+            instance._pid = os.getpid()
+            cls.instance = instance
         # return the instance
         return cls.instance
 
     def __init__(self):
-        # NOTE: copied from hathi.py base api class; should be generalized
-        # into a common base class if/when we add a third provider
-
         # first make sure we have a username configured
         try:
             self.username = settings.GALE_API_USERNAME
@@ -107,18 +353,41 @@ class GaleAPI:
                 "GALE_API_USERNAME configuration is required for Gale API"
             )
 
+    def _new_session(self):
+        # NOTE: copied from hathi.py base api class; should be generalized
+        # into a common base class if/when we add a third provider
+
         # create a request session, for request pooling
-        self.session = requests.Session()
+        session = requests.Session()
         # set a user-agent header, but  preserve requests version information
         headers = {
             "User-Agent": "ppa-django/%s (%s)"
-            % (ppa_version, self.session.headers["User-Agent"])
+            % (ppa_version, session.headers["User-Agent"])
         }
         # include technical contact as From header, if set
         tech_contact = getattr(settings, "TECHNICAL_CONTACT", None)
         if tech_contact:
             headers["From"] = tech_contact
-        self.session.headers.update(headers)
+        session.headers.update(headers)
+        return session
+
+    @property
+    def session(self):
+        """Request session for the current thread, for request pooling.
+        Sessions are not shared between threads, and sessions inherited
+        from a parent process are discarded."""
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        if getattr(self._local, "session", None) is None:
+            self._local.session = self._new_session()
+        return self._local.session
+
+    def backoff(self, retry):
+        """Wait before retrying a request, with exponential backoff and
+        full jitter, so that parallel requests do not retry in lockstep."""
+        delay = min(self.max_backoff, self.backoff_factor * 2**retry)
+        time.sleep(random.uniform(0, delay))
 
     def _make_request(
         self, url, params=None, requires_api_key=True, stream=False, retry=0
@@ -139,12 +408,31 @@ class GaleAPI:
             rqst_opts["params"] = params.copy()
 
         # add api key to parameters if neded for this request
+        api_key = None
         if requires_api_key:
             if "params" not in rqst_opts:
                 rqst_opts["params"] = {}
-            rqst_opts["params"]["api_key"] = self.api_key
+            api_key = self.api_key
+            rqst_opts["params"]["api_key"] = api_key
+
+        # options to make the same request again
+        retry_opts = {
+            "params": params,
+            "requires_api_key": requires_api_key,
+            "stream": stream,
+            "retry": retry + 1,
+        }
+
+        try:
+            resp = self.session.get(rqst_url, stream=stream, **rqst_opts)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # retry connection errors and timeouts after waiting
+            if retry < self.max_retries:
+                logger.warning(f"Connection error on {rqst_url}; retrying")
+                self.backoff(retry)
+                return self._make_request(url, **retry_opts)
+            raise
 
-        resp = self.session.get(rqst_url, stream=stream, **rqst_opts)
         # Log request - use info level for retries, debug for initial attempts
         log_level = logger.info if retry > 0 else logger.debug
         retry_info = f" (retry {retry}/{self.max_retries})" if retry > 0 else ""
@@ -160,6 +448,14 @@ class GaleAPI:
         if resp.status_code == requests.codes.not_found:
             raise GaleItemNotFound
 
+        # temporary errors (e.g. rate limiting); wait and try again
+        if resp.status_code in self.retry_status:
+            if retry < self.max_retries:
+                logger.warning(f"{resp.status_code} error on {rqst_url}; retrying")
+                self.backoff(retry)
+                return self._make_request(url, **retry_opts)
+            raise GaleAPIError(resp.status_code)
+
         # when api key expires, API returns:
         # HTTP Status 401 - Authentication Failed: Invalid or Expired API key
         # If we get a 401 on a request that requires an api key, try getting a new one
@@ -176,15 +472,14 @@ class GaleAPI:
             # If we get a 401 or 500 on a request that requires an api key,
             # get a fresh key and then try the same request again (up to max_retries attempts)
             if requires_api_key and retry < self.max_retries:
-                self.refresh_api_key()
-
-                return self._make_request(
-                    url,
-                    params=params,
-                    requires_api_key=requires_api_key,
-                    stream=stream,
-                    retry=retry + 1,
-                )
+                # if another thread has already replaced the expired key,
+                # the current key is used without requesting a new one
+                self.refresh_api_key(expired_key=api_key)
+                # retry immediately with a new key; wait after server errors
+                if resp.status_code == requests.codes.server_error:
+                    self.backoff(retry)
+
+                return self._make_request(url, **retry_opts)
 
             # Log when we decide not to retry
             if requires_api_key and retry >= self.max_retries:
@@ -224,13 +519,20 @@ class GaleAPI:
         """Property for current api key. Uses :meth:`get_api_key` to
         request a new one when needed."""
         if self._api_key is None:
-            self._api_key = self.get_api_key()
+            with self._api_key_lock:
+                # check again, in case another thread got a key while waiting
+                if self._api_key is None:
+                    self._api_key = self.get_api_key()
         return self._api_key
 
-    def refresh_api_key(self):
-        """clear cached api key and request a new one"""
-        self._api_key = None
-        assert self.api_key  # populate new key through property
+    def refresh_api_key(self, expired_key=None):
+        """clear cached api key and request a new one. When the expired
+        key is specified, a new key is only requested if the expired key is
+        still current, so that parallel requests that fail with the same
+        expired key only refresh it once."""
+        with self._api_key_lock:
+            if expired_key is None or self._api_key in (None, expired_key):
+                self._api_key = self.get_api_key()
 
     def get_item(self, item_id):
         """Get the full record for a single item"""
@@ -241,14 +543,45 @@ class GaleAPI:
         if response:
             return response.json()
 
-    def get_item_pages(self, item_id, gale_record=None):
+    def get_items(self, item_ids, max_workers=None):
+        """Get full records for multiple items in parallel, using a bounded
+        pool of threads. Returns a generator of tuples of item id and record,
+        in the same order as the item ids; if an item could not be retrieved,
+        the :class:`GaleAPIError` is returned in place of the record.
+        Item ids are consumed as needed, so that no more than `max_workers`
+        records are retrieved ahead of the caller."""
+        max_workers = max_workers or self.max_workers
+        item_ids = iter(item_ids)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+            def submit(ids):
+                for item_id in ids:
+                    pending.append((item_id, executor.submit(self.get_item, item_id)))
+
+            submit(islice(item_ids, max_workers))
+            while pending:
+                item_id, future = pending.popleft()
+                try:
+                    result = future.result()
+                except GaleAPIError as err:
+                    result = err
+                # keep the pool busy while the caller handles this record
+                submit(islice(item_ids, 1))
+                yield item_id, result
+
+    def get_item_pages(self, item_id, gale_record=None, page_span=None):
         """Return a generator of page content for the specified digitized work
         from the Gale API. Takes an optional gale_record
         parameter (item record as returned by Gale API), to avoid
-        making an extra API call if data is already available."""
-        if gale_record is None:
-            gale_record = self.get_item(item_id)
-
+        making an extra API call if data is already available.
+        If a page span of 1-based digital page numbers is specified (e.g.,
+        for an excerpt), page text is only loaded for pages in that span.
+
+        When no record is provided, uses the locally stored item record
+        (see :func:`load_item_record`) if local OCR is available for every page,
+        since stored records do not include Gale OCR text. Records
+        retrieved from the API are saved to the local item store."""
         local_ocr_text = None
         try:
             # Use higher quality local OCR text if available
@@ -258,15 +591,30 @@ class GaleAPI:
         except json.decoder.JSONDecodeError:
             logger.warning(f"JSON decode error on local OCR file for {item_id}")
 
+        if gale_record is None and local_ocr_text:
+            stored_record = load_item_record(item_id)
+            if stored_record and all(
+                page["pageNumber"] in local_ocr_text
+                for page in stored_record["pageResponse"]["pages"]
+            ):
+                gale_record = stored_record
+
+        if gale_record is None:
+            gale_record = self.get_item(item_id)
+            save_item_record(item_id, gale_record)
+
         # iterate through the pages in the response
-        for page in gale_record["pageResponse"]["pages"]:
+        for i, page in enumerate(gale_record["pageResponse"]["pages"], 1):
             page_number = page["pageNumber"]
 
             # Use local OCR text if we have it, with fallback to Gale
             # OCR. Set a tag to indicate when local OCR is present.
             tags = []
             ocr_text = None
-            if local_ocr_text and page_number in local_ocr_text:
+            if page_span and i not in page_span:
+                # page will not be indexed; don't load the text
+                pass
+            elif local_ocr_text and page_number in local_ocr_text:
                 ocr_text = local_ocr_text.get(page_number)
                 # if we have content for this page, set tag to indicate local ocr.
                 # If page is present but content is the empty string
@@ -1,19 +1,29 @@
 """
 Utilities for working with HathiTrust materials and APIs.
 """
+import hashlib
 import io
+import json
 import logging
+import os
 import os.path
+import tempfile
 import time
+from collections import namedtuple
 from datetime import datetime
+from itertools import batched
+from pathlib import Path
+from urllib.parse import quote
 from zipfile import ZipFile
 
 import pymarc
 import requests
 from cached_property import cached_property
 from django.conf import settings
+from lxml import etree
 from neuxml import xmlmap
 from pairtree import pairtree_client, pairtree_path, storage_exceptions
+from urllib3.util.retry import Retry
 
 from ppa import __version__ as ppa_version
 
@@ -37,10 +47,29 @@ class HathiBaseAPI:
 
     #: base api URL for all requests
     api_root = ""
+    #: number of times to retry failed connections or server errors
+    retries = 3
+    #: backoff factor for retries; wait between retries increases exponentially
+    retry_backoff = 0.5
+    #: response status codes that should be retried
+    retry_status = (429, 500, 502, 503, 504)
+    #: maximum number of connections to keep in the session pool
+    pool_size = 10
 
     def __init__(self):
         # create a request session, for request pooling
         self.session = requests.Session()
+        # retry connection errors and temporary server errors with backoff
+        adapter = requests.adapters.HTTPAdapter(
+            max_retries=Retry(
+                total=self.retries,
+                backoff_factor=self.retry_backoff,
+                status_forcelist=self.retry_status,
+            ),
+            pool_maxsize=self.pool_size,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         # set a user-agent header, but  preserve requests version information
         headers = {
             "User-Agent": "ppa-django/%s (%s)"
@@ -56,10 +85,11 @@ class HathiBaseAPI:
         # close the request session
         self.session.close()
 
-    def _make_request(self, url, params=None):
+    def _make_request(self, url, params=None, headers=None):
         """Make a GET request with the configured session. Takes a url
-        relative to :attr:`api_root` and optional dictionary of parameters.
-        Returns the response for status 200 OK; raises
+        relative to :attr:`api_root` and optional dictionary of parameters
+        and request headers. Returns the response for status 200 OK
+        or 304 Not Modified (conditional requests only); raises
         :class:`HathiItemNotFound` for 404 and :class:`HathiItemForbidden`
         for 403.
         """
@@ -67,11 +97,13 @@ class HathiBaseAPI:
         rqst_opts = {}
         if params:
             rqst_opts["params"] = params
+        if headers:
+            rqst_opts["headers"] = headers
 
         start = time.time()
         resp = self.session.get(url, **rqst_opts)
         logger.debug("get %s %s: %f sec", url, resp.status_code, time.time() - start)
-        if resp.status_code == requests.codes.ok:
+        if resp.status_code in (requests.codes.ok, requests.codes.not_modified):
             return resp
         if resp.status_code == requests.codes.not_found:
             raise HathiItemNotFound
@@ -82,10 +114,63 @@ class HathiBaseAPI:
 class HathiBibliographicAPI(HathiBaseAPI):
     """Wrapper for HathiTrust Bibliographic API.
 
+    If a cache directory is configured via **HATHI_BIBDATA_CACHE**,
+    responses are saved locally by mode, id type and id value. Cached
+    responses are revalidated with conditional requests when the API
+    provides an ETag or Last-Modified header, and can be reused
+    without a request via :meth:`cached_record`.
+
     https://www.hathitrust.org/bib_api
     """
 
     api_root = "http://catalog.hathitrust.org/api"
+    #: maximum number of ids to include in a single multiple-record request
+    batch_size = 20
+
+    def __init__(self):
+        super().__init__()
+        cache_dir = getattr(settings, "HATHI_BIBDATA_CACHE", None)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    def _cache_path(self, mode, id_type, id_value):
+        # ids may include characters not allowed in filenames (e.g. ark ids)
+        return self.cache_dir / mode / id_type / ("%s.json" % quote(id_value, safe=""))
+
+    def _load_cached(self, mode, id_type, id_value):
+        """Load cached response for the specified record, if a cache is
+        configured and the record has been cached. Returns a dictionary
+        with response data and cache validation headers, or None."""
+        if not self.cache_dir:
+            return None
+        cache_path = self._cache_path(mode, id_type, id_value)
+        try:
+            with cache_path.open() as cachefile:
+                return json.load(cachefile)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            logger.warning("Error loading cached bibdata %s: %s", cache_path, err)
+
+    def _save_cached(self, mode, id_type, id_value, data, headers=None):
+        """Save response data for the specified record, along with
+        ETag and Last-Modified headers if available, when a cache is
+        configured."""
+        if not self.cache_dir:
+            return
+        cache_path = self._cache_path(mode, id_type, id_value)
+        headers = headers or {}
+        cached = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "data": data,
+        }
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and rename, so that parallel processes
+        # never read a partially written cache file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as cachefile:
+            json.dump(cached, cachefile)
+        os.replace(tmp_path, cache_path)
 
     def _get_record(self, mode, id_type, id_value):
         url = "volumes/%(mode)s/%(id_type)s/%(id_value)s.json" % {
@@ -93,12 +178,27 @@ class HathiBibliographicAPI(HathiBaseAPI):
             "id_type": id_type,
             "id_value": id_value,  # NOTE: / in ark ids is *not* escaped
         }
-        resp = self._make_request(url)
+        # if there is a cached copy, make a conditional request
+        # so the api can respond with 304 not modified
+        cached = self._load_cached(mode, id_type, id_value)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        resp = self._make_request(url, headers=headers)
+        if resp.status_code == requests.codes.not_modified:
+            data = cached["data"]
+        else:
+            data = resp.json()
         # for an invalid id, hathi seems to return a 200 ok
         # but json has no records
-        if not resp.json().get("records", None):
+        if not data.get("records", None):
             raise HathiItemNotFound
-        return HathiBibliographicRecord(resp.json())
+        if resp.status_code != requests.codes.not_modified:
+            self._save_cached(mode, id_type, id_value, data, resp.headers)
+        return HathiBibliographicRecord(data)
 
     def brief_record(self, id_type, id_value):
         """Get brief record by id type and value.
@@ -116,7 +216,50 @@ class HathiBibliographicAPI(HathiBaseAPI):
         """
         return self._get_record("full", id_type, id_value)
 
-    # also possible: get multiple records at once
+    def records(self, id_type, id_values, mode="full", batch_size=None):
+        """Get records for multiple ids of the same type, using
+        multiple-record requests of up to :attr:`batch_size` ids each.
+        Generator of tuples of id value and
+        :class:`HathiBibliographicRecord`; ids with no bibliographic
+        data are not included.
+
+        :param id_type: id type (e.g., htid, oclc)
+        :param id_values: iterable of id values
+        :param mode: full or brief record (default: full)
+        :param batch_size: optional override for :attr:`batch_size`
+        :raises: :class:`requests.exceptions.RequestException` if a
+            request fails after retries
+        """
+        for batch in batched(id_values, batch_size or self.batch_size):
+            # multiple ids are specified as id_type:id_value, separated by |
+            # NOTE: / in ark ids is *not* escaped
+            request_ids = ["%s:%s" % (id_type, id_value) for id_value in batch]
+            url = "volumes/%s/json/%s" % (mode, "|".join(request_ids))
+            try:
+                resp = self._make_request(url)
+            except HathiItemNotFound:
+                continue
+            if resp is None:
+                continue
+            # response is keyed on the requested id
+            data = resp.json()
+            for id_value, request_id in zip(batch, request_ids):
+                result = data.get(request_id)
+                # invalid ids are included but have no records
+                if result and result.get("records"):
+                    self._save_cached(mode, id_type, id_value, result)
+                    yield id_value, HathiBibliographicRecord(result)
+
+    def cached_record(self, id_type, id_value, mode="full"):
+        """Get a previously retrieved record from the local cache,
+        without making any request. Returns None if no cache is
+        configured or the record has not been cached.
+
+        :returns: :class:`HathiBibliographicRecord` or None
+        """
+        cached = self._load_cached(mode, id_type, id_value)
+        if cached and cached["data"].get("records"):
+            return HathiBibliographicRecord(cached["data"])
 
 
 class HathiBibliographicRecord:
@@ -135,6 +278,11 @@ class HathiBibliographicRecord:
         # title without leading article and other language titles
         return self.info["titles"][0]
 
+    @property
+    def is_brief(self):
+        """True for brief records, which do not include MARC-XML"""
+        return "marc-xml" not in self.info
+
     @property
     def pub_dates(self):
         """list of available publication dates"""
@@ -239,6 +387,91 @@ class MinimalMETS(_METS):
     )
 
 
+METS_NAMESPACE = "http://www.loc.gov/METS/"
+XLINK_NAMESPACE = "http://www.w3.org/1999/xlink"
+
+#: page information from the physical METS structMap, as generated by
+#: :func:`mets_structmap_pages`; text file sequence and location come from
+#: the METS file referenced by the text file id
+METSPage = namedtuple(
+    "METSPage",
+    ["order", "label", "orderlabel", "text_file_id", "sequence", "location"],
+)
+
+
+def mets_structmap_pages(metsfile):
+    """Generator of :class:`METSPage` tuples for pages in the physical
+    structMap of a HathiTrust METS file.
+
+    Equivalent to :attr:`MinimalMETS.structmap_pages`, but parses the
+    file incrementally and builds a lookup of file id to location and
+    sequence in the same pass, instead of searching the whole document
+    for each page's text file.  Pages are generated as soon as their text
+    file information is available (in HathiTrust METS, the fileSec
+    precedes the structMap).
+
+    :param metsfile: path or file-like object for METS xml
+    """
+    file_tag = "{%s}file" % METS_NAMESPACE
+    div_tag = "{%s}div" % METS_NAMESPACE
+    structmap_tag = "{%s}structMap" % METS_NAMESPACE
+    flocat_tag = "{%s}FLocat" % METS_NAMESPACE
+    fptr_tag = "{%s}fptr" % METS_NAMESPACE
+    href_attr = "{%s}href" % XLINK_NAMESPACE
+
+    # file id -> (sequence, location)
+    files = {}
+    # structmap pages waiting on file information: order, label, orderlabel, file id
+    pending = []
+    in_physical_structmap = False
+
+    for event, elem in etree.iterparse(
+        metsfile, events=("start", "end"), tag=[file_tag, div_tag, structmap_tag]
+    ):
+        if elem.tag == structmap_tag:
+            in_physical_structmap = event == "start" and elem.get("TYPE") == "physical"
+            continue
+        if event == "start":
+            continue
+
+        if elem.tag == file_tag:
+            flocat = elem.find(flocat_tag)
+            location = flocat.get(href_attr) if flocat is not None else None
+            files[elem.get("ID")] = (elem.get("SEQ"), location)
+            elem.clear()
+
+        elif in_physical_structmap and elem.get("TYPE") == "page":
+            # first file pointer for a text or ocr file
+            text_file_id = next(
+                (
+                    fptr.get("FILEID")
+                    for fptr in elem.iterchildren(fptr_tag)
+                    if "TXT" in fptr.get("FILEID", "")
+                    or "OCR" in fptr.get("FILEID", "")
+                ),
+                None,
+            )
+            order = elem.get("ORDER")
+            pending.append(
+                (
+                    int(order) if order else None,
+                    elem.get("LABEL"),
+                    elem.get("ORDERLABEL"),
+                    text_file_id,
+                )
+            )
+            elem.clear()
+
+            while pending and pending[0][3] in files:
+                page_info = pending.pop(0)
+                yield METSPage(*page_info, *files[page_info[3]])
+
+    # any pages with file information that was not found
+    # (or not found before the structmap)
+    for page_info in pending:
+        yield METSPage(*page_info, *files.get(page_info[3], (None, None)))
+
+
 class HathiObject:
     """An object for working with a HathiTrust item with data in a
     locally configured pairtree datastore."""
@@ -348,13 +581,51 @@ class HathiObject:
         """
         return xmlmap.load_xmlobject_from_file(self.metsfile_path(), MinimalMETS)
 
-    def page_data(self):
+    def mets_pages(self):
+        """Generator of :class:`METSPage` for pages in the METS structmap
+        for this object; see :func:`mets_structmap_pages`.
+
+        :raises: :class:`storage_exceptions.ObjectNotFoundException` if the
+            object is not found in pairtree storage
+        :raises: :class:`storage_exceptions.PartNotFoundException` if the
+            mets.xml flie is not found in pairtree storage for this object
+        """
+        # get the path before returning the generator, so errors are raised here
+        return mets_structmap_pages(self.metsfile_path())
+
+    def content_fingerprint(self):
+        """Fingerprint of the local pairtree content for this object,
+        based on modification time and size of the zip and METS files;
+        used to determine when pages need to be reindexed.
+
+        :raises: :class:`storage_exceptions.ObjectNotFoundException` if the
+            object is not found in pairtree storage
+        :raises: :class:`storage_exceptions.PartNotFoundException` if the
+            zip or mets.xml file is not found in pairtree storage
+        """
+        ptree_client = self.pairtree_client()
+        file_info = []
+        for path in (
+            self.zipfile_path(ptree_client=ptree_client),
+            self.metsfile_path(ptree_client=ptree_client),
+        ):
+            stat = os.stat(path)
+            file_info.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        return hashlib.sha1(";".join(file_info).encode()).hexdigest()
+
+    def page_data(self, page_span=None):
         """Return a generator of page content for this HathiTrust work
-        based on pairtree and METS data, for indexing pages in Solr."""
+        based on pairtree and METS data, for indexing pages in Solr.
 
-        # load mets record to pull metadata about the images
+        If a page span of 1-based digital page numbers is specified
+        (e.g., for an excerpt), page text is only read from the zip file
+        for pages in the span; other pages are generated without content,
+        so that page numbering is unchanged, and generation stops after
+        the last page in the span."""
+
+        # read page information from the mets record
         try:
-            mmets = self.mets_xml()
+            mets_pages = self.mets_pages()
         except storage_exceptions.ObjectNotFoundException:
             logger.error(f"Pairtree data for {self.hathi_id} not found")
             return
@@ -367,24 +638,17 @@ class HathiObject:
             logging.error(f"Missing pairtree data for: {self.hathi_id}")
             return
 
+        max_page = max(page_span) if page_span else None
         with ZipFile(zpath) as ht_zip:
             # yield a generator of index data for each page; iterate
             # over pages in METS structmap
-            for i, page in enumerate(mmets.structmap_pages, 1):
+            page_index = 0
+            for page in mets_pages:
                 # zipfile spec uses / for path regardless of OS
-                pagefilename = "/".join([self.content_dir, page.text_file_location])
+                pagefilename = "/".join([self.content_dir, str(page.location)])
+                # look up the zip member by name, without reading it
                 try:
-                    with ht_zip.open(pagefilename) as pagefile:
-                        try:
-                            yield {
-                                "page_id": page.text_file.sequence,
-                                "content": pagefile.read().decode("utf-8"),
-                                "order": page.order,
-                                "label": page.display_label,
-                                "tags": page.label.split(", ") if page.label else [],
-                            }
-                        except StopIteration:
-                            return
+                    ht_zip.getinfo(pagefilename)
                 except KeyError:
                     # we know of one HathiTrust work (uc1.$b31619) where
                     # the METS references pages that are not present in the zip file;
@@ -396,3 +660,22 @@ class HathiObject:
                         self.hathi_id,
                         pagefilename,
                     )
+                    continue
+
+                page_index += 1
+                # stop after the last page in the span
+                if max_page and page_index > max_page:
+                    return
+
+                content = None
+                if not page_span or page_index in page_span:
+                    with ht_zip.open(pagefilename) as pagefile:
+                        content = pagefile.read().decode("utf-8")
+                yield {
+                    "page_id": page.sequence,
+                    "content": content,
+                    "order": page.order,
+                    # use order label if present; otherwise use order
+                    "label": page.orderlabel or str(page.order),
+                    "tags": page.label.split(", ") if page.label else [],
+                }
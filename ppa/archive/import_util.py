@@ -13,6 +13,7 @@ from collections import OrderedDict
 from datetime import datetime
 from json.decoder import JSONDecodeError
 
+import requests
 from cached_property import cached_property
 from django.conf import settings
 from django.contrib.admin.models import ADDITION, LogEntry
@@ -29,8 +30,9 @@ from ppa.archive.gale import (
     GaleItemNotFound,
     MARCRecordNotFound,
     get_marc_record,
+    save_item_record,
 )
-from ppa.archive.models import DigitizedWork, Page
+from ppa.archive.models import DigitizedWork, IndexJob
 
 logger = logging.getLogger(__name__)
 
@@ -96,12 +98,11 @@ class DigitizedWorkImporter:
         pass
 
     def index(self):
-        """Index newly imported content, both metadata and full text."""
+        """Index newly imported content, both metadata and full text.
+        Page content is queued for indexing when the job queue is enabled."""
         if self.imported_works:
             DigitizedWork.index_items(self.imported_works)
-            for work in self.imported_works:
-                # index page index data in chunks (returns a generator)
-                DigitizedWork.index_items(Page.page_index_data(work))
+            IndexJob.submit(IndexJob.PAGES, self.imported_works)
 
     def get_status_message(self, status):
         """Get a readable status message for a given status"""
@@ -337,6 +338,15 @@ class HathiImporter(DigitizedWorkImporter):
         # initialize a bibliographic api client to use the same
         # session when adding multiple items
         self.bib_api = hathi.HathiBibliographicAPI()
+        # retrieve bibliographic data for all ids in batches up front,
+        # instead of one request per item; existing records are filtered
+        # out before import, so full records are needed.
+        # Any ids not retrieved here are requested individually on import.
+        self.bibdata = {}
+        try:
+            self.bibdata.update(self.bib_api.records("htid", self.source_ids))
+        except requests.exceptions.RequestException as err:
+            logger.warning("Error retrieving bibliographic data: %s", err)
 
         # use rsync to copy data from HathiTrust dataset server
         # to the local pairtree datastore for ids to be imported
@@ -361,7 +371,11 @@ class HathiImporter(DigitizedWorkImporter):
         try:
             # fetch metadata and add to the database
             digwork = DigitizedWork.add_from_hathi(
-                htid, self.bib_api, log_msg_src=log_msg_src, user=user
+                htid,
+                self.bib_api,
+                log_msg_src=log_msg_src,
+                user=user,
+                bibdata=self.bibdata.get(htid),
             )
             if digwork:
                 # populate page count
@@ -424,18 +438,27 @@ class GaleImporter(DigitizedWorkImporter):
         IndexableSignalHandler.disconnect()
 
     def import_digitizedwork(
-        self, gale_id, log_msg_src="", user=None, collections=None, **kwargs
+        self,
+        gale_id,
+        log_msg_src="",
+        user=None,
+        collections=None,
+        item_record=None,
+        **kwargs,
     ):
         """Import a single work into the database.
-        Retrieves bibliographic data from Gale API."""
+        Retrieves bibliographic data from Gale API, unless an item record
+        already retrieved from the API (e.g. with
+        :meth:`~ppa.archive.gale.GaleAPI.get_items`) is passed in."""
         # NOTE: significant overlap with similar method in import script
 
-        try:
-            item_record = self.gale_api.get_item(gale_id)
-        except (GaleAPIError, GaleItemForbidden) as err:
-            # store the error in results for reporting
-            self.results[gale_id] = err
-            return
+        if item_record is None:
+            try:
+                item_record = self.gale_api.get_item(gale_id)
+            except (GaleAPIError, GaleItemForbidden) as err:
+                # store the error in results for reporting
+                self.results[gale_id] = err
+                return
 
         # document metadata is under "doc"
         doc_metadata = item_record["doc"]
@@ -517,12 +540,15 @@ class GaleImporter(DigitizedWorkImporter):
         if collections:
             digwork.collections.set(collections)
 
-        # index the work once (signals index twice because of m2m change)
-        DigitizedWork.index_items([digwork])
-
+        # store page metadata locally, if configured, for reindexing without the api
+        save_item_record(gale_id, item_record)
         # item record used for import includes page metadata;
         # for efficiency, index pages at import time with the same api response
-        DigitizedWork.index_items(Page.page_index_data(digwork, item_record))
+        digwork.index_pages(item_record)
+
+        # index the work once (signals index twice because of m2m change);
+        # after pages, so the work record includes the content fingerprint
+        DigitizedWork.index_items([digwork])
 
         # return the newly created record
         return digwork
@@ -63,7 +63,7 @@ class Command(BaseCommand):  # pragma: no cover
                 # NOTE: mets loading copied from hathi_page_index_data method
                 # worth movint to a method on the hathi object?
                 try:
-                    mmets = digwork.hathi.mets_xml()
+                    mets_pages = digwork.hathi.mets_pages()
                 except storage_exceptions.ObjectNotFoundException:
                     # document the error in the output csv, stop processing
                     info["notes"] = "pairtree data not found"
@@ -78,7 +78,7 @@ class Command(BaseCommand):  # pragma: no cover
                 page_info = [
                     {"order": page.order, "label": page.orderlabel}
                     # also have access to label (@LABEL vs @ORDERLABEL)
-                    for page in mmets.structmap_pages
+                    for page in mets_pages
                 ]
 
                 # use digital page range to get the first page in the mets
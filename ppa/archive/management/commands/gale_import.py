@@ -12,6 +12,8 @@ Example usage::
     python manage.py gale_import -c path/to/import.csv
     # import specific items
     python manage.py gale_import galeid1 galeid2 galeid3
+    # retrieve 8 items from the Gale API at a time
+    python manage.py gale_import -c path/to/import.csv --workers 8
 
 When using a CSV file for import, it *must* include an **ID** field;
 it may also include **NOTES** (any contents will be imported into private notes),
@@ -81,6 +83,13 @@ class Command(BaseCommand):
         parser.add_argument(
             "-c", "--csv", type=str, help="CSV file with items to import be imported."
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=GaleAPI.max_workers,
+            help="Number of items to retrieve from the Gale API in parallel "
+            + "(default: %(default)s)",
+        )
         # NOTE: no support for updating records for now, since Gale/ECCO records
         # will not change.
 
@@ -133,17 +142,31 @@ class Command(BaseCommand):
         self.importer = GaleImporter()
         self.importer.add_item_prep()
 
-        for item in to_import:
+        # retrieve records from the Gale API in parallel, ahead of import,
+        # for items that are not already in the database
+        to_fetch = [
+            i
+            for i, item in enumerate(to_import)
+            if not self.is_imported(item["ID"], item.get("Digital Page Range", ""))
+        ]
+        gale_records = self.gale_api.get_items(
+            (to_import[i]["ID"] for i in to_fetch),
+            max_workers=kwargs.get("workers"),
+        )
+        to_fetch = set(to_fetch)
+
+        for i, item in enumerate(to_import):
             if self.verbosity >= self.v_normal:
                 # include title in output if present, but truncate since many are long
                 self.stdout.write(
                     " ".join([item["ID"], truncatechars(item.get("Title", ""), 55)])
                 )
+            gale_record = next(gale_records)[1] if i in to_fetch else None
             # send extra details to import method
             # to handle notes and collection membership from CSV
             item_info = item.copy()
             del item_info["ID"]  # don't send ID twice
-            self.import_record(item["ID"], **item_info)
+            self.import_record(item["ID"], gale_record=gale_record, **item_info)
 
         summary = (
             "\nProcessed {:,d} item{} for import."
@@ -186,22 +209,24 @@ class Command(BaseCommand):
             raise CommandError("ID column is required in CSV file")
         return data
 
-    def import_record(self, gale_id, **kwargs):
-        """Import a single work into the database.
-        Retrieves record data from Gale API."""
-
-        # check if an item with this source id + page range exists
-        # (check local db first because API call is slow for large items)
-
+    def is_imported(self, gale_id, digital_page_range=""):
+        """Check if an item with this source id and page range is
+        already in the database."""
         # use an unsaved digitized work to parse the page range (if any)
         # for queryset filter to check for duplicates
-        dw_pages = DigitizedWork(
-            pages_digital=kwargs.get("Digital Page Range", "").replace(";", ",")
-        )
-
-        if DigitizedWork.objects.filter(
+        dw_pages = DigitizedWork(pages_digital=digital_page_range.replace(";", ","))
+        return DigitizedWork.objects.filter(
             source_id=gale_id, pages_digital=dw_pages.pages_digital
-        ).exists():
+        ).exists()
+
+    def import_record(self, gale_id, gale_record=None, **kwargs):
+        """Import a single work into the database. Uses the record
+        data retrieved from the Gale API if passed in (or the error, if
+        retrieving it failed); otherwise retrieves record data from Gale API."""
+
+        # check if an item with this source id + page range exists
+        # (check local db first because API call is slow for large items)
+        if self.is_imported(gale_id, kwargs.get("Digital Page Range", "")):
             self.stderr.write("%s is already in the database; skipping" % gale_id)
             self.stats["skipped"] += 1
             return
@@ -217,9 +242,17 @@ class Command(BaseCommand):
         # strip whitespace in case any was added in the spreadsheet
         kwargs["item_type"] = self.item_type.get(kwargs.get("Item Type", "").strip())
 
-        digwork = self.importer.import_digitizedwork(
-            gale_id, collections=digwork_collections, **kwargs
-        )
+        if isinstance(gale_record, GaleAPIError):
+            # record could not be retrieved; report as an import error
+            self.importer.results[gale_id] = gale_record
+            digwork = None
+        else:
+            digwork = self.importer.import_digitizedwork(
+                gale_id,
+                collections=digwork_collections,
+                item_record=gale_record,
+                **kwargs,
+            )
 
         # if import failed, check status
         if not digwork:
@@ -1,14 +1,26 @@
 """
 **hathi_images** is a custom manage command for downloading both full-size
 and thumbnail page images for a list of HathiTrust volumes.
+
+Pages are downloaded concurrently by a pool of worker threads sharing
+a single connection pool, with a configurable overall request rate limit.
+When the image server signals throttling (429 or 503 responses), all workers
+pause before retrying. Completed volumes are recorded in a manifest file in
+the volume directory, keyed on the page range (so that multiple excerpts from
+the same volume are tracked separately), and skipped on subsequent runs.
 """
 import argparse
 from collections import Counter
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
 import logging
+import os
 import requests
 from pathlib import Path
 import signal
+import tempfile
+import threading
 import time
 from typing import Self
 
@@ -82,6 +94,52 @@ class DownloadStats:
         return report
 
 
+class RateLimiter:
+    """
+    Thread-safe token bucket rate limiter shared by download workers.
+    Allows an average of `rate` requests per second, with bursts of up to
+    `burst` requests. If `rate` is not set, requests are not limited.
+    All requests can be paused, e.g. when the server signals throttling.
+    """
+
+    def __init__(self, rate: float | None, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.last_update = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Block until a request is allowed
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif not self.rate:
+                    return
+                else:
+                    # add tokens for time elapsed, up to the burst size
+                    elapsed = now - self.last_update
+                    self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                    self.last_update = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Pause all requests for the specified number of seconds
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
 class Command(BaseCommand):
     """
     Download HathiTrust page image data via image server
@@ -93,6 +151,18 @@ class Command(BaseCommand):
     # Interrupt flag to exit gracefully (i.e. between volumes) when a signal is caught
     interrupted = False
 
+    # Name of the manifest file written to a volume directory when complete;
+    # formatted with the first and last page of the downloaded page range
+    manifest_name = "manifest-{first}-{last}.json"
+    # Maximum number of attempts for a single image when throttled
+    max_attempts = 5
+    # Initial and maximum delay in seconds when throttled;
+    # delay doubles on each attempt unless the server specifies Retry-After
+    backoff_delay = 1
+    max_backoff_delay = 60
+    # Request timeout in seconds
+    timeout = 30
+
     # Argument parsing
     def add_arguments(self, parser):
         """
@@ -126,6 +196,18 @@ class Command(BaseCommand):
             help="Display progress bars to track download progress",
             default=True,
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of images to download concurrently. Default: 8",
+            default=8,
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            help="Maximum number of image requests per second; 0 for no limit. Default: 10",
+            default=10,
+        )
   
     def interrupt_handler(self, signum, frame):
         """
@@ -145,62 +227,185 @@ class Command(BaseCommand):
                 )
             )
 
+    def get_session(self, pool_size: int) -> requests.Session:
+        """
+        Create a request session with a connection pool large enough
+        to be shared by all download workers
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get_backoff_delay(self, response: requests.Response, attempt: int) -> float:
+        """
+        Determine how long to pause requests after a throttled response;
+        uses the Retry-After header when it specifies a number of seconds,
+        and otherwise an exponential backoff based on the attempt number.
+        """
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), self.max_backoff_delay)
+        return min(self.backoff_delay * 2**attempt, self.max_backoff_delay)
+
     def download_image(self, page_url: str, out_file: Path) -> bool:
         """
         Attempts to download and save an image from the specified URL.
-        Returns a boolean corresponding to whether the download was successful
+        Returns a boolean corresponding to whether the download was successful.
+        If the request is throttled (429 or 503), all requests are paused
+        before trying again, up to the configured maximum number of attempts.
+        Images are written to a temporary file and renamed when complete,
+        so that an interrupted download never leaves a partial image.
+        """
+        for attempt in range(self.max_attempts):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(page_url, timeout=self.timeout)
+            except requests.exceptions.RequestException as err:
+                logger.debug(f"Error requesting {page_url}: {err}")
+                return False
+
+            if response.status_code == requests.codes.ok:
+                fd, tmp_path = tempfile.mkstemp(dir=out_file.parent, suffix=".tmp")
+                with os.fdopen(fd, "wb") as writer:
+                    writer.write(response.content)
+                os.replace(tmp_path, out_file)
+                return True
+            if response.status_code in (
+                requests.codes.too_many_requests,
+                requests.codes.service_unavailable,
+            ):
+                delay = self.get_backoff_delay(response, attempt)
+                logger.debug(
+                    f"Received {response.status_code} status code. Throttling may "
+                    f"have occurred; pausing requests for {delay}s"
+                )
+                self.rate_limiter.pause(delay)
+                continue
+            return False
+        return False
+
+    def download_page(
+        self, vol_id: str, page_num: int, vol_dir: Path, image_name: str
+    ) -> DownloadStats:
+        """
+        Download full-size and thumbnail images for a single page, skipping
+        any images that already exist. Returns download stats for the page.
         """
-        response = requests.get(page_url)
-        success = False
-        if response.status_code == requests.codes.ok:
-            with out_file.open(mode="wb") as writer:
-                writer.write(response.content)
-            success = True
-        elif response.status_code == 503:
-            logger.debug("Received 503 status code. Throttling may have occurred")
-        return success
+        stats = DownloadStats()
+        for image_type in ["full", "thumbnail"]:
+            image_dir = vol_dir if image_type == "full" else vol_dir / "thumbnails"
+            image = image_dir / image_name
+            image_width = getattr(self, f"{image_type}_width")
+
+            # Fetch image does not exist
+            if not image.is_file():
+                image_url = page_image_url(vol_id, page_num, image_width)
+                success = self.download_image(image_url, image)
+                if success:
+                    stats.log_download(image_type)
+                else:
+                    stats.log_error(image_type)
+                    logger.debug(f"Failed to download {image_type} image {image_name}")
+            else:
+                stats.log_skip(image_type)
+        return stats
 
+    def get_manifest(self, vol_id: str, page_range: Iterable) -> dict:
+        """
+        Manifest data for a volume download: volume id, pages, and image
+        widths, so that changes to any of them require a new download.
+        """
+        return {
+            "htid": vol_id,
+            "pages": list(page_range),
+            "full_width": self.full_width,
+            "thumbnail_width": self.thumbnail_width,
+        }
+
+    def get_manifest_path(self, vol_dir: Path, manifest: dict) -> Path:
+        """
+        Path for a manifest in the volume directory, based on the first
+        and last page in the manifest, so that excerpts from the same
+        volume do not overwrite each other's manifests.
+        """
+        pages = manifest["pages"] or [0]
+        return vol_dir / self.manifest_name.format(first=pages[0], last=pages[-1])
+
+    def volume_complete(self, vol_dir: Path, manifest: dict) -> bool:
+        """
+        Check if a volume has already been downloaded, based on a
+        manifest in the volume directory that matches the current manifest.
+        """
+        try:
+            with self.get_manifest_path(vol_dir, manifest).open() as manifest_file:
+                return json.load(manifest_file) == manifest
+        except (OSError, ValueError):
+            return False
+
+    def save_manifest(self, vol_dir: Path, manifest: dict) -> None:
+        """
+        Save a manifest for a completed volume download
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=vol_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(tmp_path, self.get_manifest_path(vol_dir, manifest))
 
     def download_volume_images(self, vol_id:str, page_range: Iterable) -> DownloadStats:
         """
         For a given volume, download the pages corresponding to the provided page range.
+        Pages are downloaded concurrently; a manifest is saved when all images
+        are downloaded, and volumes with a matching manifest are skipped.
         """
         # Get volume directory
         vol_dir = self.output_dir / get_vol_dir(vol_id)
+        stats = DownloadStats()
+
+        # Skip volume if it has already been downloaded
+        manifest = self.get_manifest(vol_id, page_range)
+        if self.volume_complete(vol_dir, manifest):
+            for _ in page_range:
+                stats.log_skip("full")
+                stats.log_skip("thumbnail")
+            if self.show_progress:
+                self.progress_bar.update(len(page_range))
+            logger.debug(f"{vol_id}: Skipped (already downloaded)")
+            return stats
+
         vol_dir.mkdir(parents=True, exist_ok=True)
         # Get volume's thumbnail directory
         thumbnail_dir = vol_dir / "thumbnails"
         thumbnail_dir.mkdir(exist_ok=True)
-            
+
         # Get filename-friendly version of htid
         clean_htid = encode_htid(vol_id)
-            
+
         # Fetch images
-        stats = DownloadStats()
         start_time = time.time()
-        for page_num in page_range:
-            image_name = f"{clean_htid}.{page_num:08d}.jpg"
-
-            for image_type in ["full", "thumbnail"]:
-                image_dir = vol_dir if image_type == "full" else thumbnail_dir
-                image = image_dir / image_name
-                image_width = getattr(self, f"{image_type}_width")
-
-                # Fetch image does not exist
-                if not image.is_file():
-                    image_url = page_image_url(vol_id, page_num, image_width)
-                    success = self.download_image(image_url, image)
-                    if success:
-                        stats.log_download(image_type)
-                    else:
-                        stats.log_error(image_type)
-                        logger.debug(f"Failed to download {image_type} image {image_name}")
-                else:
-                    stats.log_skip(image_type)
-
+        futures = [
+            self.executor.submit(
+                self.download_page,
+                vol_id,
+                page_num,
+                vol_dir,
+                f"{clean_htid}.{page_num:08d}.jpg",
+            )
+            for page_num in page_range
+        ]
+        for future in as_completed(futures):
+            stats.update(future.result())
             # Update progress bar
             if self.show_progress:
                 self.progress_bar.update()
+
+        # Record volume as complete if all images were downloaded
+        if not stats.full["error"] and not stats.thumbnail["error"]:
+            self.save_manifest(vol_dir, manifest)
+
         # Log volume page completion rates
         duration = time.time() - start_time
         page_rate = duration / len(page_range)
@@ -213,6 +418,7 @@ class Command(BaseCommand):
         self.full_width = kwargs["image_width"]
         self.thumbnail_width = kwargs["thumbnail_width"]
         self.show_progress = kwargs["progress"]
+        workers = kwargs["workers"]
 
         # Validate input arguments
         if not self.output_dir.is_dir():
@@ -221,6 +427,8 @@ class Command(BaseCommand):
             )
         if self.thumbnail_width > 250:
             raise CommandError("Thumbnail width cannot be more than 250 pixels")
+        if workers < 1:
+            raise CommandError("Number of workers must be at least 1")
 
         # use ids specified via command line when present
         htids = kwargs.get("htids", [])
@@ -253,7 +461,12 @@ class Command(BaseCommand):
         # Initialize progress bar
         if self.show_progress:
             self.progress_bar = tqdm()
-       
+
+        # Initialize shared session, rate limiter, and download workers
+        self.session = self.get_session(workers)
+        self.rate_limiter = RateLimiter(kwargs["rate"], burst=workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
         overall_stats = DownloadStats()
         for i, digwork in enumerate(digworks):
             # Check if we need to exit early
@@ -277,6 +490,8 @@ class Command(BaseCommand):
             # Download volume images & update overall stats
             vol_stats = self.download_volume_images(vol_id, page_range)
             overall_stats.update(vol_stats)
+        self.executor.shutdown()
+        self.session.close()
         # Close progress bar
         if self.show_progress:
             self.progress_bar.close()
@@ -31,6 +31,8 @@ Example usage::
     python manage.py hathi_import --update
     # display progressbar to show status and ETA
     python manage.py hathi_import -v 0 --progress
+    # request bibliographic data for 10 items at a time
+    python manage.py hathi_import --batch-size 10
 
 """
 
@@ -40,8 +42,10 @@ import os
 import time
 from collections import defaultdict
 from glob import glob
+from itertools import batched
 
 import progressbar
+import requests
 from django.conf import settings
 from django.contrib.admin.models import ADDITION, CHANGE, LogEntry
 from django.contrib.contenttypes.models import ContentType
@@ -87,6 +91,13 @@ class Command(BaseCommand):
             action="store_true",
             help="Display a progress bar to track the status of the import.",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Number of items to request bibliographic data for at once "
+            + "(default: %(default)s)",
+        )
 
     def handle(self, *args, **kwargs):
         # disconnect signal handler for on-demand indexing, for efficiency
@@ -130,12 +141,12 @@ class Command(BaseCommand):
         # initialize access to rsync data as dict of pairtrees by prefix
         self.initialize_pairtrees()
 
-        for htid in ids_to_import:
+        for htid, bibdata in self.get_bibdata(ids_to_import):
             if self.verbosity >= self.v_normal:
                 self.stdout.write(htid)
             self.stats["count"] += 1
 
-            digwork = self.import_digitizedwork(htid)
+            digwork = self.import_digitizedwork(htid, bibdata=bibdata)
             # if no item is returned, either there is an error or no update
             # is needed; update count and go to the next item
             if not digwork:
@@ -226,9 +237,63 @@ class Command(BaseCommand):
         logger.debug("Counted hathi ids in %f sec" % (time.time() - start))
         return count
 
-    def import_digitizedwork(self, htid):
+    def get_bibdata(self, htids):
+        """Generator of hathi ids with bibliographic data, retrieved from
+        the Hathi api in batches of ids using multiple-record requests.
+        Brief records are retrieved first; when a brief record shows that an
+        existing work is up to date, it is used as is. Otherwise, full records
+        are loaded from the local bibliographic data cache when the cached
+        copy is current, and retrieved from the api when it is not.
+        Bibliographic data is None for any ids not found in the batch
+        request, or if the batch request fails."""
+        batch_size = self.options["batch_size"]
+        for batch in batched(htids, batch_size):
+            bibdata = {}
+            try:
+                brief_records = self.bib_api.records(
+                    "htid", batch, mode="brief", batch_size=batch_size
+                )
+                # last modification dates for works already in the database
+                local_updated = dict(
+                    DigitizedWork.objects.filter(source_id__in=batch).values_list(
+                        "source_id", "updated"
+                    )
+                )
+                full_needed = []
+                for htid, brief_record in brief_records:
+                    source_updated = brief_record.copy_last_updated(htid)
+                    if (
+                        not self.options["update"]
+                        and htid in local_updated
+                        and local_updated[htid].date() > source_updated
+                    ):
+                        # no update needed; brief record is sufficient
+                        bibdata[htid] = brief_record
+                        continue
+                    cached_record = self.bib_api.cached_record("htid", htid)
+                    if (
+                        cached_record
+                        and cached_record.copy_details(htid)
+                        and cached_record.copy_last_updated(htid) == source_updated
+                    ):
+                        bibdata[htid] = cached_record
+                    else:
+                        full_needed.append(htid)
+
+                if full_needed:
+                    bibdata.update(
+                        self.bib_api.records("htid", full_needed, batch_size=batch_size)
+                    )
+            except requests.exceptions.RequestException as err:
+                logger.warning("Error retrieving bibliographic data: %s", err)
+            for htid in batch:
+                yield htid, bibdata.get(htid)
+
+    def import_digitizedwork(self, htid, bibdata=None):
         """Import a single work into the database.
-        Retrieves bibliographic data from Hathi api. If the record already
+        Uses bibliographic data if passed in (e.g., retrieved by
+        :meth:`get_bibdata`); otherwise retrieves bibliographic data
+        from Hathi api. If the record already
         exists in the database, it is only updated if the hathi record
         has changed or if an update is requested by the user.
         Creates admin log entry for record creation or record update.
@@ -245,6 +310,7 @@ class Command(BaseCommand):
                 self.bib_api,
                 update=self.options["update"],
                 log_msg_src="via hathi_import script",
+                bibdata=bibdata,
             )
         except HathiItemNotFound:
             self.stdout.write("Error: Bibliographic data not found for '%s'" % htid)
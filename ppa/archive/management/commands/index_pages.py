@@ -3,17 +3,20 @@ Custom multiprocessing Solr index script for page index data.
 """
 
 import itertools
+import json
+import os
 import queue
+from collections import Counter
 from time import sleep
 
 import progressbar
-from django.core.management.base import BaseCommand
-from django.db import models
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models
 from django.template.defaultfilters import pluralize
 from parasolr.django import SolrClient, SolrQuerySet
-from multiprocess import Process, JoinableQueue, cpu_count
+from multiprocess import Process, JoinableQueue, Queue, Value, cpu_count
 
-from ppa.archive.models import DigitizedWork, Page
+from ppa.archive.models import Collection, DigitizedWork, Page
 from ppa.archive.solr import PageSearchQuerySet
 
 
@@ -25,18 +28,50 @@ def iterator_chunks(iterable, size=100):
         yield itertools.chain([first], itertools.islice(iterator, size - 1))
 
 
-def page_index_data(work_q, page_data_q):
+def page_data_size(page_data):
+    """Approximate size in bytes of a page when serialized for Solr,
+    based on the length of its field values."""
+    return sum(len(str(value)) for value in page_data.values()) + 20 * len(page_data)
+
+
+def page_index_data(work_q, page_data_q, progress_q=None):
     """Function to generate page index data and add it to
-    a queue. Takes a queue with digitized works to generate pages
-    for and a queue where page data will be added."""
+    a queue. Takes a queue with database ids for digitized works to
+    generate pages for, and a queue where page data will be added as a
+    tuple of work id, approximate size in bytes, and a list of page data.
+    If a progress queue is specified, the total number of pages for each
+    work is reported when all of its page data has been queued, along with
+    the fingerprint of the source content used to generate it.
+    Stops when it gets a `None` from the work queue."""
     while True:
         try:
-            # convert the generator to a list
-            digwork = work_q.get(timeout=1)
+            work_id = work_q.get()
+            # None indicates there are no more works to process
+            if work_id is None:
+                work_q.task_done()
+                return
+            digwork = DigitizedWork.objects.select_related("cluster").get(pk=work_id)
+            # get fingerprint before loading content, so that any changes
+            # made while generating page data will be picked up next time
+            fingerprint = digwork.get_content_fingerprint()
             # — might be nice to chunk, but most books are small
             # enough it doesn't matter that much
+            total_pages = 0
             for page_data in iterator_chunks(Page.page_index_data(digwork)):
-                page_data_q.put(list(page_data))
+                page_data = list(page_data)
+                total_pages += len(page_data)
+                # blocks when the queue is full, until indexers catch up
+                page_data_q.put(
+                    (
+                        work_id,
+                        sum(page_data_size(page) for page in page_data),
+                        page_data,
+                    )
+                )
+            if progress_q is not None:
+                progress_q.put(
+                    (IndexCheckpoint.GENERATED, work_id, total_pages, fingerprint)
+                )
             # update queue that task has been completed
             work_q.task_done()
 
@@ -47,31 +82,65 @@ def page_index_data(work_q, page_data_q):
             # even though queue is not empty
             return
 
-        except queue.Empty:
-            # worker is done when the work queue is empty
-            return
+        except DigitizedWork.DoesNotExist:
+            # work was deleted after indexing started; skip it
+            work_q.task_done()
 
 
-def process_index_queue(index_data_q, total_to_index, work_q):
-    """Function to send index data to Solr. Takes a
-    queue to poll for index data, a total of the items
-    to be indexed (for use with progess bar), and a work queue
-    as a way of checking that all indexing is complete."""
+def process_index_queue(
+    index_data_q, indexed_count, batch_bytes=5_000_000, progress_q=None
+):
+    """Function to send index data to Solr. Takes a queue to poll for
+    index data, a shared counter to increment with the number of items
+    indexed (for use with progress bar), and an approximate maximum
+    batch size in bytes. Page data is collected from the queue and sent
+    to Solr when the batch size is reached or the queue is idle.
+    Each indexing process uses its own Solr client, with its own
+    keep-alive http session. If a progress queue is specified, the number
+    of pages indexed for each work is reported after each batch is sent.
+    Stops when it gets a `None` from the queue."""
 
     solr = SolrClient()
-    progbar = progressbar.ProgressBar(
-        redirect_stdout=True, max_value=total_to_index, max_error=False
-    )
-    count = 0
+    batch = []
+    batch_size = 0
+    batch_works = Counter()
+
+    def index_batch():
+        nonlocal batch, batch_size, batch_works
+        if batch:
+            solr.update.index(batch)
+            with indexed_count.get_lock():
+                indexed_count.value += len(batch)
+            if progress_q is not None:
+                for work_id, count in batch_works.items():
+                    progress_q.put((IndexCheckpoint.INDEXED, work_id, count))
+        batch = []
+        batch_size = 0
+        batch_works = Counter()
+
     while True:
         try:
-            # get data from the queue and put it into Solr
-            # block with a timeout
-            index_data = index_data_q.get(timeout=1)
-            solr.update.index(index_data)
-            # increase count based on the number of items in the list
-            count += len(index_data)
-            progbar.update(count)
+            # get data from the queue and add it to the current batch;
+            # block with a timeout so partial batches are not held
+            # while page data is being generated
+            try:
+                index_data = index_data_q.get(timeout=1)
+            except queue.Empty:
+                index_batch()
+                continue
+
+            # None indicates there is no more data to index
+            if index_data is None:
+                index_batch()
+                index_data_q.task_done()
+                return
+
+            work_id, data_size, page_data = index_data
+            batch.extend(page_data)
+            batch_size += data_size
+            batch_works[work_id] += len(page_data)
+            if batch_size >= batch_bytes:
+                index_batch()
             # update queue - task has been completed
             index_data_q.task_done()
 
@@ -83,15 +152,99 @@ def process_index_queue(index_data_q, total_to_index, work_q):
             print("KeyboardInterrupt, exiting indexing queue")
             return
 
-        except queue.Empty:
-            # if page data queue is empty BUT indexing has started (i.e.
-            # count is not zero, not waiting on initial content)
-            # AND if work q is also empty, then end;
-            # otherwise, loop again: indexer is ahead of page index data
-            if count and work_q.empty():
-                progbar.finish()
-                # finish indexing process
-                return
+
+class IndexCheckpoint:
+    """Track works with all pages indexed in Solr. Progress is tracked
+    from messages reported by page data and indexing processes; a work is
+    complete when the number of pages indexed matches the number of pages
+    generated. Source content fingerprints for completed works are
+    collected so they can be saved to the database.
+
+    If a path is specified, completed works are appended to a journal
+    file as JSON lines with database id and page count, so that an
+    interrupted page indexing run can be resumed."""
+
+    #: progress message type for total pages generated for a work
+    GENERATED = "generated"
+    #: progress message type for number of pages indexed for a work
+    INDEXED = "indexed"
+
+    def __init__(self, path=None, resume=False):
+        self.path = path
+        #: dictionary of completed work ids and page counts
+        self.completed = self.load(path) if resume else {}
+        #: dictionary of work ids and fingerprints for works completed
+        #: in this run that have not yet been saved
+        self.fingerprints = {}
+        self.generated = {}
+        self.generated_fingerprints = {}
+        self.indexed = Counter()
+        self.journal = None
+        if path is None:
+            return
+        # append when resuming, otherwise start a new journal
+        self.journal = open(path, "a" if resume else "w", encoding="utf-8")
+        # if a previous run was killed while writing,
+        # make sure new entries start on a new line
+        if resume and self.journal.tell():
+            with open(path, "rb") as journal:
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b"\n":
+                    self.journal.write("\n")
+
+    @staticmethod
+    def load(path):
+        """Load completed works from an existing checkpoint journal.
+        Returns a dictionary of work id and page count."""
+        completed = {}
+        try:
+            with open(path, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # ignore a partially-written line, e.g. if the
+                        # script was killed while writing
+                        continue
+                    completed[entry["work_id"]] = entry["pages"]
+        except FileNotFoundError:
+            pass
+        return completed
+
+    def update(self, message):
+        """Update progress from a message reported by page data or
+        indexing processes; records the work as completed when all pages
+        have been indexed."""
+        if message[0] == self.GENERATED:
+            _, work_id, count, fingerprint = message
+            self.generated[work_id] = count
+            self.generated_fingerprints[work_id] = fingerprint
+        else:
+            _, work_id, count = message
+            self.indexed[work_id] += count
+        if (
+            work_id in self.generated
+            and self.indexed[work_id] >= self.generated[work_id]
+        ):
+            fingerprint = self.generated_fingerprints.pop(work_id)
+            if fingerprint is not None:
+                self.fingerprints[work_id] = fingerprint
+            self.complete(work_id, self.generated.pop(work_id))
+            del self.indexed[work_id]
+
+    def complete(self, work_id, pages):
+        """Record a work as completed, in the journal if there is one."""
+        self.completed[work_id] = pages
+        if self.journal is None:
+            return
+        self.journal.write(json.dumps({"work_id": work_id, "pages": pages}) + "\n")
+        # flush and sync to disk so the journal survives a node restart
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
 
 
 class Command(BaseCommand):
@@ -112,9 +265,49 @@ class Command(BaseCommand):
             type=int,
             help="Number of processes to use " + "(cpu_count by default: %(default)s)",
         )
+        parser.add_argument(
+            "-i",
+            "--indexers",
+            default=2,
+            type=int,
+            help="Number of concurrent processes for sending data to Solr "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            default=5_000_000,
+            type=int,
+            help="Approximate size in bytes of page data to send to Solr "
+            + "in a single request (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--queue-size",
+            default=100,
+            type=int,
+            help="Maximum number of page data chunks (up to 100 pages each) waiting "
+            + "to be sent to Solr (default: %(default)s)",
+        )
         parser.add_argument(
             "source_ids", nargs="*", help="List of specific items to index (optional)"
         )
+        parser.add_argument(
+            "--changed-only",
+            help="Only index works where source content has changed "
+            + "since pages were last indexed",
+            action="store_true",
+            default=False,
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Path to a journal file for recording works with all pages indexed",
+        )
+        parser.add_argument(
+            "--resume",
+            help="Skip works recorded as completed in the checkpoint journal "
+            + "(requires --checkpoint)",
+            action="store_true",
+            default=False,
+        )
         parser.add_argument(
             "--expedite",
             help="Only index works with page count mismatch between Solr and database",
@@ -138,9 +331,15 @@ class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
         self.verbosity = kwargs.get("verbosity", self.v_normal)
+        checkpoint_path = kwargs.get("checkpoint")
+        if kwargs.get("resume") and not checkpoint_path:
+            raise CommandError("A checkpoint file is required to resume indexing")
         num_processes = kwargs.get("processes", cpu_count())
+        num_indexers = max(1, kwargs.get("indexers", 2))
         self.work_q = JoinableQueue()
-        self.page_data_q = JoinableQueue()
+        # bound the page data queue so that page data generation
+        # does not get too far ahead of indexing
+        self.page_data_q = JoinableQueue(maxsize=kwargs.get("queue_size", 100))
         # populate the work queue with digitized works that have
         # page content to be indexed
         source_ids = kwargs.get("source_ids", [])
@@ -214,33 +413,84 @@ class Command(BaseCommand):
                     f"Indexing pages for {len(mismatches)} works with page count mismatches"
                 )
             # only index works with page count mismatches
-            digiworks = mismatches.keys()
+            work_ids = [digwork.pk for digwork in mismatches.keys()]
+        else:
+            work_ids = digiworks.values_list("pk", flat=True)
 
-        for digwork in digiworks:
-            self.work_q.put(digwork)
+        if kwargs.get("changed_only"):
+            # only index works where source content fingerprint has changed
+            changed = self.get_changed_works(digiworks)
+            work_ids = [pk for pk in work_ids if pk in changed]
+            num_pages = sum(changed[pk] for pk in work_ids)
+            if self.verbosity >= self.v_normal:
+                self.stdout.write(
+                    f"Indexing pages for {len(work_ids):,} "
+                    + f"work{pluralize(work_ids)} with changed content"
+                )
+
+        # track completed works and pages indexed; when checkpointing,
+        # record completed works so indexing can be resumed
+        self.checkpoint = IndexCheckpoint(checkpoint_path, resume=kwargs.get("resume"))
+        self.progress_q = Queue()
+        self.fingerprinted_ids = set()
+        if self.checkpoint.completed:
+            # skip works that were completed in a previous run
+            completed = self.checkpoint.completed
+            skipped = [pk for pk in work_ids if pk in completed]
+            work_ids = [pk for pk in work_ids if pk not in completed]
+            skipped_pages = sum(completed[pk] for pk in skipped)
+            num_pages = max(0, (num_pages or 0) - skipped_pages)
+            if self.verbosity >= self.v_normal:
+                self.stdout.write(
+                    f"Resuming; skipping {len(skipped):,} completed "
+                    + f"work{pluralize(skipped)} ({skipped_pages:,} pages)"
+                )
+
+        # populate the work queue with database ids only
+        for work_id in work_ids:
+            self.work_q.put(work_id)
+
+        # close database connections before starting processes,
+        # so that each process opens its own connection
+        connections.close_all()
 
         # start multiple processes to populate the page index data queue
         # (need at least 1 page data process, no matter what was specified)
         self.data_feeders = []
         for i in range(max(1, kwargs["processes"] - 1)):
             process = Process(
-                target=page_index_data, args=(self.work_q, self.page_data_q)
+                target=page_index_data,
+                args=(self.work_q, self.page_data_q, self.progress_q),
             )
             process.start()
             self.data_feeders.append(process)
+            # signal to each page data process when there are no more works
+            self.work_q.put(None)
 
         # give the page data a head start, since indexing is faster
         sleep(1)
 
-        # start a single indexing process
-        self.indexer = Process(
-            target=process_index_queue,
-            args=(self.page_data_q, num_pages, self.work_q),
+        # start multiple indexing processes to send data to solr
+        indexed_count = Value("i", 0)
+        self.indexers = []
+        for i in range(num_indexers):
+            process = Process(
+                target=process_index_queue,
+                args=(
+                    self.page_data_q,
+                    indexed_count,
+                    kwargs.get("batch_size"),
+                    self.progress_q,
+                ),
+            )
+            process.start()
+            self.indexers.append(process)
+
+        progbar = progressbar.ProgressBar(
+            redirect_stdout=True, max_value=num_pages, max_error=False
         )
-        self.indexer.start()
         try:
-            # block until indexer has completed, but catch keyboard interrupt
-            self.indexer.join()
+            self.wait_for_processes(progbar, indexed_count)
         except KeyboardInterrupt:
             # if user interrupts indexing with Ctrl-C,
             # terminate and join all the processes
@@ -249,6 +499,16 @@ class Command(BaseCommand):
         # when indexing is complete or interrupted with Ctrl-C,
         # end and join all processes
         self.end_processes()
+        # record any remaining progress reported before processes ended
+        self.update_checkpoint()
+        self.checkpoint.close()
+        # update work records in Solr with new content fingerprints
+        if self.fingerprinted_ids:
+            DigitizedWork.index_items(
+                DigitizedWork.items_to_index().filter(pk__in=self.fingerprinted_ids)
+            )
+            # check for updated collection stats
+            Collection.expire_stats()
 
         # print a summary of solr totals by item type
         if self.verbosity >= self.v_normal:
@@ -262,12 +522,67 @@ class Command(BaseCommand):
             )
         return
 
+    def wait_for_processes(self, progbar, indexed_count):
+        """Wait for page data and indexing processes to complete,
+        updating the progress bar with the shared count of indexed pages."""
+        # wait for page data processes to complete
+        while any(proc.is_alive() for proc in self.data_feeders):
+            # if indexers have stopped (e.g., due to a Solr error),
+            # page data processes will block on the full queue
+            if not any(proc.is_alive() for proc in self.indexers):
+                self.stderr.write(
+                    self.style.ERROR("Indexing processes exited unexpectedly")
+                )
+                return
+            progbar.update(indexed_count.value)
+            self.update_checkpoint()
+            sleep(1)
+
+        # then signal each indexer that no more data is coming
+        for proc in self.indexers:
+            self.page_data_q.put(None)
+        # and wait for indexers to complete
+        while any(proc.is_alive() for proc in self.indexers):
+            progbar.update(indexed_count.value)
+            self.update_checkpoint()
+            sleep(1)
+        progbar.update(indexed_count.value)
+        progbar.finish()
+
+    def update_checkpoint(self):
+        """Record progress messages from page data and indexing processes,
+        and save content fingerprints for works with all pages indexed."""
+        while True:
+            try:
+                self.checkpoint.update(self.progress_q.get_nowait())
+            except queue.Empty:
+                break
+        for work_id, fingerprint in self.checkpoint.fingerprints.items():
+            DigitizedWork.objects.filter(pk=work_id).update(
+                content_fingerprint=fingerprint
+            )
+            self.fingerprinted_ids.add(work_id)
+        self.checkpoint.fingerprints.clear()
+
+    def get_changed_works(self, digiworks):
+        """Identify works where the current source content fingerprint does
+        not match the fingerprint saved when pages were last indexed.
+        Returns a dictionary of work id and page count."""
+        changed = {}
+        for digwork in digiworks:
+            fingerprint = digwork.get_content_fingerprint()
+            # if content is unavailable, there is nothing to reindex
+            if fingerprint is None or fingerprint == digwork.content_fingerprint:
+                continue
+            changed[digwork.pk] = digwork.page_count or 0
+            if self.verbosity > self.v_normal:
+                self.stdout.write(f"{digwork} content has changed")
+        return changed
+
     def end_processes(self):
         # make sure all processes are closed and joined
         # to the script will end cleanly
-        self.indexer.terminate()
-        self.indexer.join()
-        for proc in self.data_feeders:
+        for proc in self.data_feeders + self.indexers:
             proc.terminate()
             proc.join()
         self.work_q.close()
@@ -0,0 +1,94 @@
+"""
+**run_index_jobs** is a custom manage command to run a background worker
+for indexing jobs queued by changes made in the Django admin, such as
+page range changes on excerpts, cluster or collection changes, and imports.
+Jobs are only queued when **INDEX_JOB_QUEUE** is enabled in Django settings.
+
+By default, the worker polls the database for new jobs until it is stopped;
+use `--once` to exit when there are no more queued jobs. On startup, jobs
+that have been running for longer than `--stale-after` minutes (e.g., because
+a worker was stopped) are queued to run again.
+
+Example usage::
+
+    python manage.py run_index_jobs
+    python manage.py run_index_jobs --once
+
+"""
+
+from datetime import timedelta
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from ppa.archive.models import IndexJob
+
+
+class Command(BaseCommand):
+    """Run queued indexing jobs"""
+
+    help = __doc__
+    #: normal verbosity level
+    v_normal = 1
+    verbosity = v_normal
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            help="Exit when there are no more queued jobs",
+            action="store_true",
+            default=False,
+        )
+        parser.add_argument(
+            "--interval",
+            default=5,
+            type=float,
+            help="Seconds to wait before checking for new jobs "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            default=100,
+            type=int,
+            help="Maximum number of jobs to claim at once (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--stale-after",
+            default=60,
+            type=int,
+            help="Requeue jobs that have been running for more than this many "
+            + "minutes; 0 to disable (default: %(default)s)",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs.get("verbosity", self.v_normal)
+        # requeue jobs left running by a worker that was stopped
+        if kwargs["stale_after"]:
+            requeued, failed = IndexJob.requeue_stale(
+                timedelta(minutes=kwargs["stale_after"])
+            )
+            if (requeued or failed) and self.verbosity >= self.v_normal:
+                self.stdout.write(
+                    "Requeued %d stale job%s (%d already queued)"
+                    % (requeued, "" if requeued == 1 else "s", failed)
+                )
+        try:
+            while True:
+                jobs = IndexJob.claim(limit=kwargs["batch_size"])
+                if not jobs:
+                    if kwargs["once"]:
+                        return
+                    sleep(kwargs["interval"])
+                    continue
+
+                if self.verbosity >= self.v_normal:
+                    self.stdout.write(
+                        "Running %d %s job%s"
+                        % (len(jobs), jobs[0].action, "" if len(jobs) == 1 else "s")
+                    )
+                IndexJob.process(jobs)
+        except KeyboardInterrupt:
+            # jobs claimed but not finished are left as running;
+            # they are requeued when a worker starts after the stale timeout,
+            # or can be requeued from the admin
+            self.stdout.write("Stopping indexing job worker")
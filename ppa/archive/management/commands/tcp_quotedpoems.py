@@ -5,7 +5,6 @@ import re
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.template.defaultfilters import pluralize
-from neuxml import xmlmap
 import progressbar
 from corppa.poetry_detection.core import Excerpt
 
@@ -88,8 +87,10 @@ class Command(BaseCommand):
                 progbar.update(count)
                 # FIXME: there's a slowdown between here; related to solr client init? (why?)
                 for work in digworks:
-                    tcp_text = eebo_tcp.load_tcp_text(work.source_id)
-                    quoted_poems = self.get_quoted_poems(work, tcp_text)
+                    text_data = eebo_tcp.load_text_data(
+                        eebo_tcp.tcp_xml_path(work.source_id)
+                    )
+                    quoted_poems = self.get_quoted_poems(work, text_data)
                     csvwriter.writerows(quoted_poems)
                     count_qpoems += len(quoted_poems)
                     count += 1
@@ -109,10 +110,10 @@ class Command(BaseCommand):
                 count = 0  # reset count for progress bar for ecco-tcp subset
                 progbar.update(count)
                 for work in ecco_digworks:
-                    tcp_text = xmlmap.load_xmlobject_from_file(
-                        self.ecco_tcp_path / f"{work.source_id}.xml", eebo_tcp.Text
+                    text_data = eebo_tcp.load_text_data(
+                        self.ecco_tcp_path / f"{work.source_id}.xml"
                     )
-                    quoted_poems = self.get_quoted_poems(work, tcp_text)
+                    quoted_poems = self.get_quoted_poems(work, text_data)
                     csvwriter.writerows(quoted_poems)
                     count_qpoems += len(quoted_poems)
                     count += 1
@@ -120,8 +121,8 @@ class Command(BaseCommand):
 
         self.stdout.write(f"\nFound {count_qpoems:,} poem excerpts total")
 
-    def get_quoted_poems(self, work, tcp_text):
-        # given a DigitizedWork and a TCP text, return a list of
+    def get_quoted_poems(self, work, text_data):
+        # given a DigitizedWork and extracted TCP text data, return a list of
         # dictionaries with information about quoted poems
         poems = []
         work_index_id = work.index_id()
@@ -129,7 +130,7 @@ class Command(BaseCommand):
         # get span start/end index within page text content
         if work.source == DigitizedWork.EEBO:
             # for eebo, use the page index data used for indexing solr,
-            # which is generated from local xml
+            # which is generated from local xml (cached text data, if configured)
             work_page_contents = Page.page_index_data(work)
             # get the first page of data from the generator
             page_data = next(work_page_contents)
@@ -138,8 +139,8 @@ class Command(BaseCommand):
             work_page_contents = gale.get_local_ocr(work.source_id)
             page_data = None
 
-        for qpoem in tcp_text.quoted_poems:
-            page_index = int(qpoem.start_page.index)
+        for qpoem in text_data.quoted_poems:
+            page_index = qpoem.start_page
 
             # if this is in an excerpt, check if it is in range
             if work.item_type != DigitizedWork.FULL:
@@ -149,7 +150,7 @@ class Command(BaseCommand):
 
             # quoted poems may wrap across page boundaries
             # output run row per paged chunk of poem text
-            poem_chunks = list(qpoem.text_by_page())
+            poem_chunks = qpoem.text_chunks
             for i, text_chunk in enumerate(poem_chunks):
                 text_chunk = text_chunk.strip()  # remove whitespace on the edges
 
@@ -199,14 +200,13 @@ class Command(BaseCommand):
                     notes.append("Continued quotation from previous page")
                 # in at least one case, we have any linegroups with language
                 # information; include that in the notes
-                languages = [lg.language for lg in qpoem.line_groups if lg.language]
+                languages = qpoem.languages
                 if languages:
                     notes.append(
                         f"Language{pluralize(languages)}: {','.join(languages)}"
                     )
                 # some documents have marginal notes with a citation
-                for note in qpoem.notes:
-                    notes.append(f"{note.label}: {note}")
+                notes.extend(qpoem.notes)
 
                 # alignment could be used if we can't find indices,,
                 # but it is not guaranteed to be reliable and we don't have a way to check;
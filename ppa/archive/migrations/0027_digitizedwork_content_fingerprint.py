@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-16 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("archive", "0026_sourcenote"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitizedwork",
+            name="content_fingerprint",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Fingerprint of source content when pages were last indexed",
+                max_length=40,
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-16 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("archive", "0027_digitizedwork_content_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexJob",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("work", "Index work"),
+                            ("pages", "Index pages"),
+                            ("cluster", "Update page cluster"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("started", models.DateTimeField(blank=True, null=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+                (
+                    "digwork",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="archive.digitizedwork",
+                        verbose_name="Digitized work",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "indexing job",
+                "ordering": ("-created",),
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("status", "queued")),
+                        fields=("digwork", "action"),
+                        name="unique_queued_indexjob",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
 import logging
 import re
+import threading
 import time
+import traceback
+import uuid
 from zipfile import ZipFile
 
 from cached_property import cached_property
@@ -8,9 +11,11 @@ from django.conf import settings
 from django.contrib.admin.models import ADDITION, CHANGE, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
 from flags import Flags
 from intspan import ParseError as IntSpanParseError
 from intspan import intspan
@@ -23,7 +28,7 @@ from wagtail.fields import RichTextField
 from wagtail.snippets.models import register_snippet
 
 from ppa.archive import eebo_tcp
-from ppa.archive.gale import GaleAPI
+from ppa.archive.gale import GaleAPI, local_ocr_fingerprint
 from ppa.archive.hathi import HathiBibliographicAPI, HathiObject
 
 
@@ -95,12 +100,86 @@ class Collection(TrackChangesModel):
         """check if name has been changed (only works on current instance)"""
         return self.has_changed("name")
 
-    @staticmethod
-    def stats():
+    #: cache key for collection stats
+    STATS_CACHE_KEY = "collection-stats"
+    #: cache key to ensure only one process recalculates stats at a time
+    STATS_LOCK_KEY = "collection-stats-lock"
+
+    @classmethod
+    def stats(cls):
         """Collection counts and date ranges, based on what is in Solr.
         Returns a dictionary where they keys are collection names and
         values are a dictionary with count and dates.
+
+        Stats are cached and only recalculated when works in the Solr index
+        have been added, updated, or removed; the index is checked at most every
+        **COLLECTION_STATS_CHECK_INTERVAL** seconds (default: 5 minutes).
         """
+        cached = cache.get(cls.STATS_CACHE_KEY)
+        check_interval = getattr(settings, "COLLECTION_STATS_CHECK_INTERVAL", 300)
+        if cached and time.time() - cached["checked"] < check_interval:
+            return cached["stats"]
+
+        # only one process at a time should check the index and recalculate;
+        # others use previously cached stats if there are any
+        if cache.add(cls.STATS_LOCK_KEY, True, timeout=60):
+            try:
+                return cls.refresh_stats(cached)
+            finally:
+                cache.delete(cls.STATS_LOCK_KEY)
+        if cached:
+            return cached["stats"]
+        # nothing cached yet; calculate without waiting for the other process
+        return cls.solr_stats()
+
+    @classmethod
+    def refresh_stats(cls, cached=None):
+        """Check the Solr index and cache current collection stats.
+        Stats are only recalculated if works in Solr have changed
+        since the cached stats were calculated."""
+        index_version = cls.index_version()
+        if cached and index_version and cached.get("index_version") == index_version:
+            stats = cached["stats"]
+        else:
+            stats = cls.solr_stats()
+        cache.set(
+            cls.STATS_CACHE_KEY,
+            {"stats": stats, "index_version": index_version, "checked": time.time()},
+            timeout=None,
+        )
+        return stats
+
+    @classmethod
+    def expire_stats(cls):
+        """Check the Solr index for changes the next time stats are used,
+        e.g. after works have been indexed."""
+        cached = cache.get(cls.STATS_CACHE_KEY)
+        if cached:
+            cached["checked"] = 0
+            cache.set(cls.STATS_CACHE_KEY, cached, timeout=None)
+
+    @staticmethod
+    def index_version():
+        """Version of works in the Solr index, for checking if works have
+        changed: the number of works (which changes when works are removed
+        or suppressed) and the most recent last modified value.
+        Returns None if not available."""
+        sqs = (
+            SolrQuerySet()
+            .filter(item_type="work")
+            .order_by("-last_modified")
+            .only("last_modified")
+        )
+        response = sqs.get_response(rows=1)
+        # if there is a query error, no response is returned
+        if not response:
+            return None
+        last_modified = response.docs[0].get("last_modified") if response.docs else None
+        return (response.numFound, last_modified)
+
+    @staticmethod
+    def solr_stats():
+        """Query Solr for collection counts and date ranges."""
 
         # NOTE: if we *only* want counts, could just do a regular facet
         sqs = (
@@ -225,7 +304,7 @@ class SignalHandlers:
                 logger.debug(
                     f"collection save, reindexing {works.count()} related works"
                 )
-                DigitizedWork.index_items(works)
+                IndexJob.submit(IndexJob.WORK, works)
 
     @staticmethod
     def collection_delete(sender, instance, **kwargs):
@@ -240,12 +319,12 @@ class SignalHandlers:
         # NOTE: this sends pre/post clear signal, but it's not obvious
         # how to take advantage of that
         instance.digitizedwork_set.clear()
-        DigitizedWork.index_items(digworks)
+        IndexJob.submit(IndexJob.WORK, digworks)
 
     @staticmethod
     def cluster_save(sender, instance, **kwargs):
-        """signal handler for cluster save; reindex pages for
-        associated digitized works"""
+        """signal handler for cluster save; reindex associated digitized
+        works and update cluster id on their pages"""
         # only reindex if cluster id has changed
         # and if object has already been saved to the db
         if instance.pk and instance.has_changed("cluster_id"):
@@ -257,19 +336,18 @@ class SignalHandlers:
                     page_count=models.Sum("page_count", default=0)
                 )
                 logger.debug(
-                    "cluster id has changed, reindexing %d works and %d pages",
+                    "cluster id has changed, reindexing %d works and updating %d pages",
                     works.count(),
                     page_count["page_count"],
                 )
-                DigitizedWork.index_items(works)
-                # reindex pages (this may be slow...)
-                for work in works:
-                    work.index_items(Page.page_index_data(work))
+                IndexJob.submit(IndexJob.WORK, works)
+                # update cluster id on indexed pages without regenerating content
+                IndexJob.submit(IndexJob.PAGE_CLUSTER, works)
 
     @staticmethod
     def cluster_delete(sender, instance, **kwargs):
         """signal handler for cluster delete; clear associated digitized
-        works and reindex"""
+        works, reindex them, and update cluster id on their pages"""
         # get a list of ids for collected works before clearing them
         digwork_ids = instance.digitizedwork_set.values_list("id", flat=True)
         # find the items based on the list of ids to reindex
@@ -277,7 +355,7 @@ class SignalHandlers:
         # get a total of page count for affected works
         page_count = digworks.aggregate(page_count=models.Sum("page_count", default=0))
         logger.debug(
-            "cluster delete, reindexing %d works and %d pages",
+            "cluster delete, reindexing %d works and updating %d pages",
             digworks.count(),
             page_count["page_count"],
         )
@@ -285,22 +363,21 @@ class SignalHandlers:
         # NOTE: this sends pre/post clear signal, but it's not obvious
         # how to take advantage of that for reindexing
         instance.digitizedwork_set.clear()
-        DigitizedWork.index_items(digworks)
-        # reindex pages (this may be slow...)
-        for work in digworks:
-            work.index_items(Page.page_index_data(work))
+        IndexJob.submit(IndexJob.WORK, digworks)
+        # update cluster id on indexed pages without regenerating content
+        IndexJob.submit(IndexJob.PAGE_CLUSTER, digworks)
 
     @staticmethod
     def handle_digwork_cluster_change(sender, instance, **kwargs):
         """when a :class:`DigitizedWork` is saved,
-        reindex pages if cluster id has changed"""
+        update cluster id on indexed pages if cluster id has changed"""
         if isinstance(instance, DigitizedWork) and instance.has_changed("cluster_id"):
             logger.debug(
-                "Cluster changed for %s; indexing %d pages",
+                "Cluster changed for %s; updating %d pages",
                 instance,
                 instance.page_count or 0,
             )
-            instance.index_items(Page.page_index_data(instance))
+            IndexJob.submit(IndexJob.PAGE_CLUSTER, [instance])
 
 
 def validate_page_range(value):
@@ -499,6 +576,13 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
         + "identified by start of digital page range",
         blank=True,
     )
+    #: fingerprint of source content when pages were last indexed
+    content_fingerprint = models.CharField(
+        max_length=40,
+        blank=True,
+        editable=False,
+        help_text="Fingerprint of source content when pages were last indexed",
+    )
 
     # use custom queryset
     objects = DigitizedWorkQuerySet.as_manager()
@@ -536,6 +620,46 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
             return "%s (%s)" % (self.source_id, self.pages_orig)
         return self.source_id
 
+    def get_content_fingerprint(self):
+        """Fingerprint of the current local source content used to
+        generate page index data, for comparison with
+        :attr:`content_fingerprint` to determine if pages need to be
+        reindexed. Returns None if source content is not available or
+        the source does not support page indexing."""
+        try:
+            if self.source == self.HATHI:
+                return self.hathi.content_fingerprint()
+            if self.source == self.GALE:
+                return local_ocr_fingerprint(self.source_id)
+            if self.source == self.EEBO:
+                return eebo_tcp.content_fingerprint(self.source_id)
+        except (
+            FileNotFoundError,
+            storage_exceptions.ObjectNotFoundException,
+            storage_exceptions.PartNotFoundException,
+        ):
+            logger.warning("Source content not found for %s", self.source_id)
+        except ImproperlyConfigured as err:
+            logger.warning("Source content not available for %s: %s", self.source_id, err)
+        return None
+
+    def index_pages(self, gale_record=None):
+        """Index page content for this work and save the fingerprint of
+        the source content used to generate it, so that later changes to
+        source content can be detected. Optionally takes a Gale item record,
+        to avoid an extra API call. Returns True if the saved fingerprint
+        changed, in which case the work record should be reindexed."""
+        # get fingerprint before loading content, so that any changes
+        # made while generating page data will be picked up next time
+        fingerprint = self.get_content_fingerprint()
+        DigitizedWork.index_items(Page.page_index_data(self, gale_record))
+        if fingerprint is None or fingerprint == self.content_fingerprint:
+            return False
+        # update without save, to avoid signals and change tracking
+        DigitizedWork.objects.filter(pk=self.pk).update(content_fingerprint=fingerprint)
+        self.content_fingerprint = fingerprint
+        return True
+
     @property
     def index_cluster_id(self):
         """
@@ -637,9 +761,10 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
 
         # if excerpt page range has changed
         # OR this is a new record with a page range
-        if self.has_changed("pages_digital") or (
+        reindex_pages = self.has_changed("pages_digital") or (
             self.pk is None and self.pages_digital
-        ):
+        )
+        if reindex_pages:
             # update the page count if possible (i.e., not a Gale record)
             self.page_count = self.count_pages()
             # if page range changed on existing record, clear out old index
@@ -654,12 +779,15 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
                 logger.debug("Indexing pages for new excerpt %s", self)
             else:
                 logger.debug("Reindexing pages for %s after change to page range", self)
-            self.index_items(Page.page_index_data(self))
             # NOTE: removing a page range may not work as expected
             # (does not recalculate page count; cannot recalculate for Gale items)
 
         super().save(*args, **kwargs)
 
+        # index pages after saving, so that new records can be queued for indexing
+        if reindex_pages:
+            IndexJob.submit(IndexJob.PAGES, [self])
+
     def clean(self):
         """Add custom validation to trigger a save error in the admin
         if someone tries to unsuppress a record that has been suppressed
@@ -990,6 +1118,8 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
             return {"id": self.source_id}
 
         index_id = self.index_id()
+        # evaluate collections once (uses prefetched collections when available)
+        collections = [collection.name for collection in self.collections.all()]
         return {
             "id": index_id,
             "source_id": self.source_id,
@@ -1008,9 +1138,7 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
             "author": self.author,
             # set default value to simplify queries to find uncollected items
             # (not set in Solr schema because needs to be works only)
-            "collections": [collection.name for collection in self.collections.all()]
-            if self.collections.exists()
-            else [NO_COLLECTION_LABEL],
+            "collections": collections or [NO_COLLECTION_LABEL],
             "cluster_id_s": self.index_cluster_id,
             # public notes field for display on site_name
             "notes": self.public_notes,
@@ -1019,6 +1147,7 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
             "order": "0",
             "work_type_s": self.work_type,
             "book_journal_s": self.book_journal,
+            "content_fingerprint_s": self.content_fingerprint,
         }
 
     def remove_from_index(self):
@@ -1030,6 +1159,8 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
             self.index_id(),
         )
         self.solr.update.delete_by_query('group_id_s:("%s")' % self.index_id())
+        # check for changes to collection stats on next use
+        Collection.expire_stats()
 
     def count_pages(self, ptree_client=None):
         """Count the number of pages for a digitized work. If a pages are specified
@@ -1099,9 +1230,12 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
         return f"View on {self.get_source_display()}"
 
     @staticmethod
-    def add_from_hathi(htid, bib_api=None, update=False, log_msg_src=None, user=None):
+    def add_from_hathi(
+        htid, bib_api=None, update=False, log_msg_src=None, user=None, bibdata=None
+    ):
         """Add or update a HathiTrust work in the database.
-        Retrieves bibliographic data from Hathi api, retrieves or creates
+        Retrieves bibliographic data from Hathi api (brief record first
+        for existing records, to check if an update is needed), retrieves or creates
         a :class:`DigitizedWork` record, and populates the metadata if
         this is a new record, if the Hathi metadata has changed, or
         if update is requested. Creates admin log entry to document
@@ -1123,6 +1257,11 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
         :param user: optional user responsible for the change,
             to be associated with :class:`~django.admin.models.LogEntry`
             record
+        :param bibdata: optional :class:`~ppa.archive.hathi.HathiBibliographicRecord`
+            already retrieved for this id, e.g. by a batch request; if not
+            specified, bibliographic data is retrieved from the Hathi api.
+            A brief record is used to check if an existing record needs to
+            be updated; the full record is retrieved when needed.
         """
 
         # initialize new bibliographic API if none is passed in
@@ -1135,8 +1274,25 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
         # - needed to check if update is required for existing records,
         #   and to populate metadata for new records
 
-        # could raise HathiItemNotFound for invalid id
-        bibdata = bib_api.record("htid", htid)
+        # if this is an existing record, check if updates are needed;
+        # the brief record includes the source last update date, so the
+        # full record with MARC-XML is only retrieved when needed
+        source_updated = None
+        if not update:
+            existing = DigitizedWork.objects.filter(source_id=htid).first()
+            if existing:
+                if bibdata is None:
+                    # could raise HathiItemNotFound for invalid id
+                    bibdata = bib_api.brief_record("htid", htid)
+                source_updated = bibdata.copy_last_updated(htid)
+                if existing.updated.date() > source_updated:
+                    # local copy is newer than last source modification date
+                    # and update is not requested; return un modified
+                    return existing
+
+        if bibdata is None or bibdata.is_brief:
+            # could raise HathiItemNotFound for invalid id
+            bibdata = bib_api.record("htid", htid)
 
         # if hathi id is valid and we have bibliographic data, create
         # a new record
@@ -1149,15 +1305,6 @@ class DigitizedWork(ModelIndexable, TrackChangesModel):
         if not user:
             user = User.objects.get(username=settings.SCRIPT_USERNAME)
 
-        # if this is an existing record, check if updates are needed
-        source_updated = None
-        if not created and not update:
-            source_updated = bibdata.copy_last_updated(htid)
-            if digwork.updated.date() > source_updated:
-                # local copy is newer than last source modification date
-                # and update is not requested; return un modified
-                return digwork
-
         # populate digitized item in the database
         digwork.populate_from_bibdata(bibdata)
         digwork.save()
@@ -1205,6 +1352,26 @@ class Page(Indexable):
             for page_data in Page.page_index_data(work):
                 yield page_data
 
+    @classmethod
+    def update_cluster_id(cls, digwork):
+        """Update cluster id for pages of the specified work that are
+        already indexed in Solr, using atomic updates to set the field
+        without regenerating page content. Returns the number of pages
+        updated."""
+        pages = (
+            SolrQuerySet()
+            .filter(item_type="page", group_id_s='"%s"' % digwork.index_id())
+            .only("id")
+        )
+        total = pages.count()
+        if not total:
+            return 0
+        cluster_id = digwork.index_cluster_id
+        return cls.index_items(
+            {"id": page["id"], "cluster_id_s": {"set": cluster_id}}
+            for page in pages[:total]
+        )
+
     @classmethod
     def total_to_index(cls, source=None):
         """Calculate the total number of pages to be indexed by
@@ -1235,9 +1402,11 @@ class Page(Indexable):
 
         # get a generator of page data from the appropriate source
         if digwork.source == digwork.HATHI:
-            pages = digwork.hathi.page_data()
+            pages = digwork.hathi.page_data(page_span=digwork.page_span)
         elif digwork.source == digwork.GALE:
-            pages = GaleAPI().get_item_pages(digwork.source_id, gale_record=gale_record)
+            pages = GaleAPI().get_item_pages(
+                digwork.source_id, gale_record=gale_record, page_span=digwork.page_span
+            )
         elif digwork.source == digwork.EEBO:
             pages = eebo_tcp.page_data(digwork.source_id)
         else:
@@ -1293,6 +1462,213 @@ class Page(Indexable):
             yield page_info
 
 
+class IndexJob(models.Model):
+    """Queued indexing task for a :class:`DigitizedWork`, so that slow
+    indexing triggered by admin changes can be run by a background
+    worker (see the **run_index_jobs** manage command) instead of in the
+    web request. Queued jobs for the same work and action are coalesced.
+    Jobs are only queued when **INDEX_JOB_QUEUE** is enabled in Django
+    settings; otherwise, indexing is done immediately."""
+
+    #: reindex work record
+    WORK = "work"
+    #: reindex page content for a work
+    PAGES = "pages"
+    #: update cluster id on indexed pages for a work
+    PAGE_CLUSTER = "cluster"
+    ACTION_CHOICES = (
+        (WORK, "Index work"),
+        (PAGES, "Index pages"),
+        (PAGE_CLUSTER, "Update page cluster"),
+    )
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    #: queued jobs that make a new job for the same work unnecessary;
+    #: page indexing also updates page cluster id
+    coalesce_actions = {
+        WORK: [WORK],
+        PAGES: [PAGES],
+        PAGE_CLUSTER: [PAGE_CLUSTER, PAGES],
+    }
+
+    digwork = models.ForeignKey(
+        DigitizedWork, on_delete=models.CASCADE, verbose_name="Digitized work"
+    )
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    #: date job was queued
+    created = models.DateTimeField(auto_now_add=True)
+    #: date worker started the job
+    started = models.DateTimeField(null=True, blank=True)
+    #: date job completed or failed
+    finished = models.DateTimeField(null=True, blank=True)
+    #: error details for failed jobs
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ("-created",)
+        verbose_name = "indexing job"
+        constraints = [
+            # only one queued job per work and action
+            models.UniqueConstraint(
+                fields=["digwork", "action"],
+                condition=models.Q(status="queued"),
+                name="unique_queued_indexjob",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.digwork} ({self.status})"
+
+    @classmethod
+    def submit(cls, action, digworks):
+        """Queue indexing for the specified works if **INDEX_JOB_QUEUE**
+        is enabled; otherwise, index them immediately."""
+        if getattr(settings, "INDEX_JOB_QUEUE", False):
+            return cls.enqueue(action, digworks)
+        cls.perform(action, digworks)
+
+    @classmethod
+    def enqueue(cls, action, digworks):
+        """Add jobs to the queue for the specified works, skipping any
+        works that already have an equivalent job queued. Returns the
+        number of jobs added."""
+        digwork_ids = {digwork.pk for digwork in digworks}
+        queued = cls.objects.filter(
+            status=cls.QUEUED,
+            action__in=cls.coalesce_actions[action],
+            digwork_id__in=digwork_ids,
+        ).values_list("digwork_id", flat=True)
+        new_ids = digwork_ids - set(queued)
+        # ignore conflicts in case another process queued the same job
+        cls.objects.bulk_create(
+            [cls(digwork_id=pk, action=action) for pk in new_ids],
+            ignore_conflicts=True,
+        )
+        logger.debug(
+            "Queued %d %s jobs (%d already queued)",
+            len(new_ids),
+            action,
+            len(digwork_ids) - len(new_ids),
+        )
+        return len(new_ids)
+
+    @classmethod
+    def perform(cls, action, digworks):
+        """Run the indexing for an action on the specified works."""
+        if action == cls.WORK:
+            DigitizedWork.index_items(digworks)
+            # check for updated collection stats
+            Collection.expire_stats()
+        elif action == cls.PAGES:
+            changed = [digwork for digwork in digworks if digwork.index_pages()]
+            # update work records in Solr with new content fingerprints
+            if changed:
+                DigitizedWork.index_items(changed)
+        elif action == cls.PAGE_CLUSTER:
+            for digwork in digworks:
+                Page.update_cluster_id(digwork)
+
+    @classmethod
+    def claim(cls, limit=100):
+        """Claim the oldest queued job, along with other queued jobs for
+        the same action up to the specified limit, and mark them as
+        running. Jobs locked by another worker are skipped. Returns a
+        list of jobs, which is empty if nothing is queued."""
+        with transaction.atomic():
+            queued = cls.objects.select_for_update(skip_locked=True).filter(
+                status=cls.QUEUED
+            )
+            first = queued.order_by("created", "pk").first()
+            if first is None:
+                return []
+            jobs = list(
+                queued.filter(action=first.action).order_by("created", "pk")[:limit]
+            )
+            started = timezone.now()
+            cls.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=cls.RUNNING, started=started
+            )
+            for job in jobs:
+                job.status = cls.RUNNING
+                job.started = started
+        return jobs
+
+    @classmethod
+    def requeue_stale(cls, timeout):
+        """Queue jobs again that have been running for longer than the
+        specified timeout (a :class:`~datetime.timedelta`), e.g. because
+        the worker running them was stopped. Stale jobs for works that
+        already have an equivalent job queued are marked as failed instead.
+        Returns a tuple of the number of jobs requeued and failed."""
+        with transaction.atomic():
+            stale = list(
+                cls.objects.select_for_update()
+                .filter(status=cls.RUNNING, started__lt=timezone.now() - timeout)
+                .order_by("started", "pk")
+            )
+            queued = set(
+                cls.objects.filter(status=cls.QUEUED).values_list(
+                    "digwork_id", "action"
+                )
+            )
+            requeue_ids, superseded_ids = [], []
+            for job in stale:
+                key = (job.digwork_id, job.action)
+                if key in queued:
+                    superseded_ids.append(job.pk)
+                else:
+                    requeue_ids.append(job.pk)
+                    queued.add(key)
+            cls.objects.filter(pk__in=requeue_ids).update(
+                status=cls.QUEUED, started=None
+            )
+            cls.objects.filter(pk__in=superseded_ids).update(
+                status=cls.FAILED,
+                finished=timezone.now(),
+                error="Job did not finish; an equivalent job was already queued",
+            )
+        return (len(requeue_ids), len(superseded_ids))
+
+    @classmethod
+    def process(cls, jobs):
+        """Run claimed jobs and update their status. Work record jobs are
+        indexed together; page jobs are run one work at a time, so that
+        an error only fails the job for that work."""
+        if not jobs:
+            return
+        if jobs[0].action == cls.WORK:
+            batches = [jobs]
+        else:
+            batches = [[job] for job in jobs]
+
+        for batch in batches:
+            digworks = (
+                DigitizedWork.objects.filter(pk__in=[job.digwork_id for job in batch])
+                .select_related("cluster")
+                .prefetch_related("collections")
+            )
+            status, error = cls.DONE, ""
+            try:
+                cls.perform(batch[0].action, digworks)
+            except Exception:
+                logger.exception("Error running %s indexing job", batch[0].action)
+                status, error = cls.FAILED, traceback.format_exc()
+            cls.objects.filter(pk__in=[job.pk for job in batch]).update(
+                status=status, error=error, finished=timezone.now()
+            )
+
+
 @register_snippet
 class SourceNote(models.Model):
     source = models.CharField(
@@ -1309,3 +1685,84 @@ class SourceNote(models.Model):
 
     def __str__(self):
         return self.get_source_display()
+
+
+class SearchRegistry:
+    """Process-local registry of collections and source notes used by
+    archive search, so that search pages can be rendered without database
+    queries. Entries are stamped with a version stored in the default Django
+    cache, which is shared by all processes (see **CACHES** in settings);
+    saving or deleting a :class:`Collection` or :class:`SourceNote` sets a
+    new version, and each process reloads on next use. Within a request,
+    the version is only checked once. Changes made without signals
+    (e.g. bulk updates) should call :meth:`invalidate`."""
+
+    #: cache key for the current registry version
+    VERSION_CACHE_KEY = "archive-search-registry-version"
+
+    _version = None
+    _collections = []
+    _source_notes = {}
+    #: thread-local state for checking the version once per request
+    _local = threading.local()
+
+    @classmethod
+    def current_version(cls):
+        """Current registry version from the cache; sets a new version
+        if there is none (e.g., the cache was cleared)."""
+        version = cache.get(cls.VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(cls.VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            version = cache.get(cls.VERSION_CACHE_KEY)
+        return version
+
+    @classmethod
+    def load(cls):
+        """Load collections and source notes from the database if the
+        registry version has changed."""
+        # version has already been checked for the current request
+        if getattr(cls._local, "checked", False):
+            return
+        version = cls.current_version()
+        if version is None or version != cls._version:
+            cls._collections = list(Collection.objects.order_by("name"))
+            cls._source_notes = {
+                note.get_source_display(): note.note
+                for note in SourceNote.objects.all()
+            }
+            cls._version = version
+        cls._local.checked = getattr(cls._local, "in_request", False)
+
+    @classmethod
+    def collections(cls):
+        """All collections, ordered by name"""
+        cls.load()
+        return cls._collections
+
+    @classmethod
+    def source_notes(cls):
+        """Dictionary of source notes keyed on source display name
+        (as that is what is indexed)"""
+        cls.load()
+        return cls._source_notes
+
+    @classmethod
+    def request_started(cls, *args, **kwargs):
+        """Signal handler to check the registry version once per request"""
+        cls._local.in_request = True
+        cls._local.checked = False
+
+    @classmethod
+    def request_finished(cls, *args, **kwargs):
+        """Signal handler to check the registry version on every use
+        outside of requests"""
+        cls._local.in_request = False
+        cls._local.checked = False
+
+    @classmethod
+    def invalidate(cls, *args, **kwargs):
+        """Signal handler to set a new registry version, so that all
+        processes reload collections and source notes on next use."""
+        cache.set(cls.VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        cls._version = None
+        cls._local.checked = False
@@ -6,8 +6,13 @@ from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from pytest_django.asserts import assertContains, assertTemplateUsed
 
-from ppa.archive.admin import DigitizedWorkAdmin
-from ppa.archive.models import Collection, DigitizedWork, ProtectedWorkFieldFlags
+from ppa.archive.admin import DigitizedWorkAdmin, IndexJobAdmin
+from ppa.archive.models import (
+    Collection,
+    DigitizedWork,
+    IndexJob,
+    ProtectedWorkFieldFlags,
+)
 
 
 class TestDigitizedWorkAdmin(TestCase):
@@ -194,6 +199,32 @@ class TestDigitizedWorkAdmin(TestCase):
             )
 
 
+class TestIndexJobAdmin(TestCase):
+    fixtures = ["sample_digitized_works"]
+
+    def test_requeue_jobs(self):
+        digworks = list(DigitizedWork.objects.all()[:2])
+        for digwork in digworks:
+            IndexJob.objects.create(
+                digwork=digwork, action=IndexJob.PAGES, status=IndexJob.FAILED
+            )
+        # one work already has a queued job
+        IndexJob.objects.create(digwork=digworks[0], action=IndexJob.PAGES)
+        jobadmin = IndexJobAdmin(IndexJob, AdminSite())
+        with patch.object(jobadmin, "message_user") as mock_message_user:
+            fakerequest = Mock()
+            jobadmin.requeue_jobs(
+                fakerequest, IndexJob.objects.filter(status=IndexJob.FAILED)
+            )
+            # only the work without a queued job is added
+            assert IndexJob.objects.filter(status=IndexJob.QUEUED).count() == 2
+            mock_message_user.assert_called_with(fakerequest, "Queued 1 indexing job.")
+
+    def test_has_add_permission(self):
+        jobadmin = IndexJobAdmin(IndexJob, AdminSite())
+        assert not jobadmin.has_add_permission(Mock())
+
+
 def test_digitizedwork_listview(admin_client):
     digwork_list_url = reverse("admin:archive_digitizedwork_changelist")
     response = admin_client.get(digwork_list_url)
@@ -4,11 +4,13 @@ import queue
 import tempfile
 import types
 from collections import defaultdict
+from datetime import date, timedelta
 from io import StringIO
-from multiprocess import cpu_count
+from multiprocess import Value, cpu_count
 from unittest.mock import Mock, patch
 
 import pytest
+import requests
 from django.conf import settings
 from django.contrib.admin.models import ADDITION, CHANGE, LogEntry
 from django.contrib.auth.models import User
@@ -117,6 +119,8 @@ class TestHathiImportCommand(TestCase):
         with open(bibdata_full) as bibdata:
             hathirecord = hathi.HathiBibliographicRecord(json.load(bibdata))
             cmd.bib_api.record.return_value = hathirecord
+            # brief record is checked first for existing works
+            cmd.bib_api.brief_record.return_value = hathirecord
         # reset stats
         cmd.stats = defaultdict(int)
         htid = "njp.32101013082597"
@@ -167,6 +171,79 @@ class TestHathiImportCommand(TestCase):
         assert " (forced update)" in log_entry.change_message
         assert log_entry.action_flag == CHANGE
 
+    def test_get_bibdata(self):
+        cmd = hathi_import.Command(stdout=StringIO())
+        cmd.bib_api = Mock(spec=hathi.HathiBibliographicAPI)
+        cmd.options = {"batch_size": 4, "update": False}
+        DigitizedWork.objects.create(source_id="a.1")
+        yesterday = date.today() - timedelta(days=1)
+        brief_records = {}
+        for htid in ["a.1", "b.2", "c.3"]:
+            brief_records[htid] = Mock(spec=hathi.HathiBibliographicRecord)
+            brief_records[htid].copy_last_updated.return_value = yesterday
+        cached_record = Mock(spec=hathi.HathiBibliographicRecord)
+        cached_record.copy_last_updated.return_value = yesterday
+        # cached full record for b.2 only
+        cmd.bib_api.cached_record.side_effect = lambda id_type, htid: (
+            cached_record if htid == "b.2" else None
+        )
+        cmd.bib_api.records.side_effect = [
+            # brief records; d.4 not found
+            list(brief_records.items()),
+            # full records
+            [("c.3", "full_record")],
+            # next batch fails
+            requests.exceptions.ConnectionError("connection refused"),
+        ]
+        assert list(cmd.get_bibdata(["a.1", "b.2", "c.3", "d.4", "e.5"])) == [
+            # existing work is up to date; brief record is used
+            ("a.1", brief_records["a.1"]),
+            # cached full record is current
+            ("b.2", cached_record),
+            # full record retrieved from the api
+            ("c.3", "full_record"),
+            ("d.4", None),
+            # batch request failed; no bibliographic data
+            ("e.5", None),
+        ]
+        cmd.bib_api.records.assert_any_call(
+            "htid", ("a.1", "b.2", "c.3", "d.4"), mode="brief", batch_size=4
+        )
+        # full records only requested when needed
+        cmd.bib_api.records.assert_any_call("htid", ["c.3"], batch_size=4)
+        assert cmd.bib_api.records.call_count == 3
+
+        # cached record is not used when source record has changed since;
+        # full record is requested when update is forced
+        cmd.options["update"] = True
+        cached_record.copy_last_updated.return_value = yesterday - timedelta(days=1)
+        cmd.bib_api.records.side_effect = [
+            [("a.1", brief_records["a.1"]), ("b.2", brief_records["b.2"])],
+            [("a.1", "full_record_a"), ("b.2", "full_record_b")],
+        ]
+        assert list(cmd.get_bibdata(["a.1", "b.2"])) == [
+            ("a.1", "full_record_a"),
+            ("b.2", "full_record_b"),
+        ]
+
+    def test_import_digitizedwork_bibdata(self):
+        cmd = hathi_import.Command(stdout=StringIO())
+        cmd.bib_api = Mock(spec=hathi.HathiBibliographicAPI)
+        cmd.stats = defaultdict(int)
+        cmd.options = {"update": False}
+        cmd.digwork_content_type = ContentType.objects.get_for_model(DigitizedWork)
+        bibdata_full = os.path.join(
+            FIXTURES_PATH, "bibdata_full_njp.32101013082597.json"
+        )
+        with open(bibdata_full) as bibdata:
+            hathirecord = hathi.HathiBibliographicRecord(json.load(bibdata))
+
+        # prefetched bibliographic data is used without an api request
+        digwork = cmd.import_digitizedwork("njp.32101013082597", bibdata=hathirecord)
+        assert digwork.title
+        assert cmd.stats["created"] == 1
+        cmd.bib_api.record.assert_not_called()
+
     @patch("ppa.archive.management.commands.hathi_import.HathiBibliographicAPI")
     @patch("ppa.archive.management.commands.hathi_import.progressbar")
     def test_call_command(self, mockprogbar, mockhathi_bibapi):
@@ -186,23 +263,31 @@ class TestHathiImportCommand(TestCase):
             mock_get_htids.return_value = mock_htids
             mock_import_digwork.return_value = digwork
             mock_count_pages.return_value = 10
+            # no bibliographic data found in batch requests
+            mock_records = mockhathi_bibapi.return_value.records
+            mock_records.return_value = []
 
             # default behavior = read ids from pairtree
             stdout = StringIO()
             call_command("hathi_import", stdout=stdout)
 
             mock_init_ptree.assert_any_call()
-            for htid in mock_htids:
-                mock_import_digwork.assert_any_call(htid)
+            mock_records.assert_called_with(
+                "htid", tuple(mock_htids), mode="brief", batch_size=20
+            )
+            mock_import_digwork.assert_any_call("ab.1234", bibdata=None)
+            mock_import_digwork.assert_any_call("cd.5678", bibdata=None)
             mock_count_pages.assert_any_call()
 
             output = stdout.getvalue()
             assert "Processed 2 items for import." in output
 
-            # request specific ids
-            call_command("hathi_import", "htid1", "htid2", stdout=stdout)
-            mock_import_digwork.assert_any_call("htid1")
-            mock_import_digwork.assert_any_call("htid2")
+            # request specific ids, one at a time
+            call_command("hathi_import", "htid1", "htid2", batch_size=1, stdout=stdout)
+            mock_records.assert_any_call("htid", ("htid1",), mode="brief", batch_size=1)
+            mock_records.assert_any_call("htid", ("htid2",), mode="brief", batch_size=1)
+            mock_import_digwork.assert_any_call("htid1", bibdata=None)
+            mock_import_digwork.assert_any_call("htid2", bibdata=None)
 
             # request progress bar
             call_command("hathi_import", progress=1, verbosity=0, stdout=stdout)
@@ -309,67 +394,188 @@ class TestHathiAddCommand(TestCase):
 # test index pages command and methods
 
 
+def test_page_data_size():
+    page = {"id": "abc.1", "content": "x" * 100}
+    assert index_pages.page_data_size(page) == 105 + 40
+
+
+@patch("ppa.archive.management.commands.index_pages.DigitizedWork")
 @patch("ppa.archive.management.commands.index_pages.Page")
-def test_page_index_data(mock_page):
+def test_page_index_data(mock_page, mock_digwork):
     work_q = Mock()
     page_q = Mock()
     digwork1 = Mock()
     digwork2 = Mock()
-    # return two mock works and then raise queue empty
-    work_q.get.side_effect = (digwork1, digwork2, queue.Empty)
+    mock_digwork.DoesNotExist = DigitizedWork.DoesNotExist
+    mock_get = mock_digwork.objects.select_related.return_value.get
+    mock_get.side_effect = (digwork1, digwork2)
+    # return two work ids and then None to indicate no more works
+    work_q.get.side_effect = (1, 2, None)
     # page index data must return contents
-    mock_page.page_index_data.return_value = (1, 2, 3)
+    mock_page.page_index_data.return_value = ({"id": 1}, {"id": 2}, {"id": 3})
 
     index_pages.page_index_data(work_q, page_q)
 
     assert work_q.get.call_count == 3
-    work_q.get.assert_called_with(timeout=1)
+    assert work_q.task_done.call_count == 3
+    mock_digwork.objects.select_related.assert_called_with("cluster")
+    mock_get.assert_any_call(pk=1)
+    mock_get.assert_any_call(pk=2)
     assert page_q.put.call_count == 2
-    page_q.put.assert_any_call(list(mock_page.page_index_data.return_value))
-    page_q.put.assert_any_call(list(mock_page.page_index_data.return_value))
+    page_data = list(mock_page.page_index_data.return_value)
+    page_q.put.assert_any_call(
+        (1, sum(index_pages.page_data_size(page) for page in page_data), page_data)
+    )
     mock_page.page_index_data.assert_any_call(digwork1)
     mock_page.page_index_data.assert_any_call(digwork2)
 
+    # report total pages and fingerprint per work when progress queue is specified
+    progress_q = Mock()
+    work_q.get.side_effect = (1, None)
+    mock_get.side_effect = (digwork1,)
+    digwork1.get_content_fingerprint.return_value = "abc123"
+    index_pages.page_index_data(work_q, page_q, progress_q)
+    progress_q.put.assert_called_once_with(
+        (index_pages.IndexCheckpoint.GENERATED, 1, 3, "abc123")
+    )
+
+    # work not found is skipped
+    work_q.reset_mock()
+    page_q.reset_mock()
+    work_q.get.side_effect = (3, None)
+    mock_get.side_effect = DigitizedWork.DoesNotExist
+    index_pages.page_index_data(work_q, page_q)
+    assert work_q.task_done.call_count == 2
+    page_q.put.assert_not_called()
+
 
-@patch("ppa.archive.management.commands.index_pages.progressbar")
 @patch("ppa.archive.management.commands.index_pages.SolrClient")
-def test_process_index_queue(mock_solrclient, mock_progbar):
-    work_q = Mock()
+def test_process_index_queue(mock_solrclient):
     index_q = Mock()
     mockdata1 = ["a", "b", "c", "d"]
-    mockdata2 = ["y", "y", "z"]
+    mockdata2 = ["w", "x"]
+    mockdata3 = ["y", "y", "z"]
     # simulate indexer catching up with page index loading
-    # - return data, empty, more data, then empty
-    index_q.get.side_effect = (mockdata1, queue.Empty, mockdata2, queue.Empty)
-    # not empty the first time, empty the second
-    work_q.empty.side_effect = (False, True)
-    total = 10
-    index_pages.process_index_queue(index_q, total, work_q)
-
-    assert index_q.get.call_count == 4
-    assert work_q.empty.call_count == 2
-    index_q.get.assert_called_with(timeout=1)
-
-    mock_solrclient.return_value.update.index.assert_any_call(mockdata1)
-    mock_solrclient.return_value.update.index.assert_any_call(mockdata2)
-
-    mock_progbar.ProgressBar.assert_called_with(
-        redirect_stdout=True, max_value=total, max_error=False
+    # - return data, empty, more data, then None to indicate completion
+    index_q.get.side_effect = (
+        (1, 40, mockdata1),
+        queue.Empty,
+        (1, 20, mockdata2),
+        (2, 30, mockdata3),
+        None,
     )
-    progbar = mock_progbar.ProgressBar.return_value
-    progbar.update.assert_any_call(4)
-    progbar.update.assert_any_call(7)
-    progbar.finish.assert_called_with()
+    indexed_count = Value("i", 0)
+    index_pages.process_index_queue(index_q, indexed_count, batch_bytes=100)
 
+    assert index_q.get.call_count == 5
+    index_q.get.assert_called_with(timeout=1)
+    assert index_q.task_done.call_count == 4
+
+    mock_index = mock_solrclient.return_value.update.index
+    # first batch indexed when queue is empty
+    mock_index.assert_any_call(mockdata1)
+    # smaller chunks combined until batch size or end of queue
+    mock_index.assert_any_call(mockdata2 + mockdata3)
+    assert mock_index.call_count == 2
+    assert indexed_count.value == 9
+
+    # batch indexed as soon as batch size is reached
+    mock_index.reset_mock()
+    index_q.get.side_effect = ((1, 150, mockdata1), (2, 40, mockdata2), None)
+    index_pages.process_index_queue(index_q, indexed_count, batch_bytes=100)
+    mock_index.assert_any_call(mockdata1)
+    mock_index.assert_any_call(mockdata2)
+    assert indexed_count.value == 15
+
+    # report pages indexed per work when progress queue is specified
+    progress_q = Mock()
+    index_q.get.side_effect = ((1, 40, mockdata1), (2, 20, mockdata2), None)
+    index_pages.process_index_queue(index_q, indexed_count, 100, progress_q)
+    progress_q.put.assert_any_call((index_pages.IndexCheckpoint.INDEXED, 1, 4))
+    progress_q.put.assert_any_call((index_pages.IndexCheckpoint.INDEXED, 2, 2))
+
+
+class TestIndexCheckpoint:
+    def test_update(self, tmp_path):
+        journal_path = tmp_path / "checkpoint.jsonl"
+        checkpoint = index_pages.IndexCheckpoint(journal_path)
+        assert checkpoint.completed == {}
+        # indexed before all pages are generated; not complete
+        checkpoint.update((checkpoint.INDEXED, 1, 100))
+        assert 1 not in checkpoint.completed
+        checkpoint.update((checkpoint.GENERATED, 1, 150, "abc"))
+        assert 1 not in checkpoint.completed
+        assert checkpoint.fingerprints == {}
+        checkpoint.update((checkpoint.INDEXED, 1, 50))
+        assert checkpoint.completed[1] == 150
+        assert checkpoint.fingerprints == {1: "abc"}
+        # work with no pages is complete as soon as it is generated
+        # no fingerprint if source content is not available
+        checkpoint.update((checkpoint.GENERATED, 2, 0, None))
+        assert checkpoint.completed[2] == 0
+        assert 2 not in checkpoint.fingerprints
+        # partially indexed work is not recorded
+        checkpoint.update((checkpoint.GENERATED, 3, 10, "def"))
+        assert 3 not in checkpoint.fingerprints
+        checkpoint.close()
+
+        lines = journal_path.read_text().splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"work_id": 1, "pages": 150},
+            {"work_id": 2, "pages": 0},
+        ]
 
+    def test_resume(self, tmp_path):
+        journal_path = tmp_path / "checkpoint.jsonl"
+        # simulate a partial line written when a previous run was killed
+        journal_path.write_text('{"work_id": 1, "pages": 150}\n{"work_id": 2, "pa')
+        checkpoint = index_pages.IndexCheckpoint(journal_path, resume=True)
+        assert checkpoint.completed == {1: 150}
+        checkpoint.complete(3, 20)
+        checkpoint.close()
+        # resuming appends to existing journal
+        assert index_pages.IndexCheckpoint.load(journal_path) == {1: 150, 3: 20}
+
+        # without resume, journal is started over
+        checkpoint = index_pages.IndexCheckpoint(journal_path)
+        assert checkpoint.completed == {}
+        checkpoint.close()
+        assert journal_path.read_text() == ""
+
+    def test_load_missing(self, tmp_path):
+        assert index_pages.IndexCheckpoint.load(tmp_path / "missing.jsonl") == {}
+
+    def test_no_journal(self):
+        # progress is tracked without a journal
+        checkpoint = index_pages.IndexCheckpoint()
+        assert checkpoint.journal is None
+        checkpoint.update((checkpoint.GENERATED, 1, 0, "abc"))
+        assert checkpoint.completed == {1: 0}
+        assert checkpoint.fingerprints == {1: "abc"}
+        checkpoint.close()
+
+
+@patch("ppa.archive.management.commands.index_pages.connections", new=Mock())
 @patch("ppa.archive.management.commands.index_pages.sleep")
 @patch("ppa.archive.management.commands.index_pages.progressbar")
 @patch("ppa.archive.management.commands.index_pages.Process")
 class TestIndexPagesCommand(TestCase):
     fixtures = ["sample_digitized_works"]
 
+    def setUp(self):
+        # patch queue so tests don't create multiprocessing queues
+        patcher = patch("ppa.archive.management.commands.index_pages.JoinableQueue")
+        self.mock_queue = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("ppa.archive.management.commands.index_pages.Queue")
+        self.mock_progress_queue = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_progress_queue.return_value.get_nowait.side_effect = queue.Empty
+
     @pytest.mark.usefixtures("mock_solr_queryset")
     def test_index_pages(self, mock_process, mock_progbar, mock_sleep):
+        # mock processes finish immediately
+        mock_process.return_value.is_alive.return_value = False
         # generate solrqueryset mock and patch it in
         mock_solrqs = self.mock_solr_queryset()
         with patch(
@@ -385,14 +591,24 @@ class TestIndexPagesCommand(TestCase):
 
             # Process should be called at least twice
             assert mock_process.call_count >= 2
-            # could inspect to confirm called correctly, but probably
-            # requires
+            # feeders and default of two indexers
+            process_targets = [
+                call.kwargs["target"] for call in mock_process.call_args_list
+            ]
+            assert process_targets.count(index_pages.process_index_queue) == 2
+            assert index_pages.page_index_data in process_targets
+            # work queue should be populated with database ids
+            mock_work_q = self.mock_queue.return_value
+            for digwork in DigitizedWork.items_to_index():
+                mock_work_q.put.assert_any_call(digwork.pk)
 
             output = stdout.getvalue()
             assert "Indexing with %d processes" % cpu_count() in output
             assert "Items in Solr by item type:" in output
 
     def test_index_pages_quiet(self, mock_process, mock_progbar, mock_sleep):
+        # mock processes finish immediately
+        mock_process.return_value.is_alive.return_value = False
         # test calling from command line
         stdout = StringIO()
         call_command("index_pages", stdout=stdout, verbosity=0)
@@ -401,6 +617,8 @@ class TestIndexPagesCommand(TestCase):
         assert "Items in Solr" not in output
 
     def test_index_pages_specific_ids(self, mock_process, mock_progbar, mock_sleep):
+        # mock processes finish immediately
+        mock_process.return_value.is_alive.return_value = False
         stdout = StringIO()
         source_ids = ["chi.78013704", "chi.13880510"]
         call_command("index_pages", *source_ids, stdout=stdout, verbosity=0)
@@ -408,14 +626,163 @@ class TestIndexPagesCommand(TestCase):
         t2 = DigitizedWork.objects.get(source_id=source_ids[1])
         page_count = t1.page_count + t2.page_count
         big_page_count = Page.total_to_index()
-        assert (
-            mock_process.call_args.kwargs.get("args")[1] == page_count
-        )  # behavior specifying source ids
-        assert (
-            mock_process.call_args.kwargs.get("args")[1] != big_page_count
-        )  # normal behavior without specifying source ids
+        # progress bar is based on page count for the specified works
+        progbar_max = mock_progbar.ProgressBar.call_args.kwargs["max_value"]
+        assert progbar_max == page_count  # behavior specifying source ids
+        # normal behavior without specifying source ids
+        assert progbar_max != big_page_count
+        # only specified works are added to the work queue
+        mock_work_q = self.mock_queue.return_value
+        mock_work_q.put.assert_any_call(t1.pk)
+        mock_work_q.put.assert_any_call(t2.pk)
+
+    def test_index_pages_options(self, mock_process, mock_progbar, mock_sleep):
+        # mock processes finish immediately
+        mock_process.return_value.is_alive.return_value = False
+        call_command(
+            "index_pages",
+            stdout=StringIO(),
+            verbosity=0,
+            indexers=3,
+            batch_size=1000,
+            queue_size=10,
+        )
+        # page data queue should be bounded
+        self.mock_queue.assert_any_call(maxsize=10)
+        indexer_calls = [
+            call
+            for call in mock_process.call_args_list
+            if call.kwargs["target"] == index_pages.process_index_queue
+        ]
+        assert len(indexer_calls) == 3
+        assert indexer_calls[0].kwargs["args"][2] == 1000
+
+    def test_index_pages_checkpoint(self, mock_process, mock_progbar, mock_sleep):
+        mock_process.return_value.is_alive.return_value = False
+        digworks = list(DigitizedWork.items_to_index())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            journal_path = os.path.join(tmpdir, "checkpoint.jsonl")
+            # resume requires a checkpoint file
+            with pytest.raises(CommandError, match="checkpoint file is required"):
+                call_command("index_pages", stdout=StringIO(), resume=True)
+
+            # progress reported by processes is recorded in the journal
+            self.mock_progress_queue.return_value.get_nowait.side_effect = (
+                (index_pages.IndexCheckpoint.GENERATED, digworks[0].pk, 5, "abc"),
+                (index_pages.IndexCheckpoint.INDEXED, digworks[0].pk, 5),
+                queue.Empty,
+            )
+            with patch.object(DigitizedWork, "index_items") as mock_index_items:
+                call_command(
+                    "index_pages",
+                    stdout=StringIO(),
+                    verbosity=0,
+                    checkpoint=journal_path,
+                )
+            # content fingerprint saved and work reindexed in Solr
+            digworks[0].refresh_from_db()
+            assert digworks[0].content_fingerprint == "abc"
+            reindexed = mock_index_items.call_args.args[0]
+            assert list(reindexed) == [digworks[0]]
+            # processes get the progress queue
+            for call in mock_process.call_args_list:
+                assert call.kwargs["args"][-1] == self.mock_progress_queue.return_value
+            assert index_pages.IndexCheckpoint.load(journal_path) == {digworks[0].pk: 5}
+
+            # resume skips completed works
+            self.mock_queue.reset_mock()
+            self.mock_progress_queue.return_value.get_nowait.side_effect = queue.Empty
+            stdout = StringIO()
+            with patch.object(index_pages.Command, "get_solr_totals", return_value={}):
+                call_command(
+                    "index_pages",
+                    stdout=stdout,
+                    verbosity=1,
+                    checkpoint=journal_path,
+                    resume=True,
+                )
+            assert "skipping 1 completed work (5 pages)" in stdout.getvalue()
+            mock_work_q = self.mock_queue.return_value
+            queued_ids = [call.args[0] for call in mock_work_q.put.call_args_list]
+            assert digworks[0].pk not in queued_ids
+            assert digworks[1].pk in queued_ids
+            # journal is preserved when resuming
+            assert digworks[0].pk in index_pages.IndexCheckpoint.load(journal_path)
+
+    def test_index_pages_changed_only(self, mock_process, mock_progbar, mock_sleep):
+        mock_process.return_value.is_alive.return_value = False
+        digworks = list(DigitizedWork.items_to_index())
+        unchanged = digworks[0]
+        unchanged.content_fingerprint = "abc"
+        unchanged.save()
+
+        def fingerprint(digwork):
+            return "abc"
+
+        stdout = StringIO()
+        with patch.object(DigitizedWork, "get_content_fingerprint", fingerprint):
+            call_command(
+                "index_pages",
+                stdout=stdout,
+                changed_only=True,
+                verbosity=0,
+            )
+        mock_work_q = self.mock_queue.return_value
+        queued_ids = [call.args[0] for call in mock_work_q.put.call_args_list]
+        # unchanged work is skipped; others have no fingerprint yet
+        assert unchanged.pk not in queued_ids
+        for digwork in digworks[1:]:
+            assert digwork.pk in queued_ids
+        progbar_max = mock_progbar.ProgressBar.call_args.kwargs["max_value"]
+        assert progbar_max == sum(digwork.page_count or 0 for digwork in digworks[1:])
+
+    def test_get_changed_works(self, mock_process, mock_progbar, mock_sleep):
+        cmd = index_pages.Command(stdout=StringIO())
+        cmd.verbosity = 2
+        digwork1 = Mock(pk=1, page_count=10, content_fingerprint="abc")
+        digwork1.get_content_fingerprint.return_value = "abc"
+        digwork2 = Mock(pk=2, page_count=None, content_fingerprint="abc")
+        digwork2.get_content_fingerprint.return_value = "def"
+        digwork3 = Mock(pk=3, page_count=5, content_fingerprint="")
+        digwork3.get_content_fingerprint.return_value = None
+        assert cmd.get_changed_works([digwork1, digwork2, digwork3]) == {2: 0}
+        assert f"{digwork2} content has changed" in cmd.stdout.getvalue()
+
+    def test_wait_for_processes(self, mock_process, mock_progbar, mock_sleep):
+        cmd = index_pages.Command(stdout=StringIO(), stderr=StringIO())
+        cmd.page_data_q = Mock()
+        cmd.checkpoint = index_pages.IndexCheckpoint()
+        cmd.progress_q = Mock()
+        cmd.progress_q.get_nowait.side_effect = queue.Empty
+        cmd.fingerprinted_ids = set()
+        feeder = Mock()
+        indexer = Mock()
+        cmd.data_feeders = [feeder]
+        cmd.indexers = [indexer, indexer]
+        feeder.is_alive.side_effect = (True, False)
+        indexer.is_alive.side_effect = (True, True, False, False)
+        progbar = Mock()
+        indexed_count = Value("i", 10)
+        cmd.wait_for_processes(progbar, indexed_count)
+        # indexers signaled to stop after feeders finish
+        assert cmd.page_data_q.put.call_count == 2
+        cmd.page_data_q.put.assert_called_with(None)
+        progbar.update.assert_called_with(10)
+        progbar.finish.assert_called_with()
+
+        # if indexers exit early, should report and return
+        cmd.page_data_q.reset_mock()
+        feeder.is_alive.side_effect = None
+        feeder.is_alive.return_value = True
+        indexer.is_alive.side_effect = None
+        indexer.is_alive.return_value = False
+        cmd.wait_for_processes(progbar, indexed_count)
+        cmd.page_data_q.put.assert_not_called()
+        assert "exited unexpectedly" in cmd.stderr.getvalue()
 
     def test_index_pages_expedite(self, mock_process, mock_progbar, mock_sleep):
+        # mock processes finish immediately
+        mock_process.return_value.is_alive.return_value = False
         # test calling from command line
         stdout = StringIO()
         call_command("index_pages", stdout=stdout, expedite=True)
@@ -435,3 +802,48 @@ class TestIndexPagesCommand(TestCase):
         output = stdout.getvalue()
         for msg in expected_strings:
             assert msg not in output
+
+
+@patch("ppa.archive.management.commands.run_index_jobs.IndexJob")
+def test_run_index_jobs_once(mock_indexjob):
+    jobs = [Mock(action="pages"), Mock(action="pages")]
+    mock_indexjob.claim.side_effect = [jobs, []]
+    mock_indexjob.requeue_stale.return_value = (0, 0)
+    stdout = StringIO()
+    call_command("run_index_jobs", once=True, batch_size=10, stdout=stdout)
+    # stale jobs are requeued on startup
+    mock_indexjob.requeue_stale.assert_called_once_with(timedelta(minutes=60))
+    # claims jobs until there are none left, then exits
+    assert mock_indexjob.claim.call_count == 2
+    mock_indexjob.claim.assert_called_with(limit=10)
+    mock_indexjob.process.assert_called_once_with(jobs)
+    assert "Running 2 pages jobs" in stdout.getvalue()
+
+
+@patch("ppa.archive.management.commands.run_index_jobs.IndexJob")
+def test_run_index_jobs_stale(mock_indexjob):
+    mock_indexjob.claim.return_value = []
+    mock_indexjob.requeue_stale.return_value = (2, 1)
+    stdout = StringIO()
+    call_command("run_index_jobs", once=True, stale_after=30, stdout=stdout)
+    mock_indexjob.requeue_stale.assert_called_once_with(timedelta(minutes=30))
+    assert "Requeued 2 stale jobs (1 already queued)" in stdout.getvalue()
+
+    # disabled
+    mock_indexjob.requeue_stale.reset_mock()
+    call_command("run_index_jobs", once=True, stale_after=0, stdout=stdout)
+    mock_indexjob.requeue_stale.assert_not_called()
+
+
+@patch("ppa.archive.management.commands.run_index_jobs.sleep")
+@patch("ppa.archive.management.commands.run_index_jobs.IndexJob")
+def test_run_index_jobs_interrupt(mock_indexjob, mock_sleep):
+    # no jobs; worker waits until interrupted
+    mock_indexjob.claim.return_value = []
+    mock_indexjob.requeue_stale.return_value = (0, 0)
+    mock_sleep.side_effect = [None, KeyboardInterrupt]
+    stdout = StringIO()
+    call_command("run_index_jobs", interval=2, stdout=stdout)
+    mock_sleep.assert_called_with(2)
+    mock_indexjob.process.assert_not_called()
+    assert "Stopping indexing job worker" in stdout.getvalue()
@@ -1,8 +1,11 @@
-import os.path
+import os
 import types
+from unittest.mock import patch
 
+import pytest
 from django.test import override_settings
 from lxml.etree import Resolver
+from neuxml import xmlmap
 from neuxml.xmlmap import load_xmlobject_from_file, load_xmlobject_from_string
 
 from ppa.archive import eebo_tcp
@@ -178,6 +181,154 @@ def test_page_data():
     assert page_info[13]["label"] == "1"
 
 
+# page beginning without tail text, nested page beginning within a note,
+# gap and comment
+PAGE_EDGE_CASES = """<ETS><EEBO><TEXT><DIV1 TYPE="text"><PB N="1"/><P><PB N="2"/>a
+<NOTE>x<PB/>y</NOTE>b<GAP DISP="•"/>c<!-- comment -->d</P><PB/>e</DIV1></TEXT></EEBO></ETS>"""
+
+
+def test_page_extractor():
+    tcp_text = load_xmlobject_from_file(
+        TCP_FIXTURE, eebo_tcp.Text, resolver=EmptyDTDResolver()
+    )
+    extractor = eebo_tcp.PageExtractor(tcp_text)
+    assert len(extractor) == 300
+    pages = list(extractor)
+    assert len(pages) == 300
+    assert isinstance(pages[0], eebo_tcp.PageText)
+    # output should match page objects exactly
+    for page_text, page in zip(pages, tcp_text.pages):
+        assert page_text.content == str(page)
+        assert page_text.number == page.number
+        assert page_text.section_type == page.section_type
+
+    for xml in [PAGE_WITH_NOTE, PAGE_WITH_MULTIPLE_NOTES, PAGE_EDGE_CASES]:
+        text = load_xmlobject_from_string(xml, eebo_tcp.Text)
+        assert [tuple(page) for page in eebo_tcp.PageExtractor(text)] == [
+            (page.number, page.section_type, str(page)) for page in text.pages
+        ]
+
+
+@override_settings(EEBO_DATA=FIXTURES_PATH)
+def test_tcp_xml_path():
+    assert eebo_tcp.tcp_xml_path("A25820.0001.001") == eebo_tcp.Path(TCP_FIXTURE)
+
+
+def test_content_fingerprint(tmp_path):
+    xml_path = tmp_path / "A1234.P4.xml"
+    xml_path.write_text("<ETS/>")
+    with override_settings(EEBO_DATA=tmp_path):
+        fingerprint = eebo_tcp.content_fingerprint("A1234")
+        assert len(fingerprint) == 40
+        assert eebo_tcp.content_fingerprint("A1234") == fingerprint
+        # changes when content changes
+        xml_path.write_text("<ETS></ETS>")
+        assert eebo_tcp.content_fingerprint("A1234") != fingerprint
+
+
+def test_extract_text_data():
+    tcp_text = load_xmlobject_from_file(
+        TCP_FIXTURE, eebo_tcp.Text, resolver=EmptyDTDResolver()
+    )
+    text_data = eebo_tcp.extract_text_data(tcp_text)
+    assert isinstance(text_data, eebo_tcp.TextData)
+    assert len(text_data.pages) == 300
+    assert text_data.pages[9].content == str(tcp_text.pages[9])
+    assert len(text_data.quoted_poems) == 72
+    qpoem = text_data.quoted_poems[0]
+    assert isinstance(qpoem, eebo_tcp.QuotedPoemData)
+    assert qpoem.start_page == tcp_text.quoted_poems[0].start_page.index
+    assert qpoem.text_chunks == list(tcp_text.quoted_poems[0].text_by_page())
+
+    # quoted poems are optional
+    assert eebo_tcp.extract_text_data(tcp_text, quoted_poems=False).quoted_poems is None
+
+    # page text is not extracted for P5 content
+    ecco_text = load_xmlobject_from_file(ECCO_TCP_FIXTURE, eebo_tcp.Text)
+    text_data = eebo_tcp.extract_text_data(ecco_text)
+    assert text_data.pages == []
+    assert len(text_data.quoted_poems) == 12
+
+
+def test_text_data_cache_path(tmp_path):
+    # no cache configured
+    with override_settings(TCP_DATA_CACHE=None):
+        assert eebo_tcp.text_data_cache_path(TCP_FIXTURE) is None
+
+    xml_path = tmp_path / "A00001.P4.xml"
+    xml_path.write_text(PAGE_WITH_NOTE)
+    with override_settings(TCP_DATA_CACHE=str(tmp_path / "cache")):
+        cache_path = eebo_tcp.text_data_cache_path(xml_path)
+        assert cache_path.parent == tmp_path / "cache"
+        assert cache_path.name.startswith("A00001.P4-")
+        # same file, same cache path
+        assert eebo_tcp.text_data_cache_path(xml_path) == cache_path
+        # cache path changes when file is modified
+        stat = xml_path.stat()
+        os.utime(xml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        assert eebo_tcp.text_data_cache_path(xml_path) != cache_path
+
+
+def test_load_text_data(tmp_path):
+    xml_path = tmp_path / "A00001.P4.xml"
+    xml_path.write_text(PAGE_WITH_MULTIPLE_NOTES)
+    tcp_text = load_xmlobject_from_string(PAGE_WITH_MULTIPLE_NOTES, eebo_tcp.Text)
+
+    # without cache
+    with override_settings(TCP_DATA_CACHE=None):
+        text_data = eebo_tcp.load_text_data(xml_path, quoted_poems=False)
+        assert text_data.pages[0].content == str(tcp_text.pages[0])
+        assert text_data.quoted_poems is None
+        assert not (tmp_path / "cache").exists()
+
+    with override_settings(TCP_DATA_CACHE=str(tmp_path / "cache")):
+        # first load extracts and caches pages and quoted poems
+        text_data = eebo_tcp.load_text_data(xml_path, quoted_poems=False)
+        cache_path = eebo_tcp.text_data_cache_path(xml_path)
+        assert cache_path.exists()
+        assert text_data.quoted_poems == []
+
+        # second load uses the cache without parsing the xml
+        with patch.object(xmlmap, "load_xmlobject_from_file") as mock_load:
+            cached_data = eebo_tcp.load_text_data(xml_path)
+            mock_load.assert_not_called()
+        assert cached_data == text_data
+        assert isinstance(cached_data.pages[0], eebo_tcp.PageText)
+
+        # invalid cache file is ignored and replaced
+        cache_path.write_bytes(b"not cached data")
+        assert eebo_tcp.load_text_data(xml_path) == text_data
+        assert eebo_tcp.load_text_data(xml_path) == text_data
+
+
+def test_load_text_data_poem_error(tmp_path, caplog):
+    xml_path = tmp_path / "A00001.P4.xml"
+    xml_path.write_text(PAGE_WITH_MULTIPLE_NOTES)
+    with override_settings(
+        TCP_DATA_CACHE=str(tmp_path / "cache"), EEBO_DATA=str(tmp_path)
+    ):
+        with patch.object(
+            eebo_tcp, "extract_quoted_poems", side_effect=AttributeError
+        ) as mock_extract_poems:
+            # error extracting quoted poems for the cache does not affect pages
+            text_data = eebo_tcp.load_text_data(xml_path, quoted_poems=False)
+            assert text_data.pages
+            assert text_data.quoted_poems is None
+            assert "Error extracting quoted poems" in caplog.text
+            # pages are cached without quoted poems
+            assert eebo_tcp.text_data_cache_path(xml_path).exists()
+            with patch.object(xmlmap, "load_xmlobject_from_file") as mock_load:
+                assert eebo_tcp.page_count("A00001") == len(text_data.pages)
+                mock_load.assert_not_called()
+
+            # xml is parsed again when quoted poems are requested;
+            # errors are raised
+            mock_extract_poems.reset_mock()
+            with pytest.raises(AttributeError):
+                eebo_tcp.load_text_data(xml_path)
+            mock_extract_poems.assert_called_once()
+
+
 # test quoted poetry & line group logic
 
 LG_EEBO_TCP_FIXTURE_ID = "A45116"
@@ -14,7 +14,7 @@ from ppa.archive.forms import (
     SearchForm,
     ChoiceLabel,
 )
-from ppa.archive.models import Collection, DigitizedWork
+from ppa.archive.models import Collection, DigitizedWork, SearchRegistry
 
 
 class TestFacetChoiceField(TestCase):
@@ -45,6 +45,8 @@ class TestSearchForm(TestCase):
                 Collection(name="empty"),
             ]
         )
+        # bulk create doesn't send signals; reload search registry
+        SearchRegistry.invalidate()
 
     def test_init(self):
         # requires collection ids because we are using model choice field
@@ -65,6 +67,7 @@ class TestSearchForm(TestCase):
         ] + list(Collection.objects.all().values_list("id", flat=True))
 
         Collection.objects.filter(name="empty").update(exclude=True)
+        SearchRegistry.invalidate()
         defaults = SearchForm.defaults()
         assert Collection.objects.get(name="empty").pk not in defaults["collections"]
 
@@ -124,17 +127,32 @@ class TestSearchForm(TestCase):
 
     def test_has_keyword_query(self):
         # no data
-        assert not SearchForm().has_keyword_query({})
+        assert not SearchForm.has_keyword_query({})
         # non keyword fields
-        assert not SearchForm().has_keyword_query({"pub_date_0": 1800})
+        assert not SearchForm.has_keyword_query({"pub_date_0": 1800})
         # any of query, title, author
-        assert SearchForm().has_keyword_query({"query": "prometheus"})
-        assert SearchForm().has_keyword_query({"title": "elocution"})
-        assert SearchForm().has_keyword_query({"author": "bell"})
+        assert SearchForm.has_keyword_query({"query": "prometheus"})
+        assert SearchForm.has_keyword_query({"title": "elocution"})
+        assert SearchForm.has_keyword_query({"author": "bell"})
         # multiple
-        assert SearchForm().has_keyword_query(
-            {"query": "reading", "title": "elocution"}
-        )
+        assert SearchForm.has_keyword_query({"query": "reading", "title": "elocution"})
+
+    def test_no_queries(self):
+        DigitizedWork.objects.create(source_id="testppa1", pub_date=1800)
+        # within a request, populate registry and pub date cache
+        SearchRegistry.request_started()
+        try:
+            SearchForm.defaults()
+            SearchForm().pub_date_minmax()
+            collection = Collection.objects.get(name="foo")
+            with self.assertNumQueries(0):
+                searchform = SearchForm({"collections": [collection.pk]})
+                assert searchform.is_valid()
+                assert searchform.cleaned_data["collections"] == [collection]
+                searchform.as_p()
+        finally:
+            SearchRegistry.request_finished()
+            cache.delete(SearchForm.PUBDATE_CACHE_KEY)
 
     def test_clean_quotes(self):
         form = SearchForm()
@@ -257,6 +275,24 @@ class TestModelMultipleChoiceFieldWithEmpty(TestCase):
         with pytest.raises(ValidationError):
             collections.clean(['1" or (1,2)=(select*from(select '])
 
+    def test_clean_preloaded(self):
+        collections = ModelMultipleChoiceFieldWithEmpty(
+            queryset=Collection.objects.order_by("name"), label="Collection"
+        )
+        collections.objects = list(Collection.objects.order_by("name"))
+        coll1, coll2 = collections.objects[:2]
+        # validates against preloaded objects without querying the database
+        with self.assertNumQueries(0):
+            cleaned_values = collections.clean(
+                [str(coll2.pk), ModelMultipleChoiceFieldWithEmpty.EMPTY_ID, coll1.pk]
+            )
+        # returned in preloaded order
+        assert cleaned_values == [collections.EMPTY_VALUE, coll1, coll2]
+
+        # invalid pk should still raise an exception
+        with pytest.raises(ValidationError):
+            collections.clean([404])
+
 
 class TestImportForm(TestCase):
     def test_get_hathi_ids(self):
@@ -1,5 +1,6 @@
 import json
 import os.path
+import threading
 from unittest.mock import Mock, patch
 
 import pytest
@@ -28,6 +29,76 @@ def test_get_local_ocr(tmp_path):
         assert content == gale.get_local_ocr(item_id)
 
 
+def test_get_local_ocr_cache(tmp_path):
+    item_id = "CB0123456789"
+    content = {"0001": "Testing...\n1\n2\n3", "0002": "", "0003": "pâge thrée"}
+    ocr_dir = tmp_path / "ocr" / "147"
+    ocr_dir.mkdir(parents=True)
+    ocr_file = ocr_dir / f"{item_id}.json"
+    ocr_file.write_text(json.dumps(content))
+    cache_dir = tmp_path / "cache"
+
+    with override_settings(
+        GALE_LOCAL_OCR=str(tmp_path / "ocr"), GALE_OCR_CACHE=str(cache_dir)
+    ):
+        cache_path = gale.local_ocr_cache_path(item_id)
+        assert cache_path == cache_dir / "147" / f"{item_id}.ocr"
+        # first load converts from json
+        assert gale.get_local_ocr(item_id) == content
+        assert cache_path.exists()
+
+        # subsequent loads use cached copy
+        with patch("ppa.archive.gale.convert_local_ocr") as mock_convert:
+            local_ocr = gale.get_local_ocr(item_id)
+            mock_convert.assert_not_called()
+        assert isinstance(local_ocr, gale.LocalOCR)
+        assert local_ocr == content
+        assert len(local_ocr) == 3
+        assert "0002" in local_ocr
+        assert "0004" not in local_ocr
+        assert local_ocr["0003"] == "pâge thrée"
+        assert local_ocr.get("0004") is None
+
+        # cache is updated when json changes
+        content["0004"] = "new page"
+        ocr_file.write_text(json.dumps(content))
+        assert gale.get_local_ocr(item_id) == content
+        assert gale.LocalOCR(cache_path)["0004"] == "new page"
+
+        # invalid cache file is replaced
+        cache_path.write_bytes(b"not a cache file")
+        assert gale.get_local_ocr(item_id) == content
+        assert isinstance(gale.get_local_ocr(item_id), gale.LocalOCR)
+
+        # no local ocr
+        with pytest.raises(FileNotFoundError):
+            gale.get_local_ocr("CB0123456780")
+
+    # cache not configured
+    with override_settings(GALE_LOCAL_OCR=str(tmp_path / "ocr"), GALE_OCR_CACHE=None):
+        assert gale.local_ocr_cache_path(item_id) is None
+        assert gale.get_local_ocr(item_id) == content
+        assert isinstance(gale.get_local_ocr(item_id), dict)
+
+
+def test_local_ocr_fingerprint(tmp_path):
+    item_id = "CB0123456789"
+    ocr_dir = tmp_path / "147"
+    ocr_dir.mkdir()
+    ocr_file = ocr_dir / f"{item_id}.json"
+
+    with override_settings(GALE_LOCAL_OCR=f"{tmp_path}"):
+        # no local ocr
+        no_ocr_fingerprint = gale.local_ocr_fingerprint(item_id)
+        assert len(no_ocr_fingerprint) == 40
+        # fingerprint changes when local ocr is added or changed
+        ocr_file.write_text(json.dumps({"0001": "Testing..."}))
+        fingerprint = gale.local_ocr_fingerprint(item_id)
+        assert fingerprint != no_ocr_fingerprint
+        ocr_file.write_text(json.dumps({"0001": "Testing... 1 2 3"}))
+        assert gale.local_ocr_fingerprint(item_id) != fingerprint
+
+
 @override_settings(GALE_LOCAL_OCR=None)
 def test_get_local_ocr_config_error():
     with pytest.raises(ImproperlyConfigured):
@@ -44,11 +115,94 @@ def test_get_local_ocr_invalid_id():
         gale.get_local_ocr("AB12345")
 
 
+gale_item_record = {
+    "doc": {"title": "The life of Alexander Pope"},
+    "pageResponse": {
+        "pages": [
+            {
+                "pageNumber": "0001",
+                "folioNumber": "i",
+                "image": {
+                    "id": "09876001234567",
+                    "url": "http://example.com/img/1",
+                    "width": 1000,
+                },
+                "ocrText": "test content",
+            },
+            {
+                "pageNumber": "0002",
+                "image": {"id": "08765002345678", "url": "http://example.com/img/2"},
+            },
+        ]
+    },
+}
+
+
+def test_compact_item_record():
+    record = gale.compact_item_record(gale_item_record)
+    # document metadata and ocr text are not included
+    assert record == {
+        "pageResponse": {
+            "pages": [
+                {
+                    "pageNumber": "0001",
+                    "folioNumber": "i",
+                    "image": {
+                        "id": "09876001234567",
+                        "url": "http://example.com/img/1",
+                    },
+                },
+                {
+                    "pageNumber": "0002",
+                    "image": {
+                        "id": "08765002345678",
+                        "url": "http://example.com/img/2",
+                    },
+                },
+            ]
+        }
+    }
+
+
+def test_item_record_store(tmp_path):
+    item_id = "CB0123456789"
+    # not configured; nothing stored or loaded
+    with override_settings(GALE_ITEM_STORE=None):
+        assert gale.item_record_path(item_id) is None
+        gale.save_item_record(item_id, gale_item_record)
+        assert gale.load_item_record(item_id) is None
+
+    with override_settings(GALE_ITEM_STORE=str(tmp_path)):
+        record_path = gale.item_record_path(item_id)
+        assert record_path == tmp_path / "147" / f"{item_id}.json.gz"
+        # not yet stored
+        assert gale.load_item_record(item_id) is None
+        gale.save_item_record(item_id, gale_item_record)
+        assert record_path.exists()
+        assert gale.load_item_record(item_id) == gale.compact_item_record(
+            gale_item_record
+        )
+        # no temporary files left behind
+        assert list(record_path.parent.iterdir()) == [record_path]
+
+        # invalid stored record is ignored
+        record_path.write_text("not compressed json")
+        assert gale.load_item_record(item_id) is None
+
+        # invalid id
+        with pytest.raises(ValueError):
+            gale.item_record_path("item_id")
+
+
 @override_settings(GALE_API_USERNAME="galeuser123")
 @patch("ppa.archive.gale.requests")
 class TestGaleAPI(TestCase):
     # NOTE: must extend django's test case to use override_settings on class
 
+    def setUp(self):
+        # reset the singleton so sessions are created with the current mock
+        gale.GaleAPI.instance = None
+
     def test_new(self, mockrequests):
         # test singleton behavior;
         # initializing multiple times should return the same instance
@@ -73,6 +227,7 @@ class TestGaleAPI(TestCase):
         # technical contact configured
         tech_contact = "webmaster@example.com"
         with override_settings(TECHNICAL_CONTACT=tech_contact):
+            gale.GaleAPI.instance = None
             gale_api = gale.GaleAPI()
             assert gale_api.session.headers["From"] == tech_contact
 
@@ -116,8 +271,11 @@ class TestGaleAPI(TestCase):
         with pytest.raises(gale.GaleItemForbidden):
             gale_api._make_request("foo")
 
+    @patch("ppa.archive.gale.GaleAPI.backoff")
     @patch("ppa.archive.gale.GaleAPI.get_api_key")
-    def test_make_request_refresh_key(self, mock_get_api_key, mockrequests):
+    def test_make_request_refresh_key(
+        self, mock_get_api_key, mock_backoff, mockrequests
+    ):
         # test retrying request when api key has expired
         gale_api = gale.GaleAPI()
         gale_api._api_key = None  # make sure unset for this test
@@ -143,6 +301,8 @@ class TestGaleAPI(TestCase):
         gale_api.session.get.assert_any_call(
             "%s/foo" % gale_api.api_root, params={"api_key": "testkey2"}, stream=False
         )
+        # new key is used immediately, without waiting
+        mock_backoff.assert_not_called()
 
         # retry should preserve parameters and streaming option
         gale_api.session.reset_mock()
@@ -177,6 +337,8 @@ class TestGaleAPI(TestCase):
         gale_api._make_request("foo", requires_api_key=True)
         # should be called twice: once for initial request, then for retry
         assert mock_get_api_key.call_count == 2
+        # should wait before retrying after server error
+        mock_backoff.assert_called_once_with(0)
         gale_api.session.get.assert_any_call(
             "%s/foo" % gale_api.api_root, params={"api_key": "testkey1"}, stream=False
         )
@@ -350,6 +512,142 @@ class TestGaleAPI(TestCase):
         with pytest.raises(gale.GaleAPIError):
             gale_api.get_item("CW123456")
 
+    @patch("ppa.archive.gale.GaleAPI.get_item")
+    def test_get_items(self, mock_get_item, mockrequests):
+        gale_api = gale.GaleAPI()
+        not_found = gale.GaleItemNotFound()
+
+        def get_item(item_id):
+            if item_id == "CW3":
+                raise not_found
+            return {"id": item_id}
+
+        mock_get_item.side_effect = get_item
+        item_ids = ["CW1", "CW2", "CW3", "CW4", "CW5"]
+        results = gale_api.get_items(item_ids, max_workers=2)
+        # results are returned in order; errors are returned instead of records
+        assert list(results) == [
+            ("CW1", {"id": "CW1"}),
+            ("CW2", {"id": "CW2"}),
+            ("CW3", not_found),
+            ("CW4", {"id": "CW4"}),
+            ("CW5", {"id": "CW5"}),
+        ]
+        assert mock_get_item.call_count == 5
+
+        # ids are consumed as needed, up to the number of workers ahead
+        mock_get_item.reset_mock()
+        item_ids = iter(["CW1", "CW2", "CW3", "CW4", "CW5"])
+        results = gale_api.get_items(item_ids, max_workers=2)
+        assert next(results) == ("CW1", {"id": "CW1"})
+        assert list(item_ids) == ["CW4", "CW5"]
+        results.close()
+
+    def test_session(self, mockrequests):
+        mockrequests.Session.side_effect = lambda: Mock(headers={"User-Agent": "x"})
+        gale_api = gale.GaleAPI()
+        session = gale_api.session
+        # same session is used for each request in the same thread
+        assert gale_api.session is session
+
+        # other threads get their own session
+        thread_sessions = []
+        thread = threading.Thread(
+            target=lambda: thread_sessions.append(gale_api.session)
+        )
+        thread.start()
+        thread.join()
+        assert thread_sessions[0] is not session
+
+        # sessions are not shared with forked processes
+        gale_api._pid = -1
+        assert gale_api.session is not session
+        mockrequests.Session.side_effect = None
+
+    def test_session_reinstantiate(self, mockrequests):
+        mockrequests.Session.side_effect = lambda: Mock(headers={"User-Agent": "x"})
+        gale_api = gale.GaleAPI()
+        session = gale_api.session
+
+        # thread keeps its session while the api is instantiated again
+        thread_sessions = []
+        thread_ready = threading.Event()
+        reinstantiated = threading.Event()
+
+        def use_session():
+            thread_sessions.append(gale_api.session)
+            thread_ready.set()
+            reinstantiated.wait()
+            thread_sessions.append(gale.GaleAPI().session)
+
+        thread = threading.Thread(target=use_session)
+        thread.start()
+        thread_ready.wait()
+        assert gale.GaleAPI() is gale_api
+        reinstantiated.set()
+        thread.join()
+        assert thread_sessions[0] is thread_sessions[1]
+        # current thread keeps its session too
+        assert gale.GaleAPI().session is session
+        assert mockrequests.Session.call_count == 2
+        mockrequests.Session.side_effect = None
+
+    @patch("ppa.archive.gale.GaleAPI.backoff")
+    def test_make_request_retry(self, mock_backoff, mockrequests):
+        gale_api = gale.GaleAPI()
+        gale_api.api_root = "http://example.com/api"
+        gale_api._api_key = "testkey"
+        mockrequests.codes = requests.codes
+        mockrequests.exceptions = requests.exceptions
+        unavailable_response = Mock(status_code=requests.codes.service_unavailable)
+        unavailable_response.elapsed.total_seconds.return_value = 1
+        ok_response = Mock(status_code=requests.codes.ok)
+        ok_response.elapsed.total_seconds.return_value = 1
+
+        # temporary error and connection error are retried after backoff
+        gale_api.session.get.side_effect = [
+            unavailable_response,
+            requests.exceptions.ConnectionError,
+            ok_response,
+        ]
+        assert gale_api._make_request("foo") == ok_response
+        assert gale_api.session.get.call_count == 3
+        assert mock_backoff.call_count == 2
+        mock_backoff.assert_called_with(1)
+        # api key is not refreshed
+        assert gale_api._api_key == "testkey"
+
+        # error raised when retries are exhausted
+        gale_api.session.get.side_effect = None
+        gale_api.session.get.return_value = unavailable_response
+        with pytest.raises(gale.GaleAPIError):
+            gale_api._make_request("foo")
+
+    def test_backoff(self, mockrequests):
+        gale_api = gale.GaleAPI()
+        with patch("ppa.archive.gale.time.sleep") as mock_sleep:
+            with patch("ppa.archive.gale.random.uniform") as mock_uniform:
+                gale_api.backoff(2)
+                # jitter up to exponential delay
+                mock_uniform.assert_called_with(0, gale_api.backoff_factor * 4)
+                mock_sleep.assert_called_with(mock_uniform.return_value)
+                # delay is capped
+                gale_api.backoff(20)
+                mock_uniform.assert_called_with(0, gale_api.max_backoff)
+
+    @patch("ppa.archive.gale.GaleAPI.get_api_key")
+    def test_refresh_api_key_expired(self, mock_get_api_key, mockrequests):
+        gale_api = gale.GaleAPI()
+        gale_api._api_key = "newkey"
+        # key has already been replaced; no new key requested
+        gale_api.refresh_api_key(expired_key="oldkey")
+        mock_get_api_key.assert_not_called()
+        assert gale_api.api_key == "newkey"
+        # key is still current; new key requested
+        mock_get_api_key.return_value = "newerkey"
+        gale_api.refresh_api_key(expired_key="newkey")
+        assert gale_api.api_key == "newerkey"
+
     @patch("ppa.archive.gale.get_local_ocr")
     @patch("ppa.archive.gale.GaleAPI.get_item")
     def test_get_item_pages(self, mock_get_item, mock_get_local_ocr, mockrequests):
@@ -445,6 +743,64 @@ class TestGaleAPI(TestCase):
         assert mock_get_local_ocr.call_count == 1
         assert len(page_data) == 3
 
+        # page span; only load text for pages in range
+        mock_local_ocr = Mock()
+        mock_local_ocr.__contains__ = Mock(return_value=True)
+        mock_local_ocr.get.return_value = "local ocr text"
+        mock_get_local_ocr.side_effect = None
+        mock_get_local_ocr.return_value = mock_local_ocr
+        page_data = list(gale_api.get_item_pages(item_id, api_response, page_span=[2]))
+        assert len(page_data) == 3
+        mock_local_ocr.get.assert_called_once_with("0002")
+        assert [p["content"] for p in page_data] == [None, "local ocr text", None]
+        assert [p["tags"] for p in page_data] == [[], ["local_ocr"], []]
+
+    @patch("ppa.archive.gale.save_item_record")
+    @patch("ppa.archive.gale.load_item_record")
+    @patch("ppa.archive.gale.get_local_ocr")
+    @patch("ppa.archive.gale.GaleAPI.get_item")
+    def test_get_item_pages_stored_record(
+        self,
+        mock_get_item,
+        mock_get_local_ocr,
+        mock_load_item_record,
+        mock_save_item_record,
+        mockrequests,
+    ):
+        item_id = "CW0123456789"
+        gale_api = gale.GaleAPI()
+        mock_load_item_record.return_value = gale.compact_item_record(gale_item_record)
+        mock_get_item.return_value = gale_item_record
+
+        # local ocr for every page; use stored record, no api call
+        mock_get_local_ocr.return_value = {"0001": "local 1", "0002": "local 2"}
+        page_data = list(gale_api.get_item_pages(item_id))
+        mock_load_item_record.assert_called_with(item_id)
+        mock_get_item.assert_not_called()
+        mock_save_item_record.assert_not_called()
+        assert [p["content"] for p in page_data] == ["local 1", "local 2"]
+        assert [p["label"] for p in page_data] == ["i", None]
+        assert [p["image_id_s"] for p in page_data] == [
+            "09876001234567",
+            "08765002345678",
+        ]
+
+        # local ocr missing a page; stored record has no gale ocr, so use api
+        mock_get_local_ocr.return_value = {"0002": "local 2"}
+        page_data = list(gale_api.get_item_pages(item_id))
+        mock_get_item.assert_called_once_with(item_id)
+        mock_save_item_record.assert_called_once_with(item_id, gale_item_record)
+        assert [p["content"] for p in page_data] == ["test content", "local 2"]
+
+        # no stored record; get from api and store
+        mock_get_item.reset_mock()
+        mock_save_item_record.reset_mock()
+        mock_load_item_record.return_value = None
+        mock_get_local_ocr.return_value = {"0001": "local 1", "0002": "local 2"}
+        page_data = list(gale_api.get_item_pages(item_id))
+        mock_get_item.assert_called_once_with(item_id)
+        mock_save_item_record.assert_called_once_with(item_id, gale_item_record)
+
 
 @override_settings(MARC_DATA="/path/to/data/marc")
 @patch("ppa.archive.gale.PairtreeStorageFactory")
@@ -18,14 +18,22 @@ from ppa.archive.models import Collection, DigitizedWork
 @pytest.mark.django_db
 class TestGaleImportCommand:
     @override_settings(GALE_API_USERNAME="galeuser123")
+    @patch("ppa.archive.management.commands.gale_import.GaleAPI.get_items")
     @patch("ppa.archive.management.commands.gale_import.Command.import_record")
-    def test_import_ids(self, mock_import_record):
+    def test_import_ids(self, mock_import_record, mock_get_items):
         stdout = StringIO()
         cmd = gale_import.Command(stdout=stdout)
         test_ids = ["abc1", "def2", "ghi3"]
+        # already imported; should not be retrieved from the api
+        DigitizedWork.objects.create(source_id="def2")
+        mock_get_items.return_value = iter(
+            [("abc1", {"doc": "abc1"}), ("ghi3", {"doc": "ghi3"})]
+        )
         cmd.handle(ids=test_ids, csv=None)
-        for item_id in test_ids:
-            mock_import_record.assert_any_call(item_id)
+        assert list(mock_get_items.call_args.args[0]) == ["abc1", "ghi3"]
+        mock_import_record.assert_any_call("abc1", gale_record={"doc": "abc1"})
+        mock_import_record.assert_any_call("def2", gale_record=None)
+        mock_import_record.assert_any_call("ghi3", gale_record={"doc": "ghi3"})
         assert cmd.stats["total"] == 3
         output = stdout.getvalue()
         assert "Processed 3 items for import." in output
@@ -36,16 +44,22 @@ class TestGaleImportCommand:
         )
 
     @override_settings(GALE_API_USERNAME="galeuser123")
+    @patch("ppa.archive.management.commands.gale_import.GaleAPI.get_items")
     @patch("ppa.archive.management.commands.gale_import.Command.import_record")
     @patch("ppa.archive.management.commands.gale_import.Command.load_collections")
-    def test_import_csv(self, mock_load_collections, mock_import_record, tmp_path):
+    def test_import_csv(
+        self, mock_load_collections, mock_import_record, mock_get_items, tmp_path
+    ):
         csvfile = tmp_path / "test_import.csv"
         csvfile.write_text("\n".join(["ID,NOTES", "12345,brief mention in footnotes"]))
+        mock_get_items.return_value = iter([("12345", {"doc": "12345"})])
 
         stdout = StringIO()
         cmd = gale_import.Command(stdout=stdout)
         cmd.handle(ids=[], csv=csvfile)
-        mock_import_record.assert_any_call("12345", NOTES="brief mention in footnotes")
+        mock_import_record.assert_any_call(
+            "12345", gale_record={"doc": "12345"}, NOTES="brief mention in footnotes"
+        )
         assert cmd.stats["total"] == 1
         output = stdout.getvalue()
         assert "Processed 1 item for import." in output
@@ -260,6 +274,22 @@ class TestGaleImportCommand:
         output = stderr.getvalue()
         assert "Error getting item information for test_id" in output
 
+    @override_settings(GALE_API_USERNAME="galeuser123")
+    def test_import_record_prefetched_error(self):
+        # error retrieving item record in parallel
+        stderr = StringIO()
+        cmd = gale_import.Command(stderr=stderr)
+        cmd.importer = GaleImporter()
+        cmd.importer.add_item_prep()
+        cmd.importer.gale_api = Mock(GaleAPI)
+        cmd.stats = Counter()
+        digwork = cmd.import_record("test_id", gale_record=GaleAPIError())
+        assert not digwork
+        # api is not called again
+        cmd.importer.gale_api.get_item.assert_not_called()
+        assert cmd.stats["error"] == 1
+        assert "Error getting item information for test_id" in stderr.getvalue()
+
     @override_settings(GALE_API_USERNAME="example1234")
     @patch("ppa.archive.import_util.get_marc_record")
     def test_import_record_marc_notfound(self, mock_get_marc_record):
@@ -348,10 +378,13 @@ class TestGaleImportCommand:
         assert f"Error loading the specified CSV file: {badpath}" in str(err)
 
     @override_settings(GALE_API_USERNAME="galeuser123")
+    @patch("ppa.archive.management.commands.gale_import.GaleAPI.get_items")
     @patch("ppa.archive.management.commands.gale_import.Command.import_record")
-    def test_call_command(self, mock_import_record):
-        call_command("gale_import", "1234")
+    def test_call_command(self, mock_import_record, mock_get_items):
+        mock_get_items.return_value = iter([("1234", {"doc": "1234"})])
+        call_command("gale_import", "1234", "--workers", "2")
         assert mock_import_record.call_count == 1
+        assert mock_get_items.call_args.kwargs["max_workers"] == 2
 
     @override_settings()
     def test_config_error(self):
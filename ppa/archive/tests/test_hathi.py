@@ -1,3 +1,4 @@
+import io
 import json
 import os
 import tempfile
@@ -11,6 +12,7 @@ import pytest
 import requests
 from django.conf import settings
 from django.test import TestCase, override_settings
+from intspan import intspan
 from neuxml.xmlmap import load_xmlobject_from_file
 from pairtree import pairtree_client, pairtree_path, storage_exceptions
 
@@ -83,6 +85,109 @@ class TestHathiBibliographicAPI(TestCase):
             "http://catalog.hathitrust.org/api/volumes/full/htid/%s.json" % htid
         )
 
+    def test_records(self, mockrequests):
+        mockrequests.codes = requests.codes
+        mocksession = mockrequests.Session.return_value
+        mocksession.get.return_value.status_code = requests.codes.ok
+
+        bib_api = hathi.HathiBibliographicAPI()
+        htid = "njp.32101013082597"
+        with open(self.bibdata) as sample_bibdata:
+            bibdata = json.load(sample_bibdata)
+        # multiple-record results are keyed on request id;
+        # invalid ids are included with no records
+        mocksession.get.return_value.json.return_value = {
+            "htid:%s" % htid: bibdata,
+            "htid:bogus.1": {"records": {}, "items": []},
+        }
+
+        records = list(bib_api.records("htid", [htid, "bogus.1"]))
+        assert len(records) == 1
+        assert records[0][0] == htid
+        assert isinstance(records[0][1], hathi.HathiBibliographicRecord)
+        mocksession.get.assert_called_with(
+            "http://catalog.hathitrust.org/api/volumes/full/json/htid:%s|htid:bogus.1"
+            % htid
+        )
+
+        # ids are requested in batches
+        mocksession.get.reset_mock()
+        list(bib_api.records("htid", ["a.1", "b.2", "c.3"], batch_size=2))
+        assert mocksession.get.call_count == 2
+        mocksession.get.assert_called_with(
+            "http://catalog.hathitrust.org/api/volumes/full/json/htid:c.3"
+        )
+
+        # not found response; nothing returned
+        mocksession.get.return_value.status_code = requests.codes.not_found
+        assert not list(bib_api.records("htid", [htid], mode="brief"))
+
+    def test_record_cache(self, mockrequests):
+        mockrequests.codes = requests.codes
+        mocksession = mockrequests.Session.return_value
+        mockresponse = mocksession.get.return_value
+        mockresponse.status_code = requests.codes.ok
+        mockresponse.headers = {"ETag": '"abc123"'}
+        with open(self.bibdata) as sample_bibdata:
+            bibdata = json.load(sample_bibdata)
+        mockresponse.json.return_value = bibdata
+        htid = "njp.32101013082597"
+        url = "http://catalog.hathitrust.org/api/volumes/brief/htid/%s.json" % htid
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(HATHI_BIBDATA_CACHE=tmpdir):
+                bib_api = hathi.HathiBibliographicAPI()
+                # nothing cached yet
+                assert bib_api.cached_record("htid", htid, mode="brief") is None
+                bib_api.brief_record("htid", htid)
+                # no cached copy, so not a conditional request
+                mocksession.get.assert_called_with(url)
+                cached = bib_api.cached_record("htid", htid, mode="brief")
+                assert cached.record_id == "008883512"
+                # cached in a separate location by mode
+                assert bib_api.cached_record("htid", htid) is None
+
+                # cached copy is revalidated with etag
+                mockresponse.status_code = requests.codes.not_modified
+                mockresponse.json.return_value = {}
+                record = bib_api.brief_record("htid", htid)
+                mocksession.get.assert_called_with(
+                    url, headers={"If-None-Match": '"abc123"'}
+                )
+                # cached data used for not modified response
+                assert record.record_id == "008883512"
+
+                # records from multiple-record requests are cached
+                mockresponse.status_code = requests.codes.ok
+                mockresponse.json.return_value = {"htid:%s" % htid: bibdata}
+                list(bib_api.records("htid", [htid]))
+                assert bib_api.cached_record("htid", htid).record_id == "008883512"
+
+                # ark ids are quoted for cache filenames
+                ark_id = "aeu.ark:/13960/t1pg22p71"
+                mockresponse.json.return_value = bibdata
+                bib_api.record("htid", ark_id)
+                assert bib_api.cached_record("htid", ark_id)
+
+        # no cache configured
+        with override_settings(HATHI_BIBDATA_CACHE=None):
+            bib_api = hathi.HathiBibliographicAPI()
+            bib_api.brief_record("htid", htid)
+            mocksession.get.assert_called_with(url)
+            assert bib_api.cached_record("htid", htid, mode="brief") is None
+
+    def test_retries(self, mockrequests):
+        mocksession = mockrequests.Session.return_value
+        hathi.HathiBibliographicAPI()
+        # retry adapter mounted for http and https
+        mockrequests.adapters.HTTPAdapter.assert_called_once()
+        kwargs = mockrequests.adapters.HTTPAdapter.call_args.kwargs
+        assert kwargs["max_retries"].total == hathi.HathiBaseAPI.retries
+        assert kwargs["pool_maxsize"] == hathi.HathiBaseAPI.pool_size
+        adapter = mockrequests.adapters.HTTPAdapter.return_value
+        mocksession.mount.assert_any_call("http://", adapter)
+        mocksession.mount.assert_any_call("https://", adapter)
+
 
 class TestHathiBibliographicRecord(TestCase):
     bibdata_full = os.path.join(FIXTURES_PATH, "bibdata_full_njp.32101013082597.json")
@@ -138,6 +243,10 @@ class TestHathiBibliographicRecord(TestCase):
         # test no marcxml in data, e.g. brief record
         assert self.brief_record.marcxml is None
 
+    def test_is_brief(self):
+        assert not self.record.is_brief
+        assert self.brief_record.is_brief
+
 
 class TestMETS(TestCase):
     metsfile = os.path.join(FIXTURES_PATH, "79279237.mets.xml")
@@ -172,6 +281,47 @@ class TestMETS(TestCase):
         assert textfile.sequence == "00000001"
         assert textfile.location == "00000001.txt"
 
+    def test_mets_structmap_pages(self):
+        mets_pages = hathi.mets_structmap_pages(self.metsfile)
+        assert isinstance(mets_pages, types.GeneratorType)
+        mets_pages = list(mets_pages)
+        assert len(mets_pages) == 640
+        assert isinstance(mets_pages[0], hathi.METSPage)
+        # should match page information from the full METS object
+        for mets_page, page in zip(mets_pages, self.mets.structmap_pages):
+            assert mets_page.order == page.order
+            assert mets_page.label == page.label
+            assert mets_page.orderlabel == page.orderlabel
+            assert mets_page.text_file_id == page.text_file_id
+            assert mets_page.sequence == page.text_file.sequence
+            assert mets_page.location == page.text_file_location
+
+    def test_mets_structmap_pages_file_order(self):
+        # file information after the structmap, pointer to a missing file,
+        # and a structmap that is not physical
+        mets_xml = b"""<METS:mets xmlns:METS="http://www.loc.gov/METS/"
+            xmlns:xlink="http://www.w3.org/1999/xlink">
+          <METS:structMap TYPE="logical">
+            <METS:div ORDER="1" TYPE="page"><METS:fptr FILEID="TXT00000001"/></METS:div>
+          </METS:structMap>
+          <METS:structMap TYPE="physical"><METS:div TYPE="volume">
+            <METS:div ORDER="1" TYPE="page"><METS:fptr FILEID="TXT00000001"/></METS:div>
+            <METS:div ORDER="2" ORDERLABEL="ii" TYPE="page">
+              <METS:fptr FILEID="IMG00000002"/><METS:fptr FILEID="OCR00000002"/>
+            </METS:div>
+          </METS:div></METS:structMap>
+          <METS:fileSec><METS:fileGrp>
+            <METS:file ID="TXT00000001" SEQ="00000001">
+              <METS:FLocat xlink:href="00000001.txt"/>
+            </METS:file>
+          </METS:fileGrp></METS:fileSec>
+        </METS:mets>"""
+        mets_pages = list(hathi.mets_structmap_pages(io.BytesIO(mets_xml)))
+        assert mets_pages == [
+            hathi.METSPage(1, None, None, "TXT00000001", "00000001", "00000001.txt"),
+            hathi.METSPage(2, None, "ii", "OCR00000002", None, None),
+        ]
+
 
 @patch("ppa.archive.hathi.requests")
 class TestHathiBaseAPI(TestCase):
@@ -208,6 +358,15 @@ class TestHathiBaseAPI(TestCase):
         base_api.session.get.assert_called_with("%s/foo" % base_api.api_root)
         assert resp == base_api.session.get.return_value
 
+        # conditional request, not modified
+        base_api.session.get.return_value.status_code = requests.codes.not_modified
+        headers = {"If-None-Match": '"abc123"'}
+        resp = base_api._make_request("foo", headers=headers)
+        base_api.session.get.assert_called_with(
+            "%s/foo" % base_api.api_root, headers=headers
+        )
+        assert resp == base_api.session.get.return_value
+
         # 404 not found response should raise item not found
         base_api.session.get.return_value.status_code = requests.codes.not_found
         with pytest.raises(hathi.HathiItemNotFound):
@@ -353,13 +512,60 @@ class TestHathiObject:
             hobj.metsfile_path(my_ptree_client)
             mock_ptree_obj_meth.assert_called_with(ptree_client=my_ptree_client)
 
+    def test_content_fingerprint(self):
+        hobj = hathi.HathiObject(hathi_id="chi.79279237")
+        zip_path = os.path.join(self.ht_tempdir.name, "79279237.zip")
+        mets_path = os.path.join(self.ht_tempdir.name, "79279237.mets.xml")
+        for path in (zip_path, mets_path):
+            with open(path, "w") as outfile:
+                outfile.write("test")
+
+        with patch.object(hobj, "pairtree_client") as mock_ptree_client:
+            with patch.object(hobj, "zipfile_path", return_value=zip_path):
+                with patch.object(hobj, "metsfile_path", return_value=mets_path):
+                    fingerprint = hobj.content_fingerprint()
+                    assert len(fingerprint) == 40
+                    assert hobj.content_fingerprint() == fingerprint
+                    # pairtree client is shared
+                    hobj.metsfile_path.assert_called_with(
+                        ptree_client=mock_ptree_client.return_value
+                    )
+                    # changes when file is modified
+                    with open(mets_path, "a") as outfile:
+                        outfile.write("more")
+                    assert hobj.content_fingerprint() != fingerprint
+
+                    # error if data not found
+                    hobj.zipfile_path.side_effect = (
+                        storage_exceptions.PartNotFoundException
+                    )
+                    with pytest.raises(storage_exceptions.PartNotFoundException):
+                        hobj.content_fingerprint()
+
     @patch("neuxml.xmlmap.load_xmlobject_from_file")
     def test_mets_xml(self, mock_xml_load):
         hobj = hathi.HathiObject(hathi_id="chi.79279237")
         with patch.object(hobj, "metsfile_path") as mock_metsfile_path:
             # should call load_xmlobject_from_file
             hobj.mets_xml()
-            mock_xml_load.assert_called_once_with(mock_metsfile_path.return_value,hathi.MinimalMETS)
+            mock_xml_load.assert_called_once_with(
+                mock_metsfile_path.return_value, hathi.MinimalMETS
+            )
+
+    @patch("ppa.archive.hathi.mets_structmap_pages")
+    def test_mets_pages(self, mock_mets_structmap_pages):
+        hobj = hathi.HathiObject(hathi_id="chi.79279237")
+        with patch.object(hobj, "metsfile_path") as mock_metsfile_path:
+            mets_pages = hobj.mets_pages()
+            mock_mets_structmap_pages.assert_called_once_with(
+                mock_metsfile_path.return_value
+            )
+            assert mets_pages == mock_mets_structmap_pages.return_value
+
+            # errors finding the mets file are raised immediately
+            mock_metsfile_path.side_effect = storage_exceptions.PartNotFoundException
+            with pytest.raises(storage_exceptions.PartNotFoundException):
+                hobj.mets_pages()
 
     def test_delete_pairtree_data(self):
         hobj = hathi.HathiObject(hathi_id="chi.79279237")
@@ -398,8 +604,8 @@ class TestHathiObject:
         mets = load_xmlobject_from_file(metsfile, hathi.MinimalMETS)
         with patch.object(hobj, "zipfile_path") as mock_zipfile_path:
             mock_zipfile_path.return_value = "/path/to/79279237.zip"
-            with patch.object(hobj, "mets_xml") as mock_mets_xml:
-                mock_mets_xml.return_value = mets
+            with patch.object(hobj, "metsfile_path") as mock_metsfile_path:
+                mock_metsfile_path.return_value = metsfile
                 hobj.content_dir = "data"
 
                 page_data = hobj.page_data()
@@ -413,8 +619,34 @@ class TestHathiObject:
                     assert data["label"] == mets_page.display_label
                     assert "tags" in data
                     assert data["tags"] == mets_page.label.split(", ")
+                # zip file members are based on content dir and mets file location
+                mockzip_obj.open.assert_any_call("data/00000001.txt")
+
+                # page span; only read content for pages in range
+                mockzip_obj.open.reset_mock()
+                mockzip_obj.open.return_value.__enter__.return_value.read.return_value.decode.side_effect = (  # noqa: e501
+                    contents
+                )
+                page_data = list(hobj.page_data(page_span=intspan("2-3")))
+                # stops after the last page in range
+                assert len(page_data) == 3
+                assert page_data[0]["content"] is None
+                assert (
+                    page_data[0]["page_id"]
+                    == mets.structmap_pages[0].text_file.sequence
+                )
+                assert [data["content"] for data in page_data[1:]] == list(contents)
+                assert mockzip_obj.open.call_count == 2
+                mockzip_obj.open.assert_any_call("data/00000002.txt")
+
+                # pages missing from the zip file are skipped
+                mockzip_obj.getinfo.side_effect = KeyError
+                assert not list(hobj.page_data())
+                mockzip_obj.getinfo.side_effect = None
 
                 # not suppressed but no data
-                mock_mets_xml.side_effect = storage_exceptions.ObjectNotFoundException
+                mock_metsfile_path.side_effect = (
+                    storage_exceptions.ObjectNotFoundException
+                )
                 # should log an error, not currently tested
                 assert not list(hobj.page_data())
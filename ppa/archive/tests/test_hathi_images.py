@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 from unittest.mock import Mock, call, patch
 
@@ -5,6 +6,8 @@ import pytest
 import requests
 import signal
 
+from corppa.utils.path_utils import get_vol_dir
+
 from ppa.archive.templatetags.ppa_tags import page_image_url
 from ppa.archive.management.commands import hathi_images
 
@@ -126,14 +129,17 @@ class TestHathiImagesCommand:
             "Ctrl-C / Interrupt to quit immediately\n"
         )
 
-    @patch("requests.get")
-    def test_download_image(self, mock_get, tmp_path):
+    def test_download_image(self, tmp_path):
         cmd = hathi_images.Command()
-        
+        cmd.session = Mock()
+        cmd.rate_limiter = Mock()
+        mock_get = cmd.session.get
+
         # Not ok status
-        mock_get.return_value = Mock(status_code=503)
+        mock_get.return_value = Mock(status_code=404)
         result = cmd.download_image("page_url", "out_file")
-        mock_get.assert_called_once_with("page_url")
+        mock_get.assert_called_once_with("page_url", timeout=cmd.timeout)
+        cmd.rate_limiter.acquire.assert_called_once()
         assert result is False
 
         # Ok status
@@ -141,6 +147,168 @@ class TestHathiImagesCommand:
         mock_get.reset_mock()
         mock_get.return_value = Mock(status_code=200, content=b"image content")
         result = cmd.download_image("page_url", out_file)
-        mock_get.assert_called_once_with("page_url")
+        mock_get.assert_called_once_with("page_url", timeout=cmd.timeout)
         assert result is True
         assert out_file.read_text() == "image content"
+        # no temporary files left behind
+        assert [f.name for f in tmp_path.iterdir()] == ["test.jpg"]
+
+        # Connection error
+        mock_get.reset_mock()
+        mock_get.side_effect = requests.exceptions.ConnectionError
+        assert cmd.download_image("page_url", out_file) is False
+
+    def test_download_image_throttled(self, tmp_path):
+        cmd = hathi_images.Command()
+        cmd.session = Mock()
+        cmd.rate_limiter = Mock()
+        out_file = tmp_path / "test.jpg"
+
+        # Throttled, then ok
+        cmd.session.get.side_effect = [
+            Mock(status_code=503, headers={}),
+            Mock(status_code=429, headers={"Retry-After": "5"}),
+            Mock(status_code=200, content=b"image content"),
+        ]
+        assert cmd.download_image("page_url", out_file) is True
+        assert cmd.session.get.call_count == 3
+        # requests paused with backoff
+        cmd.rate_limiter.pause.assert_has_calls([call(1), call(5)])
+
+        # Throttled on every attempt
+        cmd.session.get.reset_mock()
+        cmd.session.get.side_effect = None
+        cmd.session.get.return_value = Mock(status_code=503, headers={})
+        assert cmd.download_image("page_url", out_file) is False
+        assert cmd.session.get.call_count == cmd.max_attempts
+
+    def test_get_backoff_delay(self):
+        cmd = hathi_images.Command()
+        response = Mock(headers={})
+        assert cmd.get_backoff_delay(response, 0) == 1
+        assert cmd.get_backoff_delay(response, 3) == 8
+        assert cmd.get_backoff_delay(response, 10) == cmd.max_backoff_delay
+        response.headers["Retry-After"] = "30"
+        assert cmd.get_backoff_delay(response, 0) == 30
+        # http date retry after is not supported; use exponential backoff
+        response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+        assert cmd.get_backoff_delay(response, 1) == 2
+
+    def test_manifest(self, tmp_path):
+        cmd = hathi_images.Command()
+        cmd.full_width = 800
+        cmd.thumbnail_width = 250
+        manifest = cmd.get_manifest("htid", range(1, 4))
+        assert manifest == {
+            "htid": "htid",
+            "pages": [1, 2, 3],
+            "full_width": 800,
+            "thumbnail_width": 250,
+        }
+        # no manifest
+        assert not cmd.volume_complete(tmp_path, manifest)
+        cmd.save_manifest(tmp_path, manifest)
+        assert cmd.volume_complete(tmp_path, manifest)
+        # manifest with different image widths
+        cmd.full_width = 1000
+        assert not cmd.volume_complete(tmp_path, cmd.get_manifest("htid", range(1, 4)))
+        # invalid manifest
+        manifest_path = cmd.get_manifest_path(tmp_path, manifest)
+        assert manifest_path == tmp_path / "manifest-1-3.json"
+        manifest_path.write_text("{")
+        assert not cmd.volume_complete(tmp_path, manifest)
+
+    def test_manifest_excerpts(self, tmp_path):
+        cmd = hathi_images.Command()
+        cmd.full_width = 800
+        cmd.thumbnail_width = 250
+        # excerpts from the same volume have separate manifests
+        excerpt_a = cmd.get_manifest("htid", range(5, 10))
+        excerpt_b = cmd.get_manifest("htid", range(20, 31))
+        cmd.save_manifest(tmp_path, excerpt_a)
+        cmd.save_manifest(tmp_path, excerpt_b)
+        assert cmd.volume_complete(tmp_path, excerpt_a)
+        assert cmd.volume_complete(tmp_path, excerpt_b)
+
+    @patch.object(hathi_images.Command, "download_image")
+    def test_download_page(self, mock_download_image, tmp_path):
+        cmd = hathi_images.Command()
+        cmd.full_width = 800
+        cmd.thumbnail_width = 250
+        (tmp_path / "thumbnails").mkdir()
+        # full image exists; thumbnail download fails
+        (tmp_path / "page.jpg").write_bytes(b"image content")
+        mock_download_image.return_value = False
+        stats = cmd.download_page("mdp.39015", 1, tmp_path, "page.jpg")
+        assert isinstance(stats, hathi_images.DownloadStats)
+        assert stats.full == {"skip": 1}
+        assert stats.thumbnail == {"error": 1}
+        mock_download_image.assert_called_once()
+
+        # thumbnail downloaded
+        mock_download_image.return_value = True
+        stats = cmd.download_page("mdp.39015", 1, tmp_path, "page.jpg")
+        assert stats.full == {"skip": 1}
+        assert stats.thumbnail == {"fetch": 1}
+
+    @patch.object(hathi_images.Command, "download_image", return_value=True)
+    def test_download_volume_images(self, mock_download_image, tmp_path):
+        cmd = hathi_images.Command()
+        cmd.output_dir = tmp_path
+        cmd.full_width = 800
+        cmd.thumbnail_width = 250
+        cmd.show_progress = False
+        cmd.executor = ThreadPoolExecutor(max_workers=2)
+        htid = "mdp.39015"
+
+        stats = cmd.download_volume_images(htid, range(1, 4))
+        assert stats.full["fetch"] == 3
+        assert stats.thumbnail["fetch"] == 3
+        assert mock_download_image.call_count == 6
+        # manifest saved for completed volume
+        vol_dir = tmp_path / get_vol_dir(htid)
+        assert cmd.volume_complete(vol_dir, cmd.get_manifest(htid, range(1, 4)))
+
+        # completed volume is skipped without downloading
+        mock_download_image.reset_mock()
+        stats = cmd.download_volume_images(htid, range(1, 4))
+        assert stats.full["skip"] == 3
+        assert stats.thumbnail["skip"] == 3
+        mock_download_image.assert_not_called()
+
+        # errors; no manifest saved
+        mock_download_image.return_value = False
+        stats = cmd.download_volume_images(htid, range(1, 5))
+        assert stats.full["error"] == 4
+        assert not cmd.volume_complete(vol_dir, cmd.get_manifest(htid, range(1, 5)))
+        cmd.executor.shutdown()
+
+
+class TestRateLimiter:
+    @patch("time.sleep")
+    def test_acquire(self, mock_sleep):
+        # no rate limit
+        limiter = hathi_images.RateLimiter(None)
+        for _ in range(5):
+            limiter.acquire()
+        mock_sleep.assert_not_called()
+
+        # burst allowed without waiting, then waits for a token
+        limiter = hathi_images.RateLimiter(1, burst=2)
+        limiter.acquire()
+        limiter.acquire()
+        mock_sleep.assert_not_called()
+        with patch("time.monotonic") as mock_monotonic:
+            mock_monotonic.side_effect = [limiter.last_update, limiter.last_update + 1]
+            limiter.acquire()
+        assert mock_sleep.call_count == 1
+        assert mock_sleep.call_args.args[0] == pytest.approx(1, abs=0.01)
+
+    @patch("time.sleep")
+    def test_pause(self, mock_sleep):
+        limiter = hathi_images.RateLimiter(None)
+        with patch("time.monotonic") as mock_monotonic:
+            mock_monotonic.side_effect = [100, 100, 105]
+            limiter.pause(5)
+            limiter.acquire()
+        mock_sleep.assert_called_once_with(5)
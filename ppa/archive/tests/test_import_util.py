@@ -3,6 +3,7 @@ from json.decoder import JSONDecodeError
 from unittest.mock import Mock, patch
 
 import pytest
+import requests
 from django.conf import settings
 from django.contrib.admin.models import ADDITION, LogEntry
 from django.contrib.auth.models import User
@@ -63,9 +64,14 @@ class TestHathiImporter(TestCase):
     @patch("ppa.archive.import_util.os.path.isdir")
     @patch("ppa.archive.import_util.glob.glob")
     @patch("ppa.archive.models.DigitizedWork.add_from_hathi")
-    def test_add_items_notfound(self, mock_add_from_hathi, mock_glob, mock_isdir):
+    @patch("ppa.archive.hathi.HathiBibliographicAPI")
+    def test_add_items_notfound(
+        self, mock_hathi_bib_api, mock_add_from_hathi, mock_glob, mock_isdir
+    ):
         test_htid = "a.123"
         htimporter = HathiImporter([test_htid])
+        # no bibliographic data returned by batch request
+        mock_hathi_bib_api.return_value.records.return_value = []
         # unlikely scenario, but simulate rsync success with bib api failure
         mock_isdir.return_value = True  # directory exists
         mock_glob.return_value = ["foo.zip"]  # zipfile exists
@@ -76,7 +82,11 @@ class TestHathiImporter(TestCase):
             htimporter.add_items()
             mock_rsync_data.assert_called_with()
             mock_add_from_hathi.assert_called_with(
-                test_htid, htimporter.bib_api, log_msg_src=None, user=None
+                test_htid,
+                htimporter.bib_api,
+                log_msg_src=None,
+                user=None,
+                bibdata=None,
             )
             assert not htimporter.imported_works
             # actual error stored in results
@@ -88,7 +98,10 @@ class TestHathiImporter(TestCase):
     @patch("ppa.archive.import_util.os.path.isdir")
     @patch("ppa.archive.import_util.glob.glob")
     @patch("ppa.archive.models.DigitizedWork.add_from_hathi")
-    def test_add_items_rsync_failure(self, mock_add_from_hathi, mock_glob, mock_isdir):
+    @patch("ppa.archive.hathi.HathiBibliographicAPI")
+    def test_add_items_rsync_failure(
+        self, mock_hathi_bib_api, mock_add_from_hathi, mock_glob, mock_isdir
+    ):
         test_htid = "a.123"
         htimporter = HathiImporter([test_htid])
 
@@ -125,12 +138,23 @@ class TestHathiImporter(TestCase):
     @patch("ppa.archive.import_util.glob.glob")
     @patch("ppa.archive.models.DigitizedWork.page_count")
     @patch("ppa.archive.models.DigitizedWork.add_from_hathi")
+    @patch("ppa.archive.hathi.HathiBibliographicAPI")
     @override_settings(HATHI_DATA="/my/test/ppa/ht_data")
     def test_add_items_success(
-        self, mock_page_count, mock_add_from_hathi, mock_glob, mock_isdir
+        self,
+        mock_hathi_bib_api,
+        mock_page_count,
+        mock_add_from_hathi,
+        mock_glob,
+        mock_isdir,
     ):
         test_htid = "a.123"
         htimporter = HathiImporter([test_htid])
+        # bibliographic data retrieved by batch request
+        mock_bibdata = Mock()
+        mock_hathi_bib_api.return_value.records.return_value = [
+            (test_htid, mock_bibdata)
+        ]
         # simulate rsync success
         mock_isdir.return_value = True  # directory exists
         mock_glob.return_value = ["foo.zip"]  # zipfile exists
@@ -140,23 +164,53 @@ class TestHathiImporter(TestCase):
             htimporter.add_items(log_msg_src)
             assert len(htimporter.imported_works) == 1
             assert htimporter.results[test_htid] == HathiImporter.SUCCESS
+            # prefetched bibliographic data passed through
+            mock_add_from_hathi.assert_called_with(
+                test_htid,
+                htimporter.bib_api,
+                log_msg_src=log_msg_src,
+                user=None,
+                bibdata=mock_bibdata,
+            )
+
+    @patch("ppa.archive.hathi.HathiBibliographicAPI")
+    def test_add_item_prep(self, mock_hathi_bib_api):
+        htimporter = HathiImporter(["a.123", "b.456"])
+        mock_bib_api = mock_hathi_bib_api.return_value
+        mock_bibdata = Mock()
+        mock_bib_api.records.return_value = [("a.123", mock_bibdata)]
+        with patch.object(htimporter, "rsync_data") as mock_rsync_data:
+            htimporter.add_item_prep()
+            mock_rsync_data.assert_called_with()
+        # bibliographic data retrieved for all ids in one batch request
+        mock_bib_api.records.assert_called_with("htid", htimporter.source_ids)
+        assert htimporter.bibdata == {"a.123": mock_bibdata}
+
+        # request error: no prefetched data, falls back to single requests
+        mock_bib_api.records.side_effect = requests.exceptions.ConnectionError
+        with patch.object(htimporter, "rsync_data"):
+            htimporter.add_item_prep()
+        assert htimporter.bibdata == {}
 
     @patch("ppa.archive.import_util.DigitizedWork")
-    @patch("ppa.archive.import_util.Page")
-    def test_index(self, mock_page, mock_digitizedwork):
+    @patch("ppa.archive.import_util.IndexJob")
+    def test_index(self, mock_indexjob, mock_digitizedwork):
         test_htid = "a:123"
         htimporter = HathiImporter([test_htid])
         # no imported works, index should do nothing
         htimporter.index()
         mock_digitizedwork.index_items.assert_not_called()
+        mock_indexjob.submit.assert_not_called()
 
         # simulate imported work to index
         mock_digwork = Mock()
         htimporter.imported_works = [mock_digwork]
         htimporter.index()
         mock_digitizedwork.index_items.assert_any_call(htimporter.imported_works)
-        mock_page.page_index_data.assert_called_with(mock_digwork)
-        mock_digitizedwork.index_items.assert_any_call(mock_page.page_index_data())
+        # page indexing is submitted to the job queue
+        mock_indexjob.submit.assert_called_with(
+            mock_indexjob.PAGES, htimporter.imported_works
+        )
 
     def test_get_status_message(self):
         htimporter = HathiImporter(["a.123"])
@@ -1,5 +1,6 @@
 import json
 import os.path
+import threading
 import types
 from datetime import date, timedelta
 from time import sleep
@@ -11,10 +12,13 @@ from django.conf import settings
 from django.contrib.admin.models import ADDITION, CHANGE, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.signals import request_finished, request_started
 from django.db.models.query import QuerySet
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from pairtree import pairtree_client, pairtree_path, storage_exceptions
 from parasolr.django.indexing import ModelIndexable
 
@@ -25,9 +29,12 @@ from ppa.archive.models import (
     Collection,
     SignalHandlers,
     DigitizedWork,
+    IndexJob,
     Page,
     ProtectedWorkFieldFlags,
     ProtectedWorkField,
+    SearchRegistry,
+    SourceNote,
 )
 
 FIXTURES_PATH = os.path.join(settings.BASE_DIR, "ppa", "archive", "fixtures")
@@ -104,8 +111,12 @@ class TestSignalHandlers:
         # modify name to test indexing
         cluster1.cluster_id = "jetsam"
         SignalHandlers.cluster_save(Mock(), cluster1)
-        # should index pages for the affected work
-        mock_index_items.assert_called_with(mockPage.page_index_data(digwork))
+        # should reindex the work
+        args, kwargs = mock_index_items.call_args
+        assert digwork in args[0]
+        # should update cluster id on pages without regenerating page content
+        mockPage.update_cluster_id.assert_called_with(digwork)
+        mockPage.page_index_data.assert_not_called()
 
     @patch.object(ModelIndexable, "index_items")
     @patch("ppa.archive.models.Page")
@@ -118,8 +129,9 @@ class TestSignalHandlers:
         SignalHandlers.cluster_delete(Mock(), cluster1)
         # should clear related works
         assert cluster1.digitizedwork_set.count() == 0
-        # should index pages for the affected work
-        mock_index_items.assert_called_with(mockPage.page_index_data(digwork))
+        # should update cluster id on pages for the affected work
+        mockPage.update_cluster_id.assert_called_with(digwork)
+        mockPage.page_index_data.assert_not_called()
 
     @patch.object(ModelIndexable, "index_items")
     @patch("ppa.archive.models.Page")
@@ -129,16 +141,17 @@ class TestSignalHandlers:
 
         # not a digitized work, should do nothing
         SignalHandlers.handle_digwork_cluster_change(Mock(), cluster1)
-        assert mock_index_items.call_count == 0
+        assert mockPage.update_cluster_id.call_count == 0
 
         # digitized work but cluster id not changed, should do nothing
         SignalHandlers.handle_digwork_cluster_change(Mock(), digwork)
-        assert mock_index_items.call_count == 0
+        assert mockPage.update_cluster_id.call_count == 0
 
         digwork.cluster_id = cluster1.id
         SignalHandlers.handle_digwork_cluster_change(Mock(), digwork)
-        # should index pages for thew ork
-        mock_index_items.assert_called_with(mockPage.page_index_data(digwork))
+        # should update cluster id on pages for the work
+        mockPage.update_cluster_id.assert_called_with(digwork)
+        mockPage.page_index_data.assert_not_called()
 
 
 class TestTrackChangesModel(TestCase):
@@ -531,6 +544,11 @@ class TestDigitizedWork(TestCase):
         assert digwork.notes not in index_data["notes"]
         assert index_data["work_type_s"] == "full-work"
         assert not index_data["enumcron"]
+        assert index_data["content_fingerprint_s"] == ""
+
+        # with content fingerprint
+        digwork.content_fingerprint = "abc123"
+        assert digwork.index_data()["content_fingerprint_s"] == "abc123"
 
         # with enumcron
         digwork.enumcron = "v.7 (1848)"
@@ -641,6 +659,57 @@ class TestDigitizedWork(TestCase):
         assert work.page_count == 123
         mock_eebo_page_count.assert_called_once_with(work.source_id)
 
+    @patch("ppa.archive.models.local_ocr_fingerprint")
+    @patch("ppa.archive.models.eebo_tcp.content_fingerprint")
+    @patch("ppa.archive.hathi.HathiObject.content_fingerprint")
+    def test_get_content_fingerprint(
+        self, mock_hathi_fingerprint, mock_eebo_fingerprint, mock_gale_fingerprint
+    ):
+        work = DigitizedWork(source_id="chi.79279237", source=DigitizedWork.HATHI)
+        assert work.get_content_fingerprint() == mock_hathi_fingerprint.return_value
+        work = DigitizedWork(source_id="CW79279237", source=DigitizedWork.GALE)
+        assert work.get_content_fingerprint() == mock_gale_fingerprint.return_value
+        mock_gale_fingerprint.assert_called_with(work.source_id)
+        work = DigitizedWork(source_id="A1234", source=DigitizedWork.EEBO)
+        assert work.get_content_fingerprint() == mock_eebo_fingerprint.return_value
+        mock_eebo_fingerprint.assert_called_with(work.source_id)
+        # not supported for other sources
+        work = DigitizedWork(source_id="xyz", source=DigitizedWork.OTHER)
+        assert work.get_content_fingerprint() is None
+
+        # None if content is not found
+        mock_eebo_fingerprint.side_effect = FileNotFoundError
+        work = DigitizedWork(source_id="A1234", source=DigitizedWork.EEBO)
+        assert work.get_content_fingerprint() is None
+        mock_hathi_fingerprint.side_effect = storage_exceptions.ObjectNotFoundException
+        work = DigitizedWork(source_id="chi.79279237", source=DigitizedWork.HATHI)
+        assert work.get_content_fingerprint() is None
+        # only applies to digitized works
+        assert not hasattr(Collection(), "get_content_fingerprint")
+        assert not hasattr(Cluster(), "get_content_fingerprint")
+
+    @patch.object(DigitizedWork, "index_items")
+    @patch.object(Page, "page_index_data")
+    def test_index_pages(self, mock_page_index_data, mock_index_items):
+        work = DigitizedWork.objects.create(source_id="test.00000001")
+        with patch.object(work, "get_content_fingerprint", return_value="abc123"):
+            # new fingerprint is saved
+            assert work.index_pages()
+            mock_page_index_data.assert_called_with(work, None)
+            mock_index_items.assert_called_with(mock_page_index_data.return_value)
+            assert work.content_fingerprint == "abc123"
+            work.refresh_from_db()
+            assert work.content_fingerprint == "abc123"
+            # unchanged
+            gale_record = {"doc": {}}
+            assert not work.index_pages(gale_record)
+            mock_page_index_data.assert_called_with(work, gale_record)
+        # content not available; saved fingerprint is kept
+        with patch.object(work, "get_content_fingerprint", return_value=None):
+            assert not work.index_pages()
+            work.refresh_from_db()
+            assert work.content_fingerprint == "abc123"
+
     def test_count_pages_excerpt(self):
         work = DigitizedWork(source_id="CW79279237", pages_digital="1-10")
         assert work.count_pages() == 10
@@ -908,14 +977,16 @@ class TestDigitizedWork(TestCase):
 
         # update existing record - no change on hathi, not forced
         digwork_updated = digwork.updated  # store local record updated time
-        mockhathirecord = mock_hathibib.record.return_value
+        mockhathirecord = mock_hathibib.brief_record.return_value
         # set hathi record last updated before digwork last update
         mockhathirecord.copy_last_updated.return_value = date.today() - timedelta(
             days=1
         )
+        mock_hathibib.record.reset_mock()
         digwork = DigitizedWork.add_from_hathi(test_htid)
-        # bib api should still be called
-        mock_hathibib.record.assert_called_with("htid", test_htid)
+        # brief record should be checked; full record not needed
+        mock_hathibib.brief_record.assert_called_with("htid", test_htid)
+        mock_hathibib.record.assert_not_called()
         # record update time should be unchanged
         assert digwork.updated == digwork_updated
         # still only one log entry
@@ -949,6 +1020,8 @@ class TestDigitizedWork(TestCase):
         digwork = DigitizedWork.add_from_hathi(test_htid)
         # record update time should be changed
         assert digwork.updated != digwork_updated
+        # full record retrieved to update metadata
+        mock_hathibib.record.assert_called_with("htid", test_htid)
         mock_pop_from_bibdata.assert_called_with(mock_hathibib.record.return_value)
         # new log entry should be added
         assert LogEntry.objects.filter(object_id=digwork.id).count() == 3
@@ -1030,6 +1103,113 @@ class TestCollection(TestCase):
         assert stats[coll2.name]["count"] == 1
         assert stats[coll2.name]["dates"] == "1903"
 
+    @patch.object(Collection, "index_version")
+    @patch.object(Collection, "solr_stats")
+    def test_stats_cached(self, mock_solr_stats, mock_index_version):
+        cache.delete(Collection.STATS_CACHE_KEY)
+        mock_solr_stats.return_value = {"Dictionary": {"count": 3, "dates": "1903"}}
+        mock_index_version.return_value = (3, "2024-01-01T00:00:00Z")
+        with override_settings(COLLECTION_STATS_CHECK_INTERVAL=300):
+            assert Collection.stats() == mock_solr_stats.return_value
+            # cached; solr is not queried again
+            assert Collection.stats() == mock_solr_stats.return_value
+            assert mock_solr_stats.call_count == 1
+            assert mock_index_version.call_count == 1
+
+            # expired; checks solr index but index is unchanged
+            Collection.expire_stats()
+            assert Collection.stats() == mock_solr_stats.return_value
+            assert mock_index_version.call_count == 2
+            assert mock_solr_stats.call_count == 1
+
+            # expired and index has changed; stats are recalculated
+            Collection.expire_stats()
+            mock_index_version.return_value = (3, "2024-02-01T00:00:00Z")
+            Collection.stats()
+            assert mock_solr_stats.call_count == 2
+
+            # another process is updating stats; use cached stats
+            Collection.expire_stats()
+            cache.add(Collection.STATS_LOCK_KEY, True)
+            assert Collection.stats() == mock_solr_stats.return_value
+            assert mock_index_version.call_count == 3
+            cache.delete(Collection.STATS_LOCK_KEY)
+
+        # no check interval: check solr index every time
+        with override_settings(COLLECTION_STATS_CHECK_INTERVAL=0):
+            Collection.stats()
+            assert mock_index_version.call_count == 4
+            assert mock_solr_stats.call_count == 2
+        cache.delete(Collection.STATS_CACHE_KEY)
+
+    @patch.object(Collection, "index_version")
+    @patch.object(Collection, "solr_stats")
+    def test_stats_work_removed(self, mock_solr_stats, mock_index_version):
+        cache.delete(Collection.STATS_CACHE_KEY)
+        mock_solr_stats.return_value = {"Dictionary": {"count": 3, "dates": "1903"}}
+        mock_index_version.return_value = (3, "2024-01-01T00:00:00Z")
+        with override_settings(COLLECTION_STATS_CHECK_INTERVAL=300):
+            Collection.stats()
+            assert mock_solr_stats.call_count == 1
+            # removing a work from the index expires cached stats;
+            # last modified is unchanged but number of works is lower
+            work = DigitizedWork(source_id="chi.79279237")
+            with patch.object(DigitizedWork, "solr"):
+                work.remove_from_index()
+            mock_index_version.return_value = (2, "2024-01-01T00:00:00Z")
+            Collection.stats()
+            assert mock_solr_stats.call_count == 2
+        cache.delete(Collection.STATS_CACHE_KEY)
+
+    @patch("ppa.archive.models.SolrQuerySet")
+    def test_index_version(self, mock_solrqueryset):
+        mock_sqs = mock_solrqueryset.return_value
+        mock_sqs.filter.return_value = mock_sqs
+        mock_sqs.order_by.return_value = mock_sqs
+        mock_sqs.only.return_value = mock_sqs
+        mock_sqs.get_response.return_value = Mock(
+            numFound=5, docs=[{"last_modified": "2024-01-01T00:00:00Z"}]
+        )
+        assert Collection.index_version() == (5, "2024-01-01T00:00:00Z")
+        mock_sqs.filter.assert_called_with(item_type="work")
+        mock_sqs.order_by.assert_called_with("-last_modified")
+        mock_sqs.get_response.assert_called_with(rows=1)
+        # no works indexed
+        mock_sqs.get_response.return_value = Mock(numFound=0, docs=[])
+        assert Collection.index_version() == (0, None)
+        # query error
+        mock_sqs.get_response.return_value = None
+        assert Collection.index_version() is None
+
+    def test_stats_deleted_work(self):
+        # stats reflect works removed from the index
+        coll = Collection.objects.create(name="Random Grabbag")
+        digworks = DigitizedWork.objects.all()
+        for digwork in digworks:
+            digwork.collections.add(coll)
+        DigitizedWork.index_items(digworks)
+        sleep(2)
+        cache.delete(Collection.STATS_CACHE_KEY)
+        assert Collection.stats()[coll.name]["count"] == digworks.count()
+
+        digworks.first().remove_from_index()
+        sleep(2)
+        assert Collection.stats()[coll.name]["count"] == digworks.count() - 1
+        cache.delete(Collection.STATS_CACHE_KEY)
+
+    @patch.object(Collection, "refresh_stats")
+    @patch.object(Collection, "solr_stats")
+    def test_stats_locked(self, mock_solr_stats, mock_refresh_stats):
+        # nothing cached and another process is calculating stats;
+        # query solr directly without waiting
+        cache.delete(Collection.STATS_CACHE_KEY)
+        cache.add(Collection.STATS_LOCK_KEY, True)
+        with patch("ppa.archive.models.time.sleep") as mock_sleep:
+            assert Collection.stats() == mock_solr_stats.return_value
+            mock_sleep.assert_not_called()
+        mock_refresh_stats.assert_not_called()
+        cache.delete(Collection.STATS_LOCK_KEY)
+
 
 class TestPage(TestCase):
     fixtures = ["sample_digitized_works"]
@@ -1053,6 +1233,40 @@ class TestPage(TestCase):
             expected = sum(page_counts) if page_counts else 0
             assert Page.total_to_index(source=source) == expected
 
+    @patch.object(Page, "index_items")
+    @patch("ppa.archive.models.SolrQuerySet")
+    def test_update_cluster_id(self, mock_solrqs, mock_index_items):
+        digwork = DigitizedWork(source_id="chi.13880510")
+        mock_pages = mock_solrqs.return_value.filter.return_value.only.return_value
+        # no pages indexed
+        mock_pages.count.return_value = 0
+        assert Page.update_cluster_id(digwork) == 0
+        mock_solrqs.return_value.filter.assert_called_with(
+            item_type="page", group_id_s='"chi.13880510"'
+        )
+        mock_solrqs.return_value.filter.return_value.only.assert_called_with("id")
+        mock_index_items.assert_not_called()
+
+        # pages indexed; should set cluster id with atomic updates
+        mock_pages.count.return_value = 2
+        mock_pages.__getitem__.return_value = [
+            {"id": "chi.13880510.1"},
+            {"id": "chi.13880510.2"},
+        ]
+        mock_index_items.side_effect = lambda items: len(list(items))
+        assert Page.update_cluster_id(digwork) == 2
+        mock_pages.__getitem__.assert_called_with(slice(None, 2))
+
+        # check updates sent to solr
+        updates = []
+        mock_index_items.side_effect = lambda items: updates.extend(items)
+        digwork.cluster = Cluster(cluster_id="flotsam")
+        Page.update_cluster_id(digwork)
+        assert updates == [
+            {"id": "chi.13880510.1", "cluster_id_s": {"set": "flotsam"}},
+            {"id": "chi.13880510.2", "cluster_id_s": {"set": "flotsam"}},
+        ]
+
     @patch("ppa.archive.models.DigitizedWork.items_to_index")
     @patch.object(Page, "page_index_data")
     def test_items_to_index(self, mock_page_idx_data, mock_items_idx):
@@ -1127,6 +1341,8 @@ class TestPage(TestCase):
 
             page_data = list(Page.page_index_data(excerpt))
             assert len(page_data) == 2
+            # page span is passed so only pages in range are read
+            mock_hathiobj.page_data.assert_called_with(page_span=excerpt.page_span)
             # should use index id instead of source id as basis for solr id
             # first page data (0) is index 1 in mets because excerpt starts at page 2
             assert (
@@ -1224,6 +1440,158 @@ class TestPage(TestCase):
         )
         page_data = list(Page.page_index_data(gale_excerpt))
         assert len(page_data) == 2
+        # page span is passed so text is only loaded for pages in range
+        mock_gale_get_item_pages.assert_called_with(
+            "CW123456", gale_record=None, page_span=gale_excerpt.page_span
+        )
+
+
+class TestIndexJob(TestCase):
+    fixtures = ["sample_digitized_works"]
+
+    def setUp(self):
+        self.digworks = list(DigitizedWork.objects.all()[:3])
+
+    def test_str(self):
+        job = IndexJob(digwork=self.digworks[0], action=IndexJob.PAGES)
+        assert str(job) == f"Index pages {self.digworks[0]} (queued)"
+
+    @patch.object(IndexJob, "perform")
+    def test_submit(self, mock_perform):
+        # job queue not enabled; index immediately
+        with override_settings(INDEX_JOB_QUEUE=False):
+            IndexJob.submit(IndexJob.PAGES, self.digworks)
+            mock_perform.assert_called_with(IndexJob.PAGES, self.digworks)
+            assert not IndexJob.objects.exists()
+
+        # job queue enabled; should queue jobs
+        mock_perform.reset_mock()
+        with override_settings(INDEX_JOB_QUEUE=True):
+            assert IndexJob.submit(IndexJob.PAGES, self.digworks) == 3
+            mock_perform.assert_not_called()
+            assert IndexJob.objects.filter(status=IndexJob.QUEUED).count() == 3
+
+    def test_enqueue(self):
+        assert IndexJob.enqueue(IndexJob.WORK, self.digworks[:2]) == 2
+        # duplicate queued jobs are coalesced
+        assert IndexJob.enqueue(IndexJob.WORK, self.digworks) == 1
+        assert IndexJob.objects.filter(action=IndexJob.WORK).count() == 3
+        # different action is queued separately
+        assert IndexJob.enqueue(IndexJob.PAGES, self.digworks[:1]) == 1
+        # page cluster update is not needed when pages are queued
+        assert IndexJob.enqueue(IndexJob.PAGE_CLUSTER, self.digworks[:2]) == 1
+        assert (
+            IndexJob.objects.get(action=IndexJob.PAGE_CLUSTER).digwork
+            == self.digworks[1]
+        )
+        # jobs that are not queued are not coalesced
+        IndexJob.objects.filter(action=IndexJob.WORK).update(status=IndexJob.RUNNING)
+        assert IndexJob.enqueue(IndexJob.WORK, self.digworks[:1]) == 1
+
+    @patch.object(DigitizedWork, "index_items")
+    @patch("ppa.archive.models.Page")
+    def test_perform(self, mock_page, mock_index_items):
+        with patch.object(Collection, "expire_stats") as mock_expire_stats:
+            IndexJob.perform(IndexJob.WORK, self.digworks)
+            mock_index_items.assert_called_once_with(self.digworks)
+            mock_expire_stats.assert_called_once_with()
+
+        mock_index_items.reset_mock()
+        with patch.object(
+            DigitizedWork, "get_content_fingerprint", return_value=None
+        ):
+            IndexJob.perform(IndexJob.PAGES, self.digworks[:2])
+        mock_page.page_index_data.assert_any_call(self.digworks[0], None)
+        mock_page.page_index_data.assert_any_call(self.digworks[1], None)
+        assert mock_index_items.call_count == 2
+
+        # work records are reindexed when content fingerprints change
+        mock_index_items.reset_mock()
+        with patch.object(
+            DigitizedWork, "get_content_fingerprint", return_value="abc123"
+        ):
+            IndexJob.perform(IndexJob.PAGES, self.digworks[:2])
+        assert mock_index_items.call_count == 3
+        mock_index_items.assert_called_with(self.digworks[:2])
+        assert DigitizedWork.objects.get(pk=self.digworks[0].pk).content_fingerprint == (
+            "abc123"
+        )
+
+        IndexJob.perform(IndexJob.PAGE_CLUSTER, self.digworks[:1])
+        mock_page.update_cluster_id.assert_called_once_with(self.digworks[0])
+
+    def test_claim(self):
+        # nothing queued
+        assert IndexJob.claim() == []
+
+        IndexJob.enqueue(IndexJob.PAGES, self.digworks[:1])
+        IndexJob.enqueue(IndexJob.WORK, self.digworks)
+        # claims oldest job only, since others are a different action
+        jobs = IndexJob.claim()
+        assert len(jobs) == 1
+        assert jobs[0].action == IndexJob.PAGES
+        assert jobs[0].status == IndexJob.RUNNING
+        assert jobs[0].started
+        assert IndexJob.objects.get(pk=jobs[0].pk).status == IndexJob.RUNNING
+
+        # claims jobs for the same action up to the limit
+        jobs = IndexJob.claim(limit=2)
+        assert len(jobs) == 2
+        assert all(job.action == IndexJob.WORK for job in jobs)
+        assert len(IndexJob.claim()) == 1
+        assert IndexJob.claim() == []
+
+    def test_requeue_stale(self):
+        IndexJob.enqueue(IndexJob.PAGES, self.digworks)
+        jobs = IndexJob.claim()
+        # nothing stale yet
+        assert IndexJob.requeue_stale(timedelta(hours=1)) == (0, 0)
+        # jobs were started by a worker that was stopped
+        IndexJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            started=timezone.now() - timedelta(hours=2)
+        )
+        # a new job was queued for one work in the meantime
+        IndexJob.enqueue(IndexJob.PAGES, self.digworks[:1])
+        assert IndexJob.requeue_stale(timedelta(hours=1)) == (2, 1)
+        assert not IndexJob.objects.filter(status=IndexJob.RUNNING).exists()
+        queued = IndexJob.objects.filter(status=IndexJob.QUEUED)
+        assert set(queued.values_list("digwork_id", flat=True)) == {
+            digwork.pk for digwork in self.digworks
+        }
+        assert all(job.started is None for job in queued)
+        failed = IndexJob.objects.get(status=IndexJob.FAILED)
+        assert failed.digwork == self.digworks[0]
+        assert "already queued" in failed.error
+
+    @patch.object(IndexJob, "perform")
+    def test_process(self, mock_perform):
+        IndexJob.enqueue(IndexJob.WORK, self.digworks)
+        jobs = IndexJob.claim()
+        IndexJob.process(jobs)
+        # work jobs are run together
+        mock_perform.assert_called_once()
+        action, digworks = mock_perform.call_args.args
+        assert action == IndexJob.WORK
+        assert set(digworks) == set(self.digworks)
+        for job in IndexJob.objects.all():
+            assert job.status == IndexJob.DONE
+            assert job.finished
+
+        # page jobs are run individually; errors fail only one job
+        mock_perform.reset_mock()
+        IndexJob.enqueue(IndexJob.PAGES, self.digworks[:2])
+        mock_perform.side_effect = [Exception("page data not found"), None]
+        IndexJob.process(IndexJob.claim())
+        assert mock_perform.call_count == 2
+        page_jobs = IndexJob.objects.filter(action=IndexJob.PAGES)
+        assert page_jobs.filter(status=IndexJob.DONE).count() == 1
+        failed = page_jobs.get(status=IndexJob.FAILED)
+        assert "page data not found" in failed.error
+
+        # no jobs, nothing happens
+        mock_perform.reset_mock()
+        IndexJob.process([])
+        mock_perform.assert_not_called()
 
 
 def test_cluster_str():
@@ -1235,3 +1603,120 @@ def test_cluster_str():
 def test_cluster_repr(mock_str):
     mock_str.return_value = "group-one"
     assert repr(Cluster(cluster_id="group-one")) == "<cluster group-one>"
+
+
+class TestSearchRegistry(TestCase):
+    def setUp(self):
+        SearchRegistry.invalidate()
+
+    def tearDown(self):
+        SearchRegistry.request_finished()
+
+    def test_current_version(self):
+        cache.delete(SearchRegistry.VERSION_CACHE_KEY)
+        # new version is set if there is none
+        version = SearchRegistry.current_version()
+        assert version is not None
+        assert cache.get(SearchRegistry.VERSION_CACHE_KEY) == version
+        # unchanged until collections or source notes change
+        with self.assertNumQueries(0):
+            assert SearchRegistry.current_version() == version
+        coll = Collection.objects.create(name="Dictionary")
+        assert SearchRegistry.current_version() != version
+        version = SearchRegistry.current_version()
+        coll.name = "Dictionaries"
+        coll.save()
+        assert SearchRegistry.current_version() != version
+        version = SearchRegistry.current_version()
+        note = SourceNote.objects.create(source=DigitizedWork.HATHI, note="About Hathi")
+        assert SearchRegistry.current_version() != version
+        version = SearchRegistry.current_version()
+        note.delete()
+        assert SearchRegistry.current_version() != version
+
+    def test_load(self):
+        coll_b = Collection.objects.create(name="B Collection")
+        coll_a = Collection.objects.create(name="A Collection")
+        note = SourceNote.objects.create(source=DigitizedWork.HATHI, note="About Hathi")
+        assert SearchRegistry.collections() == [coll_a, coll_b]
+        assert SearchRegistry.source_notes() == {
+            note.get_source_display(): "About Hathi"
+        }
+        # loaded values are used without querying the database
+        with self.assertNumQueries(0):
+            SearchRegistry.collections()
+        # within a request, version is checked once
+        SearchRegistry.request_started()
+        with patch.object(
+            SearchRegistry, "current_version", wraps=SearchRegistry.current_version
+        ) as mock_version:
+            with self.assertNumQueries(0):
+                SearchRegistry.collections()
+                SearchRegistry.source_notes()
+                SearchRegistry.collections()
+            assert mock_version.call_count == 1
+            # checked again on the next request
+            SearchRegistry.request_finished()
+            SearchRegistry.request_started()
+            with self.assertNumQueries(0):
+                SearchRegistry.source_notes()
+            assert mock_version.call_count == 2
+        # changes made in another process are picked up on next check
+        cache.set(SearchRegistry.VERSION_CACHE_KEY, "other-process")
+        SearchRegistry.request_finished()
+        with self.assertNumQueries(2):
+            SearchRegistry.collections()
+
+    def test_request_signals(self):
+        # registry is connected to django request signals
+        request_started.send(sender=self.__class__)
+        assert SearchRegistry._local.in_request
+        SearchRegistry.collections()
+        assert SearchRegistry._local.checked
+        request_finished.send(sender=self.__class__)
+        assert not SearchRegistry._local.in_request
+        assert not SearchRegistry._local.checked
+
+    def test_signals(self):
+        assert SearchRegistry.collections() == []
+        # saving or deleting a collection or source note reloads the registry,
+        # even within a request
+        SearchRegistry.request_started()
+        coll = Collection.objects.create(name="Dictionary")
+        assert SearchRegistry.collections() == [coll]
+        coll.name = "Dictionaries"
+        coll.save()
+        assert SearchRegistry.collections()[0].name == "Dictionaries"
+        note = SourceNote.objects.create(source=DigitizedWork.HATHI, note="Hathi")
+        assert SearchRegistry.source_notes() == {note.get_source_display(): "Hathi"}
+        note.delete()
+        assert SearchRegistry.source_notes() == {}
+        coll.delete()
+        assert SearchRegistry.collections() == []
+
+    def test_multiple_processes(self):
+        # registries in separate processes sharing the django cache
+        class OtherProcessRegistry(SearchRegistry):
+            _version = None
+            _collections = []
+            _source_notes = {}
+            _local = threading.local()
+
+        assert SearchRegistry.collections() == []
+        assert OtherProcessRegistry.collections() == []
+
+        # collection added in the first process (e.g., in the admin);
+        # save signals only reset the registry in the saving process,
+        # but the other process picks up the new version on next use
+        coll = Collection.objects.create(name="Dictionary")
+        assert OtherProcessRegistry._version is not None
+        OtherProcessRegistry.request_started()
+        with self.assertNumQueries(2):
+            assert OtherProcessRegistry.collections() == [coll]
+        OtherProcessRegistry.request_finished()
+
+        # renamed; picked up in both processes
+        coll.name = "Dictionaries"
+        coll.save()
+        assert OtherProcessRegistry.collections()[0].name == "Dictionaries"
+        assert SearchRegistry.collections()[0].name == "Dictionaries"
@@ -1,12 +1,14 @@
 import uuid
+from datetime import datetime
 from time import sleep
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 import requests
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
-from django.test import RequestFactory, TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.utils.http import urlencode
 from parasolr.django import SolrClient, SolrQuerySet
@@ -25,7 +27,15 @@ from ppa.archive.templatetags.ppa_tags import (
     hathi_page_url,
     page_image_url,
 )
-from ppa.archive.views import DigitizedWorkListView, GracefulPaginator, ImportView
+from ppa.archive.views import (
+    CachedSearchResults,
+    DigitizedWorkDetailView,
+    DigitizedWorkListView,
+    GracefulPaginator,
+    ImportView,
+    _prefetch_pending,
+    prefetch_page_results,
+)
 
 
 class TestDigitizedWorkDetailView(TestCase):
@@ -337,7 +347,7 @@ class TestDigitizedWorkDetailView(TestCase):
         # assert solr result in query
         assert "current_results" in response.context
         # object list should be empty
-        assert not response.context["current_results"].object_list.count()
+        assert not response.context["current_results"].object_list
 
     def test_search_within_snippets(self):
         # test with a word that will produce some snippets
@@ -484,6 +494,205 @@ class TestDigitizedWorkDetailView(TestCase):
         assert response["Location"] == excerpt.get_absolute_url()
 
 
+@pytest.mark.usefixtures("mock_solr_queryset")
+class TestDigitizedWorkDetailViewSearchWithin(TestCase):
+    fixtures = ["sample_digitized_works"]
+
+    def setUp(self):
+        self.digwork = DigitizedWork.objects.get(source_id="chi.78013704")
+        self.view = DigitizedWorkDetailView()
+        self.view.request = RequestFactory().get(self.digwork.get_absolute_url())
+        self.view._last_modified = datetime(2024, 1, 1)
+
+    def test_get_cache_key(self):
+        with override_settings(SEARCH_CACHE_TIMEOUT=None):
+            assert self.view.get_cache_key(self.digwork, "knobs") is None
+        with override_settings(SEARCH_CACHE_TIMEOUT=300):
+            cache_key = self.view.get_cache_key(self.digwork, "knobs")
+            assert cache_key.startswith("search-within-")
+            assert self.view.get_cache_key(self.digwork, "dials") != cache_key
+            assert self.view.get_cache_key(self.digwork, "knobs", ["p1"]) != cache_key
+            # changes when the work is reindexed
+            self.view._last_modified = datetime(2024, 2, 1)
+            assert self.view.get_cache_key(self.digwork, "knobs") != cache_key
+            # no key if last modified is unavailable
+            self.view._last_modified = None
+            assert self.view.get_cache_key(self.digwork, "knobs") is None
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=300)
+    def test_get_matching_page_ids(self):
+        cache_key = self.view.get_cache_key(self.digwork, "knobs")
+        cache.delete(cache_key)
+        with patch(
+            "ppa.archive.views.PageSearchQuerySet", new=self.mock_solr_queryset()
+        ) as mock_queryset_cls:
+            mock_qs = mock_queryset_cls.return_value
+            mock_qs.get_results.return_value = [{"id": "p1"}, {"id": "p3"}]
+            # total from the response
+            mock_qs.count.return_value = 2
+            page_ids = self.view.get_matching_page_ids(self.digwork, "knobs")
+            assert page_ids == ["p1", "p3"]
+            mock_qs.search.assert_called_with(content="(knobs)")
+            mock_qs.filter.assert_called_with(
+                group_id='"%s"' % self.digwork.index_id(), item_type="page"
+            )
+            mock_qs.order_by.assert_called_with("order")
+            mock_qs.only.assert_called_with("id")
+            # all matches retrieved in one request
+            mock_qs.get_results.assert_called_once_with(rows=self.digwork.page_count)
+
+            # cached; should not query solr again
+            mock_queryset_cls.reset_mock()
+            assert self.view.get_matching_page_ids(self.digwork, "knobs") == page_ids
+            mock_qs.get_results.assert_not_called()
+        cache.delete(cache_key)
+
+    def test_get_matching_page_ids_page_count(self):
+        # more matches in Solr than the database page count
+        self.digwork.page_count = 2
+        with patch(
+            "ppa.archive.views.PageSearchQuerySet", new=self.mock_solr_queryset()
+        ) as mock_queryset_cls:
+            mock_qs = mock_queryset_cls.return_value
+            mock_qs.get_results.side_effect = [
+                [{"id": "p1"}, {"id": "p3"}],
+                [{"id": "p4"}],
+            ]
+            mock_qs.count.return_value = 3
+            page_ids = self.view.get_matching_page_ids(self.digwork, "knobs")
+            # remaining matches are not dropped
+            assert page_ids == ["p1", "p3", "p4"]
+            mock_qs.get_results.assert_any_call(rows=2)
+            mock_qs.get_results.assert_called_with(start=2, rows=1)
+
+            # no page count: count query for rows
+            self.digwork.page_count = None
+            mock_qs.get_results.reset_mock()
+            mock_qs.get_results.side_effect = None
+            mock_qs.get_results.return_value = [{"id": "p1"}]
+            mock_qs.count.return_value = 1
+            assert self.view.get_matching_page_ids(self.digwork, "knobs") == ["p1"]
+            mock_qs.get_results.assert_called_once_with(rows=1)
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=300)
+    def test_get_page_results(self):
+        # no page ids, no query
+        with patch("ppa.archive.views.PageSearchQuerySet") as mock_queryset_cls:
+            assert self.view.get_page_results(self.digwork, "knobs", []) == ([], {})
+            mock_queryset_cls.assert_not_called()
+
+        cache_key = self.view.get_cache_key(self.digwork, "knobs", ["p1", "p3"])
+        cache.delete(cache_key)
+        with patch(
+            "ppa.archive.views.PageSearchQuerySet", new=self.mock_solr_queryset()
+        ) as mock_queryset_cls:
+            mock_qs = mock_queryset_cls.return_value
+            mock_qs.get_results.return_value = [{"id": "p1"}, {"id": "p3"}]
+            mock_qs.get_highlighting.return_value = {"p1": {"content": ["knobs"]}}
+            results = self.view.get_page_results(self.digwork, "knobs", ["p1", "p3"])
+            assert results == (
+                mock_qs.get_results.return_value,
+                mock_qs.get_highlighting.return_value,
+            )
+            mock_qs.filter.assert_called_with(id__in=['"p1"', '"p3"'])
+            mock_qs.highlight.assert_called_with(
+                "content", snippets=3, method="unified"
+            )
+            mock_qs.get_results.assert_called_with(rows=2)
+
+            # cached; should not query solr again
+            mock_queryset_cls.reset_mock()
+            assert (
+                self.view.get_page_results(self.digwork, "knobs", ["p1", "p3"])
+                == results
+            )
+            mock_qs.get_results.assert_not_called()
+        cache.delete(cache_key)
+
+    def test_get_context_data(self):
+        page_ids = ["p%d" % i for i in range(60)]
+        self.view.object = self.digwork
+        self.view.kwargs = {}
+        self.view.request = RequestFactory().get(
+            self.digwork.get_absolute_url(), {"query": "knobs"}
+        )
+        results = ([{"id": "p0"}], {"p0": {"content": ["knobs"]}})
+        with patch.object(
+            self.view, "get_matching_page_ids", return_value=page_ids
+        ), patch.object(
+            self.view, "get_page_results", return_value=results
+        ) as mock_get_page_results, patch.object(
+            self.view, "prefetch_next_page"
+        ) as mock_prefetch:
+            with override_settings(SEARCH_CACHE_TIMEOUT=None):
+                context = self.view.get_context_data()
+                # results retrieved for current page of ids only
+                mock_get_page_results.assert_called_with(
+                    self.digwork, "knobs", page_ids[:50]
+                )
+                assert context["current_results"].paginator.count == 60
+                assert context["current_results"].object_list == results[0]
+                assert context["page_highlights"] == results[1]
+                # next page not prefetched when results are not cached
+                mock_prefetch.assert_not_called()
+
+            with override_settings(SEARCH_CACHE_TIMEOUT=300):
+                self.view.get_context_data()
+                # prefetching is not enabled by default
+                mock_prefetch.assert_not_called()
+
+            with override_settings(
+                SEARCH_CACHE_TIMEOUT=300, SEARCH_WITHIN_PREFETCH=True
+            ):
+                self.view.get_context_data()
+                # next page of results is retrieved in the background
+                mock_prefetch.assert_called_with(self.digwork, "knobs", page_ids[50:])
+
+    @override_settings(SEARCH_CACHE_TIMEOUT=300)
+    @patch("ppa.archive.views.get_prefetch_executor")
+    def test_prefetch_next_page(self, mock_get_executor):
+        mock_executor = mock_get_executor.return_value
+        cache_key = self.view.get_cache_key(self.digwork, "knobs", ["p1"])
+        cache.delete(cache_key)
+        self.view.prefetch_next_page(self.digwork, "knobs", ["p1"])
+        # only plain values are passed to the worker
+        mock_executor.submit.assert_called_once_with(
+            prefetch_page_results, "knobs", ["p1"], cache_key, 300
+        )
+        # already queued; not submitted again
+        self.view.prefetch_next_page(self.digwork, "knobs", ["p1"])
+        assert mock_executor.submit.call_count == 1
+
+        # completed prefetch is no longer pending; skipped when cached
+        with patch.object(DigitizedWorkDetailView, "search_page_results"):
+            prefetch_page_results("knobs", ["p1"], cache_key, 300)
+        assert cache_key not in _prefetch_pending
+        cache.set(cache_key, ([], {}))
+        self.view.prefetch_next_page(self.digwork, "knobs", ["p1"])
+        assert mock_executor.submit.call_count == 1
+        cache.delete(cache_key)
+
+        # not queued when results are not cached
+        with override_settings(SEARCH_CACHE_TIMEOUT=None):
+            self.view.prefetch_next_page(self.digwork, "knobs", ["p1"])
+        assert mock_executor.submit.call_count == 1
+
+    def test_prefetch_page_results(self):
+        results = ([{"id": "p1"}], {"p1": {"content": ["knobs"]}})
+        with patch.object(
+            DigitizedWorkDetailView, "search_page_results", return_value=results
+        ) as mock_search_page_results:
+            prefetch_page_results("knobs", ["p1"], "prefetch-test", 300)
+            mock_search_page_results.assert_called_with("knobs", ["p1"])
+            # results are cached with the key and timeout passed in
+            assert cache.get("prefetch-test") == results
+            cache.delete("prefetch-test")
+            # connection errors are logged, not raised
+            mock_search_page_results.side_effect = requests.exceptions.ConnectionError
+            prefetch_page_results("knobs", ["p1"], "prefetch-test", 300)
+            assert cache.get("prefetch-test") is None
+
+
 class TestDigitizedWorkListRequest(TestCase):
     fixtures = ["sample_digitized_works"]
 
@@ -1205,10 +1414,9 @@ class TestDigitizedWorkListView(TestCase):
 
             # search term but no works found
             digworkview.query = "iambic"
-            solrq.count.return_value = 0
+            solrq.__iter__.return_value = []
             assert digworkview.get_pages(solrq) == ({}, {})
 
-            solrq.count.return_value = 10
             solrq.__iter__.return_value = [
                 {"id": "work1"},
                 {"id": "work2"},
@@ -1246,6 +1454,45 @@ class TestDigitizedWorkListView(TestCase):
             digworkview.paginate_queryset(qs, digworkview.paginate_by)
             mock_paginator.return_value.page.assert_called_once_with(1)
 
+    def test_get_page_results(self):
+        digworkview = DigitizedWorkListView()
+        digworkview.request = self.factory.get(reverse("archive:list"), {"page": 3})
+        digworkview.kwargs = {}
+        solrq = MagicMock(spec=ArchiveSearchQuerySet)
+        page_solrq = solrq.__getitem__.return_value
+        page_solrq.get_results.return_value = [{"id": "work1"}]
+        page_solrq.count.return_value = 101
+
+        results = digworkview.get_page_results(solrq, 50)
+        # requested page is retrieved in a single query
+        solrq.__getitem__.assert_called_once_with(slice(100, 150))
+        page_solrq.get_results.assert_called_once_with()
+        assert isinstance(results, CachedSearchResults)
+        assert results.count() == 101
+        assert results[100:150] == page_solrq
+
+        # page out of range: retrieve first page instead
+        solrq.reset_mock()
+        page_solrq.get_results.return_value = []
+        digworkview.request = self.factory.get(reverse("archive:list"), {"page": 30})
+        digworkview.get_page_results(solrq, 50)
+        solrq.__getitem__.assert_any_call(slice(1450, 1500))
+        solrq.__getitem__.assert_called_with(slice(None, 50))
+
+        # non-numeric page: queryset returned unchanged for paginator to handle
+        solrq.reset_mock()
+        digworkview.request = self.factory.get(
+            reverse("archive:list"), {"page": "last"}
+        )
+        assert digworkview.get_page_results(solrq, 50) == solrq
+        solrq.__getitem__.assert_not_called()
+
+        # paginate_queryset uses page results for solr querysets
+        with patch.object(digworkview, "get_page_results") as mock_get_page_results:
+            mock_get_page_results.return_value = CachedSearchResults(0, [])
+            digworkview.paginate_queryset(solrq, 50)
+            mock_get_page_results.assert_called_once_with(solrq, 50)
+
     @pytest.mark.usefixtures("mock_solr_queryset")
     def test_get_queryset(self):
         digworkview = DigitizedWorkListView()
@@ -1319,6 +1566,115 @@ class TestDigitizedWorkListView(TestCase):
                     assert hathi_key in context["source_notes"]
                     assert context["source_notes"][hathi_key] == sn.note
 
+    def test_get_cache_key(self):
+        digworkview = DigitizedWorkListView()
+        digworkview.kwargs = {}
+        digworkview.request = self.factory.get(reverse("archive:list"))
+        digworkview.form = Mock(
+            cleaned_data={"query": "iambic", "collections": ["B", "A"]}
+        )
+        digworkview.form.pub_date_minmax.return_value = (1559, 1922)
+
+        # not configured: no cache key
+        with override_settings(SEARCH_CACHE_TIMEOUT=None):
+            assert digworkview.get_cache_key() is None
+
+        with override_settings(SEARCH_CACHE_TIMEOUT=300):
+            with patch.object(digworkview, "last_modified") as mock_last_modified:
+                # no last modified available: no cache key
+                mock_last_modified.return_value = None
+                assert digworkview.get_cache_key() is None
+
+                mock_last_modified.return_value = datetime(2024, 1, 1)
+                cache_key = digworkview.get_cache_key()
+                assert cache_key.startswith("archive-search-")
+                # order of multiple values doesn't matter
+                digworkview.form.cleaned_data["collections"] = ["A", "B"]
+                assert digworkview.get_cache_key() == cache_key
+                # different page
+                digworkview.request = self.factory.get(
+                    reverse("archive:list"), {"page": 2}
+                )
+                assert digworkview.get_cache_key() != cache_key
+                digworkview.request = self.factory.get(reverse("archive:list"))
+                # different search
+                digworkview.form.cleaned_data["query"] = "dactyl"
+                assert digworkview.get_cache_key() != cache_key
+                digworkview.form.cleaned_data["query"] = "iambic"
+                # solr index updated
+                mock_last_modified.return_value = datetime(2024, 2, 1)
+                assert digworkview.get_cache_key() != cache_key
+
+    @pytest.mark.usefixtures("mock_solr_queryset")
+    @override_settings(SEARCH_CACHE_TIMEOUT=300)
+    def test_get_context_data_cached(self):
+        cache.delete("test-search-key")
+        docs = [{"id": "work1"}, {"id": "work2"}]
+        page_groups = {"work1": {"docs": [{"id": "work1.1"}]}}
+        page_highlights = {"work1.1": {"content": ["snippet"]}}
+        mock_qs = self.mock_solr_queryset()()
+        # paginator uses len for mock querysets
+        mock_qs.__len__.return_value = 2
+        mock_qs.__getitem__.return_value = mock_qs
+        mock_qs.__iter__.return_value = docs
+        mock_facets = Mock()
+        mock_facets.facet_fields = {"collections_exact": {"Dictionary": 2}}
+        mock_facets.facet_ranges = {"pub_date": {"end": 1923}}
+        mock_qs.get_facets.return_value = mock_facets
+
+        digworkview = DigitizedWorkListView()
+        digworkview.request = self.factory.get(reverse("archive:list"))
+        digworkview.kwargs = {}
+        digworkview.object_list = mock_qs
+        digworkview.form = Mock(is_valid=Mock(return_value=True))
+        with patch.object(digworkview, "get_cache_key", return_value="test-search-key"):
+            with patch.object(
+                digworkview, "get_pages", return_value=(page_groups, page_highlights)
+            ) as mock_get_pages:
+                context = digworkview.get_context_data()
+                mock_get_pages.assert_called_once()
+        assert context["facet_ranges"] == {"pub_date": {"end": 1922}}
+        # results should be cached
+        cached = cache.get("test-search-key")
+        assert cached["count"] == 2
+        assert cached["docs"] == docs
+        assert cached["page_groups"] == page_groups
+        assert cached["page_highlights"] == page_highlights
+        assert cached["facet_fields"] == mock_facets.facet_fields
+        assert cached["facet_ranges"] == {"pub_date": {"end": 1922}}
+
+        # new request: cached results used without querying solr
+        digworkview = DigitizedWorkListView()
+        digworkview.request = self.factory.get(reverse("archive:list"))
+        digworkview.kwargs = {}
+        mock_solrq = Mock()
+        digworkview.object_list = mock_solrq
+        digworkview.form = Mock(is_valid=Mock(return_value=True))
+        with patch.object(digworkview, "get_cache_key", return_value="test-search-key"):
+            with patch.object(digworkview, "get_pages") as mock_get_pages:
+                context = digworkview.get_context_data()
+                mock_get_pages.assert_not_called()
+        assert context["paginator"].count == 2
+        assert list(context["object_list"]) == docs
+        assert context["page_groups"] == page_groups
+        assert context["page_highlights"] == page_highlights
+        assert context["facet_ranges"] == {"pub_date": {"end": 1922}}
+        digworkview.form.set_choices_from_facets.assert_called_with(
+            mock_facets.facet_fields
+        )
+        mock_solrq.count.assert_not_called()
+        cache.delete("test-search-key")
+
+
+def test_cached_search_results():
+    docs = [{"id": "work1"}, {"id": "work2"}]
+    results = CachedSearchResults(120, docs)
+    assert results.count() == 120
+    assert results[50:100] == docs
+    paginator = GracefulPaginator(results, 50)
+    assert paginator.num_pages == 3
+    assert list(paginator.page(2)) == docs
+
 
 class TestImportView(TestCase):
     superuser = {"username": "super", "password": str(uuid.uuid4())}
@@ -1,8 +1,14 @@
+import hashlib
+import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.core.cache import cache
 from django.core.exceptions import MultipleObjectsReturned, ValidationError
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.http import (
@@ -15,7 +21,7 @@ from django.utils.http import urlencode
 from django.views.generic import DetailView, ListView
 from django.views.generic.base import RedirectView, TemplateView
 from django.views.generic.edit import FormView
-from parasolr.django.views import SolrLastModifiedMixin
+from parasolr.django import SolrQuerySet
 
 from ppa.archive.forms import (
     AddToCollectionForm,
@@ -24,12 +30,51 @@ from ppa.archive.forms import (
     SearchWithinWorkForm,
 )
 from ppa.archive.import_util import GaleImporter, HathiImporter
-from ppa.archive.models import NO_COLLECTION_LABEL, DigitizedWork, SourceNote
+from ppa.archive.models import (
+    NO_COLLECTION_LABEL,
+    DigitizedWork,
+    IndexJob,
+    SearchRegistry,
+)
 from ppa.archive.solr import ArchiveSearchQuerySet, PageSearchQuerySet
-from ppa.common.views import AjaxTemplateMixin
+from ppa.common.views import AjaxTemplateMixin, CachedSolrLastModifiedMixin
 
 logger = logging.getLogger(__name__)
 
+#: shared worker for retrieving the next page of search within results
+#: in the background, so prefetching never runs more than one Solr query
+#: at a time per process; only started when prefetching is enabled
+_prefetch_executor = None
+#: cache keys for page results currently queued for prefetching
+_prefetch_pending = set()
+#: lock for the prefetch worker and set of pending cache keys
+_prefetch_lock = threading.Lock()
+
+
+def get_prefetch_executor():
+    """Get the shared prefetch worker, starting it on first use."""
+    global _prefetch_executor
+    with _prefetch_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="search-within-prefetch"
+            )
+        return _prefetch_executor
+
+
+def prefetch_page_results(query, page_ids, cache_key, timeout):
+    """Retrieve and cache search within page results, for use in the
+    prefetch worker. Only takes plain values, so no view or request
+    state is shared with the background thread."""
+    try:
+        results = DigitizedWorkDetailView.search_page_results(query, page_ids)
+        cache.set(cache_key, results, timeout)
+    except requests.exceptions.ConnectionError as err:
+        logger.warning("Error prefetching search within results: %s", err)
+    finally:
+        with _prefetch_lock:
+            _prefetch_pending.discard(cache_key)
+
 
 class GracefulPaginator(Paginator):
     """Paginator override to gracefully handle out-of-range errors.
@@ -45,7 +90,24 @@ class GracefulPaginator(Paginator):
         return super().page(number)
 
 
-class DigitizedWorkListView(AjaxTemplateMixin, SolrLastModifiedMixin, ListView):
+class CachedSearchResults:
+    """Stand-in for a paginated Solr queryset with one page of results
+    already retrieved (from Solr or from the search results cache),
+    so that the paginator can be used without querying Solr again.
+    Slicing returns the retrieved documents for the requested page."""
+
+    def __init__(self, count, docs):
+        self._count = count
+        self.docs = docs
+
+    def count(self):
+        return self._count
+
+    def __getitem__(self, k):
+        return self.docs
+
+
+class DigitizedWorkListView(AjaxTemplateMixin, CachedSolrLastModifiedMixin, ListView):
     """Search and browse digitized works.  Based on Solr index
     of works and pages."""
 
@@ -80,6 +142,8 @@ class DigitizedWorkListView(AjaxTemplateMixin, SolrLastModifiedMixin, ListView):
     def paginate_queryset(self, queryset, page_size):
         """Graceful paginate_queryset override to handle non-numeric inputs.
         Adapted from https://stackoverflow.com/a/61214021/394067"""
+        if isinstance(queryset, SolrQuerySet):
+            queryset = self.get_page_results(queryset, page_size)
         try:
             return super().paginate_queryset(queryset, page_size)
         except Http404:
@@ -93,11 +157,34 @@ class DigitizedWorkListView(AjaxTemplateMixin, SolrLastModifiedMixin, ListView):
             page = paginator.page(1)
             return (paginator, page, page.object_list, page.has_other_pages())
 
+    def get_page_results(self, solrq, page_size):
+        """Query Solr for the requested page of results, so that total count,
+        documents, and facets all come from a single response instead of
+        separate count and result queries. Returns :class:`CachedSearchResults`
+        for use with the paginator, or the queryset unchanged if the page
+        number is not numeric."""
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(
+            self.page_kwarg, 1
+        )
+        try:
+            page_number = max(int(page), 1)
+        except ValueError:
+            # let the paginator handle "last" or invalid page numbers
+            return solrq
+
+        start = (page_number - 1) * page_size
+        page_solrq = solrq[start : start + page_size]
+        # page out of range; the paginator will display the first page
+        if not page_solrq.get_results() and start:
+            page_solrq = solrq[:page_size]
+            page_solrq.get_results()
+        return CachedSearchResults(page_solrq.count(), page_solrq)
+
     def get_queryset(self, **kwargs):
         form_opts = self.request.GET.copy()
         # if relevance sort is requested but there is no keyword search
         # term present, clear it out and fallback to default sort
-        if not self.form_class().has_keyword_query(form_opts):
+        if not self.form_class.has_keyword_query(form_opts):
             if "sort" in form_opts and form_opts["sort"] == "relevance":
                 del form_opts["sort"]
 
@@ -197,18 +284,58 @@ class DigitizedWorkListView(AjaxTemplateMixin, SolrLastModifiedMixin, ListView):
         self.solrq = solr_q
         return solr_q
 
+    def get_cache_key(self):
+        """Cache key for the current page of search results, based on
+        normalized search options and the Solr last modified date.
+        Returns None if search results should not be cached, i.e. if
+        **SEARCH_CACHE_TIMEOUT** is not configured or the Solr last modified
+        date is not available."""
+        if not getattr(settings, "SEARCH_CACHE_TIMEOUT", None):
+            return None
+        last_modified = self.last_modified()
+        if not last_modified:
+            return None
+
+        search_opts = {}
+        for key, val in self.form.cleaned_data.items():
+            # normalize multiple values (e.g. collections) to sorted strings
+            if not isinstance(val, str) and hasattr(val, "__iter__"):
+                val = sorted(str(v) for v in val)
+            search_opts[key] = val
+
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(
+            self.page_kwarg, 1
+        )
+        key_data = json.dumps(
+            [
+                search_opts,
+                # pub date range is used to generate the range facet
+                self.form.pub_date_minmax(),
+                str(page),
+                last_modified.isoformat(),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return "archive-search-%s" % hashlib.sha1(key_data.encode()).hexdigest()
+
     def get_pages(self, solrq):
         """If there is a keyword search, query Solr for matching pages
         with text highlighting.
         NOTE: This has to be done as a separate query because Solr
-        doesn't support highlighting on collapsed items."""
+        doesn't support highlighting on collapsed items; expanded groups
+        and [subquery] documents are not highlighted either. This is the
+        only additional Solr request for a keyword search."""
 
-        if not self.query or not solrq.count():
+        if not self.query:
             # if there is no keyword query, bail out
             return ({}, {})
 
         # work ids in solrq; quoting to handle ark ids
         work_id_l = ['"%s"' % d["id"] for d in solrq]
+        # if no works were found, no need to search pages
+        if not work_id_l:
+            return ({}, {})
 
         # generate a list of page ids from the grouped results
         # NOTE: can't use alias for group_id because not using aliased queryset
@@ -246,36 +373,63 @@ class DigitizedWorkListView(AjaxTemplateMixin, SolrLastModifiedMixin, ListView):
 
         page_groups = facet_ranges = None
 
-        # @NOTE: Here is the logic that may need to change->
-
-        try:
-            # catch an error connecting to solr
-            context = super().get_context_data(**kwargs)
-            # get expanded must be called on the *paginated* solr queryset
-            # in order to get the correct number and set of expanded groups
-            # - get everything from the same solr queryset to avoid extra calls
-            solrq = context["page_obj"].object_list
-
-            page_groups, page_highlights = self.get_pages(solrq)
-
-            facet_dict = solrq.get_facets()
-            self.form.set_choices_from_facets(facet_dict.facet_fields)
-            # needs to be inside try/catch or it will re-trigger any error
-            # @NOTE/@TODO: attrdict's as_dict wasn't working here? casting now
-            facet_ranges = dict(facet_dict.facet_ranges)
-            # facet ranges are used for display; when sending to solr we
-            # increase the end bound by one so that year is included;
-            # subtract it back so display matches user entered dates
-            facet_ranges["pub_date"]["end"] -= 1
-
-        except requests.exceptions.ConnectionError:
-            # override object list with an empty list that can be paginated
-            # so that template display will still work properly
-            self.object_list = self.solrq.none()
+        cache_key = self.get_cache_key()
+        cached_results = cache.get(cache_key) if cache_key else None
+        if cached_results:
+            # paginate cached results without querying solr
+            self.object_list = CachedSearchResults(
+                cached_results["count"], cached_results["docs"]
+            )
             context = super().get_context_data(**kwargs)
-            # NOTE: this error should possibly be raised as a 500 error,
-            # or an error status set on the response
-            context["error"] = "Something went wrong."
+            page_groups = cached_results["page_groups"]
+            page_highlights = cached_results["page_highlights"]
+            self.form.set_choices_from_facets(cached_results["facet_fields"])
+            facet_ranges = cached_results["facet_ranges"]
+
+        else:
+            # @NOTE: Here is the logic that may need to change->
+            try:
+                # catch an error connecting to solr
+                context = super().get_context_data(**kwargs)
+                # get expanded must be called on the *paginated* solr queryset
+                # in order to get the correct number and set of expanded groups
+                # - get everything from the same solr queryset to avoid extra calls
+                solrq = context["page_obj"].object_list
+
+                page_groups, page_highlights = self.get_pages(solrq)
+
+                facet_dict = solrq.get_facets()
+                self.form.set_choices_from_facets(facet_dict.facet_fields)
+                # needs to be inside try/catch or it will re-trigger any error
+                # @NOTE/@TODO: attrdict's as_dict wasn't working here? casting now
+                facet_ranges = dict(facet_dict.facet_ranges)
+                # facet ranges are used for display; when sending to solr we
+                # increase the end bound by one so that year is included;
+                # subtract it back so display matches user entered dates
+                facet_ranges["pub_date"]["end"] -= 1
+
+                if cache_key:
+                    cache.set(
+                        cache_key,
+                        {
+                            "count": context["paginator"].count,
+                            "docs": list(solrq),
+                            "page_groups": page_groups,
+                            "page_highlights": page_highlights,
+                            "facet_fields": dict(facet_dict.facet_fields),
+                            "facet_ranges": facet_ranges,
+                        },
+                        settings.SEARCH_CACHE_TIMEOUT,
+                    )
+
+            except requests.exceptions.ConnectionError:
+                # override object list with an empty list that can be paginated
+                # so that template display will still work properly
+                self.object_list = self.solrq.none()
+                context = super().get_context_data(**kwargs)
+                # NOTE: this error should possibly be raised as a 500 error,
+                # or an error status set on the response
+                context["error"] = "Something went wrong."
 
         set(page_groups.keys())
         set(page_highlights.keys())
@@ -294,15 +448,15 @@ class DigitizedWorkListView(AjaxTemplateMixin, SolrLastModifiedMixin, ListView):
                 "page_description": self.meta_description,
                 # dict of source tooltip notes keyed on source label
                 # (as that's what is indexed)
-                "source_notes": {
-                    sn.get_source_display(): sn.note for sn in SourceNote.objects.all()
-                },
+                "source_notes": SearchRegistry.source_notes(),
             }
         )
         return context
 
 
-class DigitizedWorkDetailView(AjaxTemplateMixin, SolrLastModifiedMixin, DetailView):
+class DigitizedWorkDetailView(
+    AjaxTemplateMixin, CachedSolrLastModifiedMixin, DetailView
+):
     """Display details for a single digitized work. If a work has been
     surpressed, returns a 410 Gone response."""
 
@@ -396,29 +550,17 @@ class DigitizedWorkDetailView(AjaxTemplateMixin, SolrLastModifiedMixin, DetailVi
 
         # search within a volume only supported for content with full text
         if query and digwork.has_fulltext:
-            # search on the specified search terms,
-            # filter on digitized work source id and page type,
-            # sort by page order,
-            # only return fields needed for page result display,
-            # configure highlighting on page text content
-            solr_pageq = (
-                # NOTE: Addition of an aliased queryset changes the _s keys below
-                PageSearchQuerySet()
-                .search(content="(%s)" % query)
-                .filter(group_id='"%s"' % digwork.index_id(), item_type="page")
-                .highlight("content", snippets=3, method="unified")
-                .order_by("order")
-            )
-
             try:
-                paginator = GracefulPaginator(solr_pageq, per_page=self.paginate_by)
+                # paginate the ids of all matching pages, then retrieve
+                # page content and highlights for the current page only
+                page_ids = self.get_matching_page_ids(digwork, query)
+                paginator = GracefulPaginator(page_ids, per_page=self.paginate_by)
                 page_num = self.request.GET.get("page", 1)
                 current_page = paginator.page(page_num)
-                paged_result = current_page.object_list
-                # don't try to get highlights if there are no results
-                highlights = (
-                    paged_result.get_highlighting() if paged_result.count() else {}
+                results, highlights = self.get_page_results(
+                    digwork, query, current_page.object_list
                 )
+                current_page.object_list = results
 
                 context.update(
                     {
@@ -429,10 +571,135 @@ class DigitizedWorkDetailView(AjaxTemplateMixin, SolrLastModifiedMixin, DetailVi
                     }
                 )
 
+                # when enabled and results are cached, retrieve the next page
+                # of results in the background so it is ready if the user
+                # pages forward
+                if (
+                    current_page.has_next()
+                    and self.search_cache_timeout()
+                    and getattr(settings, "SEARCH_WITHIN_PREFETCH", False)
+                ):
+                    next_page = paginator.page(current_page.next_page_number())
+                    self.prefetch_next_page(digwork, query, next_page.object_list)
+
             except requests.exceptions.ConnectionError:
                 context["error"] = "Something went wrong."
         return context
 
+    @staticmethod
+    def search_cache_timeout():
+        """Number of seconds to cache search within results, if configured"""
+        return getattr(settings, "SEARCH_CACHE_TIMEOUT", None)
+
+    def get_cache_key(self, digwork, query, *args):
+        """Cache key for search within results, based on work, query,
+        and Solr last modified date for the work. Returns None if results
+        should not be cached."""
+        if not self.search_cache_timeout():
+            return None
+        last_modified = self.last_modified()
+        if not last_modified:
+            return None
+        key_data = json.dumps(
+            [digwork.index_id(), query, last_modified.isoformat()] + list(args)
+        )
+        return "search-within-%s" % hashlib.sha1(key_data.encode()).hexdigest()
+
+    def get_matching_page_ids(self, digwork, query):
+        """Get the list of ids for all pages in a work matching the query,
+        in page order. The list is cached when caching is configured,
+        so paging through results does not search Solr again."""
+        cache_key = self.get_cache_key(digwork, query)
+        if cache_key:
+            page_ids = cache.get(cache_key)
+            if page_ids is not None:
+                return page_ids
+
+        # search on the specified search terms,
+        # filter on digitized work source id and page type,
+        # sort by page order, and only return page ids
+        solr_pageq = (
+            PageSearchQuerySet()
+            .search(content="(%s)" % query)
+            .filter(group_id='"%s"' % digwork.index_id(), item_type="page")
+            .order_by("order")
+            .only("id")
+        )
+        # database page count is usually the maximum number of matches; use
+        # it to get all ids in one request (or a count query if unset)
+        rows = digwork.page_count or solr_pageq.count()
+        page_ids = [page["id"] for page in solr_pageq.get_results(rows=rows)]
+        # page count may be out of date or not match pages indexed in Solr;
+        # use the total from the response to get any remaining matches
+        total = solr_pageq.count()
+        if total > len(page_ids):
+            page_ids.extend(
+                page["id"]
+                for page in solr_pageq.get_results(
+                    start=len(page_ids), rows=total - len(page_ids)
+                )
+            )
+        if cache_key:
+            cache.set(cache_key, page_ids, self.search_cache_timeout())
+        return page_ids
+
+    def get_page_results(self, digwork, query, page_ids):
+        """Get page results and highlights for a list of page ids. Results
+        are cached when caching is configured. Returns a tuple of
+        result list and highlights dictionary."""
+        # don't search if there are no results
+        if not page_ids:
+            return ([], {})
+
+        cache_key = self.get_cache_key(digwork, query, page_ids)
+        if cache_key:
+            cached_results = cache.get(cache_key)
+            if cached_results is not None:
+                return cached_results
+
+        results = self.search_page_results(query, page_ids)
+        if cache_key:
+            cache.set(cache_key, results, self.search_cache_timeout())
+        return results
+
+    @staticmethod
+    def search_page_results(query, page_ids):
+        """Search Solr for page results and highlights for a list of
+        page ids. Returns a tuple of result list and highlights dictionary."""
+        # only return fields needed for page result display;
+        # search on the query terms to configure highlighting on page text content
+        solr_pageq = (
+            # NOTE: Addition of an aliased queryset changes the _s keys below
+            PageSearchQuerySet()
+            .search(content="(%s)" % query)
+            .filter(id__in=['"%s"' % page_id for page_id in page_ids])
+            .highlight("content", snippets=3, method="unified")
+            .order_by("order")
+        )
+        return (
+            solr_pageq.get_results(rows=len(page_ids)),
+            solr_pageq.get_highlighting(),
+        )
+
+    def prefetch_next_page(self, digwork, query, page_ids):
+        """Queue page results to be retrieved and cached by the shared
+        prefetch worker. Skipped if the results are already cached or
+        already queued."""
+        cache_key = self.get_cache_key(digwork, query, page_ids)
+        if not cache_key or cache.has_key(cache_key):
+            return
+        with _prefetch_lock:
+            if cache_key in _prefetch_pending:
+                return
+            _prefetch_pending.add(cache_key)
+        get_prefetch_executor().submit(
+            prefetch_page_results,
+            query,
+            list(page_ids),
+            cache_key,
+            self.search_cache_timeout(),
+        )
+
 
 class DigitizedWorkByRecordId(RedirectView):
     """Redirect from DigitizedWork record id to detail view when possible.
@@ -518,7 +785,7 @@ class AddToCollection(PermissionRequiredMixin, ListView, FormView):
                 # previous digitized works in set.
                 collection.digitizedwork_set.add(*digitized_works)
             # reindex solr with the new collection data
-            DigitizedWork.index_items(digitized_works)
+            IndexJob.submit(IndexJob.WORK, digitized_works)
 
             # create a success message to add to message framework stating
             # what happened
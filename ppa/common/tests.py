@@ -1,13 +1,19 @@
-from unittest.mock import Mock
+from datetime import datetime
+from unittest.mock import Mock, patch
 
 from django.contrib.auth.models import Group, User
+from django.core.cache import cache
 from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from wagtail.models import Page, Site
 
 from ppa.archive.views import DigitizedWorkListView
 from ppa.common.admin import LocalUserAdmin
-from ppa.common.views import AjaxTemplateMixin, VaryOnHeadersMixin
+from ppa.common.views import (
+    AjaxTemplateMixin,
+    CachedSolrLastModifiedMixin,
+    VaryOnHeadersMixin,
+)
 
 
 class TestLocalUserAdmin(TestCase):
@@ -74,6 +80,43 @@ class TestAjaxTemplateMixin(TestCase):
         assert myview.get_template_names() == MyAjaxyView.ajax_template_name
 
 
+@patch("ppa.common.views.SolrLastModifiedMixin.last_modified")
+class TestCachedSolrLastModifiedMixin(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_last_modified(self, mock_last_modified):
+        mock_last_modified.return_value = datetime(2024, 1, 1)
+        # no cache timeout configured; only looked up once per view/request
+        with override_settings(SEARCH_CACHE_TIMEOUT=None):
+            view = CachedSolrLastModifiedMixin()
+            assert view.last_modified() == mock_last_modified.return_value
+            assert view.last_modified() == mock_last_modified.return_value
+            assert mock_last_modified.call_count == 1
+            assert CachedSolrLastModifiedMixin().last_modified()
+            assert mock_last_modified.call_count == 2
+
+        # with search cache enabled, last modified is cached across requests
+        mock_last_modified.reset_mock()
+        with override_settings(SEARCH_CACHE_TIMEOUT=300):
+            assert CachedSolrLastModifiedMixin().last_modified()
+            assert CachedSolrLastModifiedMixin().last_modified()
+            assert mock_last_modified.call_count == 1
+            # filters are included in the cache key
+            view = CachedSolrLastModifiedMixin()
+            view.solr_lastmodified_filters = {"item_type": "work"}
+            assert view.last_modified()
+            assert mock_last_modified.call_count == 2
+
+    def test_last_modified_error(self, mock_last_modified):
+        # last modified not available; should not be cached
+        mock_last_modified.return_value = None
+        with override_settings(SEARCH_CACHE_TIMEOUT=300):
+            assert CachedSolrLastModifiedMixin().last_modified() is None
+            assert CachedSolrLastModifiedMixin().last_modified() is None
+            assert mock_last_modified.call_count == 2
+
+
 class TestRobotsTxt(TestCase):
     def test_robots_txt(self):
         res = self.client.get("/robots.txt")
@@ -1,5 +1,11 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.cache import patch_vary_headers
 from django.views.generic.base import TemplateResponseMixin, View
+from parasolr.django.views import SolrLastModifiedMixin
 
 
 class VaryOnHeadersMixin(View):
@@ -36,3 +42,40 @@ class AjaxTemplateMixin(TemplateResponseMixin, VaryOnHeadersMixin):
         if self.request.headers.get("x-requested-with") == "XMLHttpRequest":
             return self.ajax_template_name
         return super().get_template_names()
+
+
+class CachedSolrLastModifiedMixin(SolrLastModifiedMixin):
+    """Extend :class:`parasolr.django.views.SolrLastModifiedMixin` to
+    look up the Solr last modified date once per request. When
+    **SEARCH_CACHE_TIMEOUT** is configured in Django settings, the date is
+    also cached for :attr:`lastmodified_cache_timeout` seconds, so that it
+    can be used to check cached Solr results without querying Solr.
+    """
+
+    #: number of seconds to cache the Solr last modified date
+    lastmodified_cache_timeout = 60
+
+    def last_modified(self):
+        """Return Solr last modified date, using the cached value when
+        available."""
+        if not hasattr(self, "_last_modified"):
+            cache_key = None
+            if getattr(settings, "SEARCH_CACHE_TIMEOUT", None):
+                cache_key = (
+                    "solr-last-modified-%s"
+                    % hashlib.sha1(
+                        json.dumps(
+                            self.get_solr_lastmodified_filters(),
+                            sort_keys=True,
+                            default=str,
+                        ).encode()
+                    ).hexdigest()
+                )
+            last_modified = cache.get(cache_key) if cache_key else None
+            if last_modified is None:
+                last_modified = super().last_modified()
+                # don't cache if last modified could not be retrieved
+                if cache_key and last_modified:
+                    cache.set(cache_key, last_modified, self.lastmodified_cache_timeout)
+            self._last_modified = last_modified
+        return self._last_modified
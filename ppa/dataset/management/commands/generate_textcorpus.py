@@ -8,6 +8,11 @@ The full text corpus is generated from Solr; it does not include content
 for suppressed works or their pages (note that this depends on Solr
 content being current).
 
+Alternatively, with `--from-source`, page content is generated directly
+from source data (HathiTrust pairtree, Gale local OCR, EEBO-TCP xml) with
+the same logic used for indexing pages, in parallel processes, so that
+an export does not require a fully loaded Solr index.
+
 Example usage:
 
     - Default behavior::
@@ -34,34 +39,87 @@ Example usage:
 
         python manage.py generate_textcorpus --check
 
+    - Export pages to sharded files of about 100,000 pages each,
+      using 4 processes::
+
+        python manage.py generate_textcorpus --shard-size 100000 --processes 4
+
+    - Export pages from source data instead of Solr::
+
+        python manage.py generate_textcorpus --from-source --processes 8
+
+    - Save pages and metadata as Parquet files::
+
+        python manage.py generate_textcorpus --format parquet
+
+    - Resume an interrupted sharded export, skipping completed shards::
+
+        python manage.py generate_textcorpus --path ~/ppa_solr_corpus \
+            --shard-size 100000 --resume
+
+    - Export only works and pages that changed since a previous export::
+
+        python manage.py generate_textcorpus --since ~/ppa_solr_corpus
+
 Notes:
 
     - Default path is ``ppa_corpus_DATETIME`` in the current working directory,
       where DATETIME is the export date + time as YYYY-MM-DD_hh:mm:ss.
     - Default batch size is 10,000 (Solr record iteration size, chosen
-      based on performance).
+      based on performance). Records are retrieved from Solr with
+      cursor-based deep paging, so later batches are as fast as earlier ones.
+    - Parquet output is compressed with zstd, with dictionary encoding for
+      work id, label, and tags; pages are written in row groups
+      (``--row-group-size``), ordered by page id, so that pages for a
+      single work can be read without reading the whole file.
+    - Sharded export partitions works with pages indexed in Solr by work id,
+      and writes each shard to ``ppa_pages-NNNN.jsonl.gz``. The partition
+      is saved in ``ppa_pages_shards.json`` so that an interrupted export
+      can be resumed; shard files are only created when a shard is complete
+      and the number of pages exported matches the number of pages in Solr
+      when works were partitioned.
+    - Each export saves the last-modified time, content fingerprint, and
+      digital page range for every work in ``ppa_release.json``. With
+      `--since`, these are compared with a previous export to generate a
+      delta release: metadata for added and changed works, and pages for
+      works that are new or whose content or page range has changed.
+      Added, changed, and removed work ids are listed in ``ppa_delta.json``;
+      to apply a delta, remove pages for works listed under pages removed
+      or replaced, and add the new pages. Exports made before release
+      information was saved can be used with `--since`, but only work
+      last-modified times are compared.
 
 """
 
 import argparse
 import csv
+import itertools
 import json
 import pathlib
 import shutil
+import textwrap
+from collections import deque
+from contextlib import ExitStack
 from collections.abc import Generator
 from datetime import datetime
 
 import orjsonl
+import pyarrow as pa
+import pyarrow.parquet as pq
 from django.core.management.base import CommandError
+from django.db import connections
+from django.utils import timezone
+from multiprocess import Pool, cpu_count
 from parasolr.django import SolrQuerySet
 from progressbar import progressbar
 
 
-from ppa.archive.models import DigitizedWork
+from ppa.archive.models import DigitizedWork, Page
 from ppa.archive.management.commands import index_pages
 from ppa.archive.solr import PageSearchQuerySet
 
 DEFAULT_BATCH_SIZE = 10000
+DEFAULT_ROW_GROUP_SIZE = 10000
 TIMESTAMP_FMT = "%Y-%m-%d_%H%M%S"
 
 
@@ -70,6 +128,247 @@ app_dir = pathlib.Path(__file__).parent.parent.parent
 data_package_path = app_dir / "ppa_datapackage.json"
 
 
+#: parquet schema for page output
+PAGE_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("work_id", pa.string()),
+        ("order", pa.int32()),
+        ("label", pa.string()),
+        ("tags", pa.list_(pa.string())),
+        ("text", pa.string()),
+    ]
+)
+
+
+def parquet_writer(path, schema):
+    """
+    Initialize a Parquet writer with the specified schema, with zstd
+    compression and dictionary encoding for work id, label, and tags.
+    """
+    dictionary_fields = []
+    for name in ("work_id", "label", "tags"):
+        if name not in schema.names:
+            continue
+        # dictionary encoding applies to leaf columns; for list columns,
+        # use the path of the list elements in the parquet schema
+        if pa.types.is_list(schema.field(name).type):
+            name = f"{name}.list.element"
+        dictionary_fields.append(name)
+    return pq.ParquetWriter(
+        path, schema, compression="zstd", use_dictionary=dictionary_fields
+    )
+
+
+def save_parquet(path, rows, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Save an iterable of dictionaries as a Parquet file with the specified
+    schema, writing one row group at a time so that rows do not need to be
+    held in memory. Returns the number of rows written.
+    """
+    total = 0
+    with parquet_writer(path, schema) as writer:
+        for batch in itertools.batched(rows, row_group_size):
+            writer.write_table(
+                pa.Table.from_pylist(batch, schema=schema),
+                row_group_size=row_group_size,
+            )
+            total += len(batch)
+    return total
+
+
+class JSONArrayWriter:
+    """
+    Write dictionaries to a file as a JSON array one at a time,
+    with the same output as :func:`json.dump` with `indent` for a list,
+    so that the list does not need to be held in memory.
+    Call :meth:`close` after the last item to end the array.
+    """
+
+    def __init__(self, fileobj, indent=2):
+        self.fileobj = fileobj
+        self.indent = indent
+        self.count = 0
+
+    def write(self, item):
+        """Write one item to the array"""
+        self.fileobj.write("[\n" if not self.count else ",\n")
+        self.fileobj.write(
+            textwrap.indent(json.dumps(item, indent=self.indent), " " * self.indent)
+        )
+        self.count += 1
+
+    def close(self):
+        """End the array"""
+        self.fileobj.write("\n]" if self.count else "[]")
+
+
+def save_pages_file(path, pages, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Save page data to a file; format is determined by file extension:
+    Parquet for `.parquet`, otherwise jsonl (compressed for `.gz`).
+    """
+    if path.suffix == ".parquet":
+        save_parquet(path, pages, PAGE_SCHEMA, row_group_size)
+    else:
+        orjsonl.save(path, pages)
+
+
+def iter_solr_cursor(qset, batch_size, limit=None):
+    """
+    Returns a generator of documents for a Solr queryset, retrieved in
+    batches using Solr cursorMark deep paging, which (unlike paging by
+    offset) does not get slower for later batches. The queryset must be
+    sorted on the unique key field (`id`). Stops after `limit` documents,
+    if specified. Raises :class:`~django.core.management.base.CommandError`
+    if a query fails, so that results are never silently incomplete.
+    """
+    cursor = "*"
+    total = 0
+    while limit is None or total < limit:
+        rows = batch_size if limit is None else min(batch_size, limit - total)
+        response = qset.get_response(rows=rows, cursorMark=cursor)
+        # if there is a query error, no response is returned
+        if response is None:
+            raise CommandError(
+                f"Solr query failed after {total:,} documents; export is incomplete"
+            )
+        if not response.docs:
+            return
+        for doc in response.docs:
+            yield qset.get_result_document(doc)
+        total += len(response.docs)
+        # cursor is unchanged when there are no more results
+        next_cursor = response.response.get("nextCursorMark")
+        if not next_cursor or next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+def solr_quote(value):
+    """Quote a string value for use as a term in a Solr query"""
+    return '"%s"' % value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def partition_works(pages_per_work, shard_size):
+    """
+    Partition works into shards of roughly `shard_size` pages, based
+    on a dictionary of work id and page count. Works are sorted by id and
+    never split across shards. Returns a list of lists of work ids.
+    """
+    shards = []
+    shard = []
+    shard_pages = 0
+    for work_id in sorted(pages_per_work):
+        shard.append(work_id)
+        shard_pages += pages_per_work[work_id]
+        if shard_pages >= shard_size:
+            shards.append(shard)
+            shard = []
+            shard_pages = 0
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def page_export_data(page_data):
+    """
+    Convert page index data (as generated by
+    :meth:`~ppa.archive.models.Page.page_index_data`) to page export fields,
+    matching the pages returned from Solr: empty values are omitted.
+    """
+    return {
+        field: page_data[solr_field]
+        for field, solr_field in Command.FIELDLIST["page"].items()
+        if page_data.get(solr_field) not in (None, [])
+    }
+
+
+def source_page_data(work_id):
+    """
+    Generate page export data for a single digitized work (by database id)
+    from source content, using page indexing logic. Returns a list of pages,
+    sorted by page id to match the order of pages exported from Solr.
+    """
+    try:
+        digwork = DigitizedWork.objects.select_related("cluster").get(pk=work_id)
+    except DigitizedWork.DoesNotExist:
+        # work was deleted after the export started
+        return []
+    pages = sorted(Page.page_index_data(digwork), key=lambda page: page["id"])
+    return [page_export_data(page) for page in pages]
+
+
+def export_page_shard(
+    shard_path,
+    work_ids,
+    batch_size,
+    from_source=False,
+    row_group_size=DEFAULT_ROW_GROUP_SIZE,
+    expected_count=None,
+):
+    """
+    Export pages for one shard of works to a jsonl file (compressed if the
+    filename ends with `.gz`) or Parquet file (`.parquet`). Pages are
+    retrieved from Solr, with works identified by work id; or, if
+    `from_source` is true, generated from source content, with works
+    identified by database id.
+    Pages are written to a temporary file and moved into place when
+    complete, so that shard files are only present for completed shards;
+    if `expected_count` is specified and the number of pages exported
+    does not match, the temporary file is removed and an error is raised.
+    If `shard_path` is None (i.e., dry run), pages are retrieved but
+    not saved. Returns the number of pages exported.
+    """
+    if from_source:
+        shard_pages = itertools.chain.from_iterable(
+            source_page_data(work_id) for work_id in work_ids
+        )
+    else:
+        # works in a shard are a contiguous range of sorted work ids;
+        # filter by range so query size does not depend on number of works
+        qset = (
+            SolrQuerySet()
+            .filter(item_type="page")
+            .filter(
+                "group_id_s:[%s TO %s]"
+                % (solr_quote(work_ids[0]), solr_quote(work_ids[-1]))
+            )
+            .order_by("id")
+            .only(**Command.FIELDLIST["page"])
+        )
+        shard_pages = iter_solr_cursor(qset, batch_size)
+    page_count = 0
+
+    def pages():
+        nonlocal page_count
+        for page in shard_pages:
+            page_count += 1
+            yield page
+
+    def check_count(name):
+        if expected_count is not None and page_count != expected_count:
+            raise CommandError(
+                f"Exported {page_count:,} pages for {name}; "
+                + f"expected {expected_count:,}"
+            )
+
+    if shard_path is None:
+        deque(pages(), maxlen=0)
+        check_count("shard")
+    else:
+        # keep the file extension so the same format and compression is used
+        tmp_path = shard_path.with_name(f".tmp-{shard_path.name}")
+        save_pages_file(tmp_path, pages(), row_group_size)
+        try:
+            check_count(shard_path.name)
+        except CommandError:
+            tmp_path.unlink()
+            raise
+        tmp_path.replace(shard_path)
+    return page_count
+
+
 class Command(index_pages.Command):
     """
     Custom manage command to generate a text corpus from text indexed in Solr.
@@ -128,10 +427,23 @@ class Command(index_pages.Command):
         "book_journal_s": "book_journal",
     }
 
+    #: parquet types for work metadata fields that are not strings
+    work_field_parquet_types = {
+        "pub_year": pa.int32(),
+        "page_count": pa.int32(),
+        "collections": pa.list_(pa.string()),
+    }
+
     #: multivalue delimiter for CSV output (only applies to collections)
     multival_delimiter = ";"
     #: optional behavior to generate metadata export only
     metadata_only = False
+    #: maximum number of work ids to include in a single Solr query
+    work_id_batch_size = 100
+    #: work ids to include in metadata and page export (all if None);
+    #: limited to added and changed works for a delta export
+    metadata_works = None
+    page_works = None
 
     # Argument parsing
     def add_arguments(self, parser):
@@ -163,6 +475,20 @@ class Command(index_pages.Command):
             help="Number of docs to query from solr at one time",
         )
 
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "parquet"],
+            default="jsonl",
+            help="Output format for pages; with parquet, metadata is also "
+            "saved as parquet [default: %(default)s]",
+        )
+        parser.add_argument(
+            "--row-group-size",
+            type=int,
+            default=DEFAULT_ROW_GROUP_SIZE,
+            help="Number of rows per row group for parquet output "
+            "[default: %(default)s]",
+        )
         # control compression of pages jsonl output (enabled by default)
         parser.add_argument(
             "--gzip",
@@ -199,6 +525,41 @@ class Command(index_pages.Command):
             action=argparse.BooleanOptionalAction,
             default=False,
         )
+        # sharded page export
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=None,
+            help="Save pages in sharded files of approximately this many pages "
+            "(ppa_pages-NNNN.jsonl.gz), partitioned by work",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=cpu_count(),
+            help="Number of processes to use for sharded export or export "
+            "from source (cpu_count by default: %(default)s)",
+        )
+        parser.add_argument(
+            "--from-source",
+            action="store_true",
+            help="Generate page content from source data instead of Solr",
+            default=False,
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume a sharded export in an existing path, "
+            "skipping shards that are already complete",
+            default=False,
+        )
+        parser.add_argument(
+            "--since",
+            type=pathlib.Path,
+            default=None,
+            help="Path to a previous export; only export works and pages "
+            "that have been added or changed since that export",
+        )
 
     #### SOLR ####
 
@@ -225,15 +586,7 @@ class Command(index_pages.Command):
             total = min(total, self.doclimit)
 
         # define a generator to iterate solr with
-        batch_iterator = (
-            result
-            for step in range(0, total, self.batch_size)
-            for result in qset[
-                step : (step + self.batch_size)
-                if (step + self.batch_size) < total
-                else total
-            ]
-        )
+        batch_iterator = iter_solr_cursor(qset, self.batch_size, limit=total)
 
         # if progress bar is enabled, wrap the generator
         if self.progress:
@@ -244,14 +597,36 @@ class Command(index_pages.Command):
         # yield from this generator
         yield from batch_iterator
 
+    def iter_works(self) -> Generator[DigitizedWork]:
+        """
+        Returns a generator of works to be included in the dataset,
+        retrieved from the database in chunks with collections prefetched
+        for each chunk (as for Solr indexing), so that works are not all
+        loaded into memory and the number of queries does not depend on
+        the number of works.
+        """
+        chunk_size = DigitizedWork.index_chunk_size
+        # sort by id (index id = source id + first page), to match previous implementation
+        works = (
+            DigitizedWork.items_to_index()
+            .prefetch_related(None)
+            .order_by("source_id", "pages_orig")
+            .iterator(chunk_size=chunk_size)
+        )
+        for chunk in itertools.batched(works, chunk_size):
+            yield from DigitizedWork.prep_index_chunk(list(chunk))
+
     def work_metadata(self) -> Generator[dict[str, str | list[str] | int]]:
         """
         Returns a generator of dictionaries with work-level metadata.
         """
-        # sort by id (index id = source id + first page), to match previous implementation
-        for digwork in DigitizedWork.items_to_index().order_by(
-            "source_id", "pages_orig"
-        ):
+        for digwork in self.iter_works():
+            # for a delta export, skip works that have not changed
+            if (
+                self.metadata_works is not None
+                and digwork.index_id() not in self.metadata_works
+            ):
+                continue
             # use Solr index data as starting point
             work_data = digwork.index_data()
             # rename index data fields to output field names
@@ -287,9 +662,76 @@ class Command(index_pages.Command):
     # save pages
     def iter_pages(self):
         """
-        Yield results from :meth:`iter_solr` with `item_type=page`
+        Yield results from :meth:`iter_solr` with `item_type=page`,
+        or from :meth:`iter_source_pages` when exporting from source.
+        For a delta export from Solr, yields results from
+        :meth:`iter_solr_work_pages` for works with page changes.
+        """
+        if self.from_source:
+            yield from self.iter_source_pages()
+        elif self.page_works is not None:
+            yield from self.iter_solr_work_pages(self.page_works)
+        else:
+            yield from self.iter_solr(item_type="page")
+
+    def iter_solr_work_pages(self, work_ids):
+        """
+        Returns a generator of pages indexed in Solr for the specified works.
+        Works are queried in batches of :attr:`work_id_batch_size` ids,
+        so that the size of each request does not depend on the number of
+        works. Pages are ordered by work id and then page id.
+        """
+        batches = list(itertools.batched(sorted(work_ids), self.work_id_batch_size))
+        if self.progress:
+            batches = progressbar(
+                batches, max_value=len(batches), prefix="Exporting pages: "
+            )
+        pages = itertools.chain.from_iterable(
+            iter_solr_cursor(
+                self.query_set.filter(item_type="page")
+                # use terms query parser to filter on a batch of work ids
+                # without escaping ids or running into boolean clause limits
+                .filter("{!terms f=group_id_s}%s" % ",".join(batch))
+                .order_by("id")
+                .only(**self.FIELDLIST["page"]),
+                self.batch_size,
+            )
+            for batch in batches
+        )
+        if self.doclimit:
+            pages = itertools.islice(pages, self.doclimit)
+        yield from pages
+
+    def iter_source_pages(self):
+        """
+        Returns a generator of page export data generated from source
+        content for all works to be included in the dataset,
+        using a pool of processes. Works are ordered by work id.
         """
-        yield from self.iter_solr(item_type="page")
+        works = sorted(DigitizedWork.items_to_index(), key=lambda w: w.index_id())
+        if self.page_works is not None:
+            works = [
+                digwork for digwork in works if digwork.index_id() in self.page_works
+            ]
+        if not works:
+            raise CommandError("No works found for page export.")
+        work_ids = [digwork.pk for digwork in works]
+
+        # close database connections so they are not shared with child processes
+        connections.close_all()
+        with Pool(self.processes) as pool:
+            # imap preserves work order
+            work_pages = pool.imap(source_page_data, work_ids, chunksize=10)
+            if self.progress:
+                work_pages = progressbar(
+                    work_pages,
+                    max_value=len(work_ids),
+                    prefix="Exporting pages from source: ",
+                )
+            pages = itertools.chain.from_iterable(work_pages)
+            if self.doclimit:
+                pages = itertools.islice(pages, self.doclimit)
+            yield from pages
 
     def metadata_for_csv(self, data: Generator | list) -> Generator:
         """
@@ -306,36 +748,363 @@ class Command(index_pages.Command):
     ### saving to file
     def save_metadata(self):
         """
-        Save the work-level metadata as a json file
+        Save the work-level metadata as json and csv files, and as a
+        parquet file for parquet output. Metadata is generated once and
+        written to all files in batches, so that metadata for all works
+        does not need to be held in memory.
         """
         # get work-level metadata
-        # convert to a list so we can output twice
-        data = list(self.work_metadata())
+        data = self.work_metadata()
 
-        # save if not a dry run
-        if not self.is_dry_run:
-            # save data as json
-            with open(self.path_works_json, "w") as of:
-                json.dump(data, of, indent=2)
+        # consume the generator without saving for a dry run
+        if self.is_dry_run:
+            deque(data, maxlen=0)
+            return
 
+        with ExitStack() as stack:
+            # save data as json
+            json_writer = JSONArrayWriter(
+                stack.enter_context(open(self.path_works_json, "w"))
+            )
             # save data as csv
-            with open(self.path_works_csv, "w", newline="") as csvfile:
-                # fieldnames are defined on the class
-                writer = csv.DictWriter(csvfile, fieldnames=self.work_fields)
-                writer.writeheader()
-                writer.writerows(self.metadata_for_csv(data))
+            csvfile = stack.enter_context(open(self.path_works_csv, "w", newline=""))
+            # fieldnames are defined on the class
+            csv_writer = csv.DictWriter(csvfile, fieldnames=self.work_fields)
+            csv_writer.writeheader()
+            # save data as parquet, one row group per batch
+            pq_writer = None
+            if self.format == "parquet":
+                schema = pa.schema(
+                    [
+                        (field, self.work_field_parquet_types.get(field, pa.string()))
+                        for field in self.work_fields
+                    ]
+                )
+                pq_writer = stack.enter_context(
+                    parquet_writer(self.path_works_parquet, schema)
+                )
+
+            for batch in itertools.batched(data, self.row_group_size):
+                for work in batch:
+                    json_writer.write(work)
+                csv_writer.writerows(self.metadata_for_csv(batch))
+                if pq_writer:
+                    pq_writer.write_table(
+                        pa.Table.from_pylist(batch, schema=schema),
+                        row_group_size=self.row_group_size,
+                    )
+            json_writer.close()
 
     def save_pages(self):
         """
-        Save the page-level data as a jsonl file
+        Save the page-level data as a jsonl file, or as sharded
+        jsonl files if a shard size is configured.
         """
+        if self.shard_size:
+            return self.save_page_shards()
+
         ### save pages
-        if self.is_dry_run:
+        if self.page_works is not None and not self.page_works:
+            # delta export with no changed pages; save an empty pages file
+            if not self.is_dry_run:
+                save_pages_file(self.path_pages_json, [], self.row_group_size)
+        elif self.is_dry_run:
             # consume the generator
             list(self.iter_pages())
         else:
-            # save to jsonl or jsonl.gz
-            orjsonl.save(self.path_pages_json, self.iter_pages())
+            # save to jsonl, jsonl.gz, or parquet
+            save_pages_file(
+                self.path_pages_json, self.iter_pages(), self.row_group_size
+            )
+
+    def pages_per_work(self) -> dict[str | int, int]:
+        """
+        Number of pages indexed in Solr for each work, as a dictionary
+        keyed on work id; used to partition works for sharded export.
+        When exporting from source, uses page counts in the database,
+        keyed on database id.
+        """
+        if self.from_source:
+            return {
+                pk: page_count or 0
+                for pk, page_count in DigitizedWork.items_to_index().values_list(
+                    "pk", "page_count"
+                )
+            }
+
+        facets = (
+            SolrQuerySet()
+            .filter(item_type="page")
+            .facet("group_id_s", limit=-1, mincount=1)
+            .get_facets()
+        )
+        return dict(facets.facet_fields["group_id_s"])
+
+    def get_shards(self) -> tuple[list[list[str]], list[int | None]]:
+        """
+        Get the partition of works into shards for sharded page export,
+        and the expected number of pages for each shard (None when
+        exporting from source, since database page counts may not match
+        pages generated from source).
+        When resuming, uses the partition saved by the previous run;
+        otherwise, partitions works with pages in Solr and saves the partition
+        in the output directory (unless this is a dry run).
+        """
+        source = "database" if self.from_source else "solr"
+        if self.resume and self.path_shards.exists():
+            with self.path_shards.open() as shardfile:
+                shard_info = json.load(shardfile)
+            # work ids for shards depend on the page source
+            if shard_info.get("source", "solr") != source:
+                raise CommandError(
+                    f"Cannot resume export from {shard_info['source']} "
+                    + f"as export from {source}"
+                )
+            shards = shard_info["shards"]
+            return shards, shard_info.get("pages", [None] * len(shards))
+
+        pages_per_work = self.pages_per_work()
+        shards = partition_works(pages_per_work, self.shard_size)
+        if not shards:
+            raise CommandError(
+                "No works found for page export."
+                if self.from_source
+                else "No page records found in Solr."
+            )
+        if self.from_source:
+            shard_pages = [None] * len(shards)
+        else:
+            shard_pages = [
+                sum(pages_per_work[work_id] for work_id in work_ids)
+                for work_ids in shards
+            ]
+        if not self.is_dry_run:
+            with self.path_shards.open("w") as shardfile:
+                json.dump(
+                    {
+                        "source": source,
+                        "shard_size": self.shard_size,
+                        "shards": shards,
+                        "pages": shard_pages,
+                    },
+                    shardfile,
+                )
+        return shards, shard_pages
+
+    def save_page_shards(self):
+        """
+        Save page-level data as sharded jsonl files, exporting
+        shards in parallel with the configured number of processes.
+        When resuming, shards that are already complete are skipped.
+        """
+        shards, shard_pages = self.get_shards()
+        self.page_shard_paths = []
+        tasks = []
+        for i, (work_ids, page_count) in enumerate(zip(shards, shard_pages), 1):
+            shard_path = self.path / f"ppa_pages-{i:04d}.{self.pages_ext}"
+            self.page_shard_paths.append(shard_path)
+            if self.resume and shard_path.exists():
+                continue
+            tasks.append(
+                (
+                    None if self.is_dry_run else shard_path,
+                    work_ids,
+                    self.batch_size,
+                    self.from_source,
+                    self.row_group_size,
+                    page_count,
+                )
+            )
+
+        skipped = len(shards) - len(tasks)
+        if skipped and self.verbosity >= self.v_normal:
+            self.stdout.write(f"Skipping {skipped:,} completed shards")
+
+        if not tasks:
+            return
+
+        # close database connections so they are not shared with child processes
+        connections.close_all()
+        with Pool(min(self.processes, len(tasks))) as pool:
+            results = pool.imap_unordered(lambda task: export_page_shard(*task), tasks)
+            if self.progress:
+                results = progressbar(
+                    results, max_value=len(tasks), prefix="Exporting page shards: "
+                )
+            total = sum(results)
+
+        if self.verbosity > self.v_normal:
+            self.stdout.write(f"Exported {total:,} pages in {len(tasks):,} shards")
+
+    def save_datapackage(self):
+        """
+        Copy the data package file to the output folder; for sharded
+        export, the pages resource is updated to list the shard files,
+        and for parquet output, resources are updated to reference
+        the parquet files.
+        """
+        # copy data package file to export dir (replaces if already present)
+        export_datapackage = self.path / data_package_path.name
+        if not self.shard_size and self.format != "parquet":
+            shutil.copy(data_package_path, export_datapackage)
+            return
+
+        with data_package_path.open() as datapackage_file:
+            datapackage = json.load(datapackage_file)
+        for resource in datapackage["resources"]:
+            if self.format == "parquet":
+                resource.update(
+                    {
+                        "format": "parquet",
+                        "mediatype": "application/vnd.apache.parquet",
+                    }
+                )
+                # not applicable to parquet
+                for key in ["encoding", "compression", "dialect"]:
+                    resource.pop(key, None)
+                for field in resource["schema"]["fields"]:
+                    # multivalued fields are stored as lists
+                    if field["name"] == "collections":
+                        field["type"] = "array"
+
+            if resource["name"] == "ppa_metadata" and self.format == "parquet":
+                resource["path"] = self.path_works_parquet.name
+            elif resource["name"] == "ppa_pages":
+                if self.shard_size:
+                    resource["path"] = [path.name for path in self.page_shard_paths]
+                else:
+                    resource["path"] = self.path_pages_json.name
+        with export_datapackage.open("w") as datapackage_file:
+            json.dump(datapackage, datapackage_file, indent=2)
+
+    ### delta releases
+
+    def work_release_state(self, digwork) -> dict[str, str | None]:
+        """
+        Release information for a single work, used to determine
+        whether a work has changed between exports: last modified time,
+        fingerprint of page content, and digital page range.
+        When exporting from source, the fingerprint is for current source
+        content; otherwise, for the content last indexed in Solr.
+        """
+        if self.from_source:
+            fingerprint = digwork.get_content_fingerprint()
+        else:
+            fingerprint = digwork.content_fingerprint
+        return {
+            "updated": digwork.updated.isoformat(),
+            "fingerprint": fingerprint or None,
+            "pages_digital": str(digwork.pages_digital),
+        }
+
+    def release_state(self) -> dict[str, dict[str, str | None]]:
+        """
+        Release information for all works to be included in the
+        dataset, as a dictionary keyed on work id.
+        """
+        # collections are not needed; iterate in chunks
+        works = (
+            DigitizedWork.items_to_index()
+            .prefetch_related(None)
+            .iterator(chunk_size=DigitizedWork.index_chunk_size)
+        )
+        return {
+            digwork.index_id(): self.work_release_state(digwork) for digwork in works
+        }
+
+    def load_release_state(self, path: pathlib.Path) -> dict:
+        """
+        Load release information from a previous export. For exports made
+        before release information was saved, work ids and last modified
+        times are loaded from the work metadata.
+        """
+        release_path = path / self.path_release.name
+        if release_path.exists():
+            with release_path.open() as release_file:
+                return json.load(release_file)
+
+        works_path = path / self.path_works_json.name
+        if not works_path.exists():
+            raise CommandError(f"No previous export found in {path}")
+        with works_path.open() as works_file:
+            works = json.load(works_file)
+        return {
+            "exported": None,
+            "works": {
+                work["work_id"]: {"updated": work.get("updated")} for work in works
+            },
+        }
+
+    def compare_releases(self, previous: dict, current: dict) -> dict:
+        """
+        Compare release information for a previous and current export.
+        Works are changed when any release information available for both
+        exports differs; pages are replaced for new works, and for changed
+        works when the content fingerprint or digital page range differs
+        (or is not known for the previous export). Returns a delta
+        dictionary with lists of work ids.
+        """
+        added = sorted(current.keys() - previous.keys())
+        removed = sorted(previous.keys() - current.keys())
+        changed = []
+        pages_replaced = list(added)
+        for work_id in sorted(current.keys() & previous.keys()):
+            prev_state = previous[work_id]
+            state = current[work_id]
+            if any(state[key] != prev_state[key] for key in prev_state.keys() & state):
+                changed.append(work_id)
+                if any(
+                    key not in prev_state or state[key] != prev_state[key]
+                    for key in ["fingerprint", "pages_digital"]
+                ):
+                    pages_replaced.append(work_id)
+        return {
+            "works": {"added": added, "changed": changed, "removed": removed},
+            # pages for removed works are removed; pages for other
+            # works with content changes are replaced with the new pages
+            "pages": {"replaced": sorted(pages_replaced), "removed": removed},
+        }
+
+    def prepare_delta(self):
+        """
+        Compare the current works with the previous export specified
+        by `--since`, and limit metadata and page export to works that
+        have been added or changed.
+        """
+        previous = self.load_release_state(self.since)
+        self.delta = self.compare_releases(previous["works"], self.release["works"])
+        self.delta.update(
+            {
+                "since": str(self.since),
+                "previous_export": previous.get("exported"),
+                "exported": self.release["exported"],
+            }
+        )
+        self.metadata_works = set(
+            self.delta["works"]["added"] + self.delta["works"]["changed"]
+        )
+        self.page_works = set(self.delta["pages"]["replaced"])
+
+        if self.verbosity >= self.v_normal:
+            works = self.delta["works"]
+            self.stdout.write(
+                f"Changes since {self.since}: {len(works['added']):,} added, "
+                + f"{len(works['changed']):,} changed, "
+                + f"{len(works['removed']):,} removed works; "
+                + f"pages for {len(self.page_works):,} works"
+            )
+
+    def save_release(self):
+        """
+        Save release information for all works, so this export can be
+        used as the basis for a later delta export; for a delta export,
+        also save the delta manifest.
+        """
+        with self.path_release.open("w") as release_file:
+            json.dump(self.release, release_file, indent=2)
+        if self.delta is not None:
+            with self.path_delta.open("w") as delta_file:
+                json.dump(self.delta, delta_file, indent=2)
 
     ### running script
 
@@ -350,8 +1119,17 @@ class Command(index_pages.Command):
 
         self.path_works_json = self.path / "ppa_metadata.json"
         self.path_works_csv = self.path / "ppa_metadata.csv"
-        jsonl_ext = "jsonl.gz" if options.get("gzip") else "jsonl"
-        self.path_pages_json = self.path / f"ppa_pages.{jsonl_ext}"
+        self.path_works_parquet = self.path / "ppa_metadata.parquet"
+        self.format = options.get("format") or "jsonl"
+        self.row_group_size = options.get("row_group_size") or DEFAULT_ROW_GROUP_SIZE
+        if self.format == "parquet":
+            self.pages_ext = "parquet"
+        else:
+            self.pages_ext = "jsonl.gz" if options.get("gzip") else "jsonl"
+        self.path_pages_json = self.path / f"ppa_pages.{self.pages_ext}"
+        self.path_shards = self.path / "ppa_pages_shards.json"
+        self.path_release = self.path / "ppa_release.json"
+        self.path_delta = self.path / "ppa_delta.json"
 
         self.metadata_only = options.get("metadata_only", False)
         self.is_dry_run = options.get("dry_run")
@@ -360,7 +1138,17 @@ class Command(index_pages.Command):
         self.progress = options.get("progress")
         self.batch_size = options.get("batch_size", DEFAULT_BATCH_SIZE)
         self.check = options.get("check")
+        self.shard_size = options.get("shard_size")
+        self.processes = options.get("processes") or cpu_count()
+        self.resume = options.get("resume", False)
+        self.from_source = options.get("from_source", False)
+        self.since = options.get("since")
         self.query_set = SolrQuerySet()
+        # release information and delta; reset work ids to limit export
+        self.release = None
+        self.delta = None
+        self.metadata_works = None
+        self.page_works = None
 
     def check_workcount(self):
         """
@@ -416,6 +1204,10 @@ class Command(index_pages.Command):
 
     def handle(self, *args, **options):
         self.set_params(*args, **options)
+        if self.shard_size and self.doclimit:
+            raise CommandError("--doc-limit is not supported for sharded export")
+        if self.since and self.shard_size:
+            raise CommandError("--since is not supported for sharded export")
 
         # when requested, check totals for works and pages before exporting
         if self.check:
@@ -428,6 +1220,17 @@ class Command(index_pages.Command):
                 self.stdout.write(f"Saving files in {self.path}")
             self.path.mkdir(exist_ok=True)
 
+        # get release information for current works; compare with
+        # a previous export to generate a delta
+        if self.since or not self.is_dry_run:
+            self.release = {
+                "exported": timezone.now().isoformat(),
+                "source": "database" if self.from_source else "solr",
+                "works": self.release_state(),
+            }
+        if self.since:
+            self.prepare_delta()
+
         # save metadata
         self.save_metadata()
         # save pages unless running in metadata-only mode
@@ -436,13 +1239,13 @@ class Command(index_pages.Command):
 
         # copy datapackage file to output folder, unless running in
         #  metadata-only mode or dry-run
+        if not self.is_dry_run:
+            self.save_release()
         if not self.metadata_only and not self.is_dry_run:
-            # copy data package file to export dir (replaces if already present)
-            export_datapackage = self.path / data_package_path.name
-            shutil.copy(data_package_path, export_datapackage)
+            self.save_datapackage()
             # NOTE: pages path & compression in depends on gzip flag
             # alert user to update manually
-            if self.path_pages_json.suffix != ".gz":
+            if self.path_pages_json.suffix not in [".gz", ".parquet"]:
                 self.stdout.write(
                     "NOTE: datapackage for pages must be updated manually "
                     + "(default: .gz + compression)"
@@ -5,17 +5,19 @@ import os
 import types
 from collections import deque
 from datetime import datetime, timedelta
+from io import StringIO
 from time import sleep
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import orjsonl
+import pyarrow.parquet as pq
 import pytest
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from parasolr.django import SolrClient, SolrQuerySet
 
 from ppa.dataset.management.commands import generate_textcorpus
-from ppa.archive.models import DigitizedWork, Page
+from ppa.archive.models import DigitizedWork, IndexJob, Page
 
 # fixture test content; indexed by sample_works fixture
 sample_page_content = [
@@ -92,17 +94,704 @@ def test_iter_solr_pages(sample_works):
             assert result_fields == expected_page_fields
 
 
+def mock_cursor_response(docs, next_cursor):
+    # mock solr response for cursor-based paging
+    return Mock(docs=docs, response={"nextCursorMark": next_cursor})
+
+
 def test_iter_solr_pages_mock(mock_solr_queryset):
     # mock so we can inspect call
     cmd = init_cmd()
     cmd.query_set = mock_solr_queryset()()
     # count is required for batching logic
     cmd.query_set.count.return_value = 10
+    cmd.query_set.get_response.return_value = mock_cursor_response([], "*")
     list(cmd.iter_solr(item_type="page"))
     # assertion needs to test after we begin/consume generator
     cmd.query_set.filter.assert_called_with(item_type="page")
     cmd.query_set.order_by.assert_called_with("id")
     cmd.query_set.only.assert_called_with(**cmd.FIELDLIST["page"])
+    # total is less than batch size
+    cmd.query_set.get_response.assert_called_with(rows=10, cursorMark="*")
+
+
+def test_iter_solr_cursor(mock_solr_queryset):
+    qset = mock_solr_queryset()()
+    qset.get_result_document.side_effect = lambda doc: doc
+    qset.get_response.side_effect = [
+        mock_cursor_response([{"id": 1}, {"id": 2}], "AoE1"),
+        mock_cursor_response([{"id": 3}], "AoE2"),
+        # cursor is unchanged when results are exhausted
+        mock_cursor_response([], "AoE2"),
+    ]
+    docs = generate_textcorpus.iter_solr_cursor(qset, 2)
+    assert isinstance(docs, types.GeneratorType)
+    assert list(docs) == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert qset.get_response.call_count == 3
+    qset.get_response.assert_any_call(rows=2, cursorMark="*")
+    qset.get_response.assert_any_call(rows=2, cursorMark="AoE1")
+    qset.get_response.assert_any_call(rows=2, cursorMark="AoE2")
+
+    # stops at limit
+    qset.get_response.reset_mock()
+    qset.get_response.side_effect = [
+        mock_cursor_response([{"id": 1}, {"id": 2}], "AoE1"),
+        mock_cursor_response([{"id": 3}], "AoE2"),
+    ]
+    assert len(list(generate_textcorpus.iter_solr_cursor(qset, 2, limit=3))) == 3
+    qset.get_response.assert_called_with(rows=1, cursorMark="AoE1")
+
+    # query error is an error, not the end of results
+    qset.get_response.side_effect = [
+        mock_cursor_response([{"id": 1}, {"id": 2}], "AoE1"),
+        None,
+    ]
+    docs = generate_textcorpus.iter_solr_cursor(qset, 2)
+    with pytest.raises(CommandError, match="Solr query failed after 2 documents"):
+        list(docs)
+
+
+def test_solr_quote():
+    assert generate_textcorpus.solr_quote("chi.123") == '"chi.123"'
+    assert generate_textcorpus.solr_quote('a"b\\c') == '"a\\"b\\\\c"'
+
+
+def test_partition_works():
+    pages_per_work = {"c": 5, "a": 10, "b": 3, "d": 1, "e": 20}
+    assert generate_textcorpus.partition_works(pages_per_work, 10) == [
+        ["a"],
+        ["b", "c", "d", "e"],
+    ]
+    assert generate_textcorpus.partition_works(pages_per_work, 100) == [
+        ["a", "b", "c", "d", "e"]
+    ]
+    assert generate_textcorpus.partition_works({}, 10) == []
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.iter_solr_cursor")
+def test_export_page_shard(mock_iter_solr_cursor, mock_solr_queryset, tmp_path):
+    pages = [{"id": "a.1", "text": "one"}, {"id": "a.2", "text": "two"}]
+    mock_iter_solr_cursor.side_effect = lambda *args: iter(pages)
+    with patch(
+        "ppa.dataset.management.commands.generate_textcorpus.SolrQuerySet",
+        new=mock_solr_queryset(),
+    ) as mock_queryset_cls:
+        shard_path = tmp_path / "ppa_pages-0001.jsonl.gz"
+        assert (
+            generate_textcorpus.export_page_shard(shard_path, ["a", "b", "c"], 50) == 2
+        )
+        mock_qs = mock_queryset_cls.return_value
+        mock_qs.filter.assert_any_call(item_type="page")
+        # filter on the range of work ids in the shard
+        mock_qs.filter.assert_any_call('group_id_s:["a" TO "c"]')
+        mock_qs.order_by.assert_called_with("id")
+        mock_iter_solr_cursor.assert_called_with(mock_qs, 50)
+        assert orjsonl.load(shard_path) == pages
+        # temporary file is renamed on completion
+        assert list(tmp_path.iterdir()) == [shard_path]
+
+        # dry run
+        assert generate_textcorpus.export_page_shard(None, ["a"], 50) == 2
+
+        # expected page count matches
+        shard_path.unlink()
+        assert (
+            generate_textcorpus.export_page_shard(
+                shard_path, ["a"], 50, expected_count=2
+            )
+            == 2
+        )
+        assert shard_path.exists()
+
+        # page count mismatch: shard file is not created
+        shard_path.unlink()
+        with pytest.raises(CommandError, match="Exported 2 pages .* expected 3"):
+            generate_textcorpus.export_page_shard(
+                shard_path, ["a"], 50, expected_count=3
+            )
+        assert list(tmp_path.iterdir()) == []
+        with pytest.raises(CommandError, match="expected 3"):
+            generate_textcorpus.export_page_shard(None, ["a"], 50, expected_count=3)
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.Pool")
+@patch("ppa.dataset.management.commands.generate_textcorpus.export_page_shard")
+@patch("ppa.dataset.management.commands.generate_textcorpus.Command.pages_per_work")
+def test_save_page_shards(
+    mock_pages_per_work, mock_export_page_shard, mock_pool, tmp_path
+):
+    # run tasks in this process
+    mock_pool.return_value.__enter__.return_value.imap_unordered.side_effect = map
+    mock_pages_per_work.return_value = {"a": 10, "b": 5, "c": 8}
+    mock_export_page_shard.return_value = 10
+    cmd = init_cmd(path=tmp_path, gzip=True, shard_size=10, processes=4)
+    cmd.stdout = StringIO()
+    cmd.save_pages()
+
+    shard_paths = [tmp_path / f"ppa_pages-000{i}.jsonl.gz" for i in (1, 2)]
+    assert cmd.page_shard_paths == shard_paths
+    mock_pool.assert_called_with(2)
+    mock_export_page_shard.assert_any_call(
+        shard_paths[0], ["a"], cmd.batch_size, False, cmd.row_group_size, 10
+    )
+    mock_export_page_shard.assert_any_call(
+        shard_paths[1], ["b", "c"], cmd.batch_size, False, cmd.row_group_size, 13
+    )
+    # partition and expected page counts are saved
+    with cmd.path_shards.open() as shardfile:
+        assert json.load(shardfile) == {
+            "source": "solr",
+            "shard_size": 10,
+            "shards": [["a"], ["b", "c"]],
+            "pages": [10, 13],
+        }
+
+    # resume; skip completed shards and use saved partition
+    shard_paths[0].touch()
+    mock_export_page_shard.reset_mock()
+    mock_pages_per_work.reset_mock()
+    cmd = init_cmd(path=tmp_path, gzip=True, shard_size=10, resume=True)
+    cmd.stdout = StringIO()
+    cmd.save_pages()
+    mock_pages_per_work.assert_not_called()
+    mock_export_page_shard.assert_called_once_with(
+        shard_paths[1], ["b", "c"], cmd.batch_size, False, cmd.row_group_size, 13
+    )
+    assert "Skipping 1 completed shards" in cmd.stdout.getvalue()
+
+    # can't resume with a different page source
+    cmd = init_cmd(path=tmp_path, shard_size=10, resume=True, from_source=True)
+    with pytest.raises(CommandError, match="Cannot resume export from solr"):
+        cmd.save_pages()
+
+    # nothing indexed
+    mock_pages_per_work.return_value = {}
+    cmd = init_cmd(path=tmp_path, shard_size=10)
+    with pytest.raises(CommandError, match="No page records found in Solr"):
+        cmd.save_pages()
+
+
+def test_page_export_data():
+    page_data = {
+        "id": "abc.0001",
+        "source_id": "abc",
+        "group_id_s": "abc",
+        "cluster_id_s": "abc",
+        "order": 1,
+        "label": "i",
+        "tags": [],
+        "content": "page text",
+        "item_type": "page",
+    }
+    assert generate_textcorpus.page_export_data(page_data) == {
+        "id": "abc.0001",
+        "work_id": "abc",
+        "order": 1,
+        "label": "i",
+        "text": "page text",
+    }
+    page_data.update({"tags": ["local_ocr"], "content": None})
+    export_data = generate_textcorpus.page_export_data(page_data)
+    assert export_data["tags"] == ["local_ocr"]
+    assert "text" not in export_data
+
+
+@pytest.mark.django_db
+@patch("ppa.dataset.management.commands.generate_textcorpus.Page")
+def test_source_page_data(mock_page):
+    call_command("loaddata", "sample_digitized_works")
+    digwork = DigitizedWork.objects.first()
+    mock_page.page_index_data.return_value = iter(
+        [
+            {"id": "abc.10", "group_id_s": "abc", "order": 10, "label": "10"},
+            {"id": "abc.09", "group_id_s": "abc", "order": 9, "label": "9"},
+        ]
+    )
+    page_data = generate_textcorpus.source_page_data(digwork.pk)
+    mock_page.page_index_data.assert_called_with(digwork)
+    # sorted by id, converted to export fields
+    assert page_data == [
+        {"id": "abc.09", "work_id": "abc", "order": 9, "label": "9"},
+        {"id": "abc.10", "work_id": "abc", "order": 10, "label": "10"},
+    ]
+    # deleted work
+    assert generate_textcorpus.source_page_data(-1) == []
+
+
+@pytest.mark.django_db
+@patch("ppa.dataset.management.commands.generate_textcorpus.Pool")
+def test_iter_source_pages(mock_pool):
+    call_command("loaddata", "sample_digitized_works")
+    mock_imap = mock_pool.return_value.__enter__.return_value.imap
+    mock_imap.return_value = iter([[{"id": "a.1"}, {"id": "a.2"}], [{"id": "b.1"}]])
+    cmd = init_cmd(from_source=True, processes=3, progress=False)
+    assert list(cmd.iter_pages()) == [{"id": "a.1"}, {"id": "a.2"}, {"id": "b.1"}]
+    mock_pool.assert_called_with(3)
+    # called with database ids for works, ordered by work id
+    works = sorted(DigitizedWork.items_to_index(), key=lambda w: w.index_id())
+    assert mock_imap.call_args.args == (
+        generate_textcorpus.source_page_data,
+        [w.pk for w in works],
+    )
+
+    # doc limit
+    mock_imap.return_value = iter([[{"id": "a.1"}, {"id": "a.2"}], [{"id": "b.1"}]])
+    cmd = init_cmd(from_source=True, progress=False, doc_limit=2)
+    assert len(list(cmd.iter_pages())) == 2
+
+
+@pytest.mark.django_db
+def test_iter_source_pages_empty():
+    cmd = init_cmd(from_source=True)
+    with pytest.raises(CommandError, match="No works found"):
+        list(cmd.iter_pages())
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.source_page_data")
+def test_export_page_shard_from_source(mock_source_page_data, tmp_path):
+    mock_source_page_data.side_effect = lambda work_id: [{"id": f"{work_id}.1"}]
+    shard_path = tmp_path / "ppa_pages-0001.jsonl"
+    assert (
+        generate_textcorpus.export_page_shard(shard_path, [1, 2], 50, from_source=True)
+        == 2
+    )
+    assert orjsonl.load(shard_path) == [{"id": "1.1"}, {"id": "2.1"}]
+
+
+@pytest.mark.django_db
+def test_pages_per_work_from_source():
+    call_command("loaddata", "sample_digitized_works")
+    cmd = init_cmd(from_source=True)
+    pages_per_work = cmd.pages_per_work()
+    assert pages_per_work == {
+        work.pk: work.page_count or 0 for work in DigitizedWork.items_to_index()
+    }
+
+
+def test_save_parquet(tmp_path):
+    pages = [
+        {
+            "id": f"work{i // 3}.{i}",
+            "work_id": f"work{i // 3}",
+            "order": i,
+            "label": str(i),
+            "tags": ["local_ocr"] if i % 2 else [],
+            "text": f"page {i}",
+        }
+        for i in range(7)
+    ]
+    # page without optional fields
+    pages.append({"id": "work3.1", "work_id": "work3", "order": 1, "label": "1"})
+    parquet_path = tmp_path / "ppa_pages.parquet"
+    assert (
+        generate_textcorpus.save_parquet(
+            parquet_path, iter(pages), generate_textcorpus.PAGE_SCHEMA, 3
+        )
+        == 8
+    )
+    parquet_file = pq.ParquetFile(parquet_path)
+    assert parquet_file.schema_arrow == generate_textcorpus.PAGE_SCHEMA
+    assert parquet_file.metadata.num_rows == 8
+    assert parquet_file.metadata.num_row_groups == 3
+    row_group = parquet_file.metadata.row_group(0)
+    columns = {
+        row_group.column(i).path_in_schema: row_group.column(i)
+        for i in range(row_group.num_columns)
+    }
+    assert columns["work_id"].compression == "ZSTD"
+    assert "RLE_DICTIONARY" in columns["work_id"].encodings
+    assert "RLE_DICTIONARY" in columns["label"].encodings
+    assert "RLE_DICTIONARY" in columns["tags.list.element"].encodings
+    assert "RLE_DICTIONARY" not in columns["text"].encodings
+
+    # read pages for a single work
+    work_pages = pq.read_table(parquet_path, filters=[("work_id", "=", "work1")])
+    assert work_pages.column("id").to_pylist() == ["work1.3", "work1.4", "work1.5"]
+    rows = pq.read_table(parquet_path).to_pylist()
+    assert rows[1] == pages[1]
+    assert rows[-1]["tags"] is None
+    assert rows[-1]["text"] is None
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.orjsonl")
+@patch("ppa.dataset.management.commands.generate_textcorpus.save_parquet")
+def test_save_pages_file(mock_save_parquet, mock_orjsonl, tmp_path):
+    pages = [{"id": "a.1"}]
+    generate_textcorpus.save_pages_file(tmp_path / "ppa_pages.parquet", pages, 50)
+    mock_save_parquet.assert_called_with(
+        tmp_path / "ppa_pages.parquet", pages, generate_textcorpus.PAGE_SCHEMA, 50
+    )
+    mock_orjsonl.save.assert_not_called()
+    generate_textcorpus.save_pages_file(tmp_path / "ppa_pages.jsonl.gz", pages)
+    mock_orjsonl.save.assert_called_with(tmp_path / "ppa_pages.jsonl.gz", pages)
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.Command.work_metadata")
+def test_save_metadata_parquet(mock_work_metadata, tmp_path):
+    work_data = [
+        {
+            "work_id": "abc",
+            "source_id": "abc",
+            "title": "Title",
+            "pub_year": 1801,
+            "page_count": 10,
+            "collections": ["Literary", "Linguistic"],
+            "added": "2020-01-01T00:00:00+00:00",
+        },
+        {"work_id": "def", "source_id": "def", "collections": ["Uncategorized"]},
+    ]
+    mock_work_metadata.return_value = iter(work_data)
+    cmd = init_cmd(path=tmp_path, format="parquet")
+    cmd.save_metadata()
+    assert cmd.path_works_json.exists()
+    assert cmd.path_works_csv.exists()
+    table = pq.read_table(cmd.path_works_parquet)
+    # all work fields are included, in order
+    assert table.column_names == cmd.work_fields
+    rows = table.to_pylist()
+    assert rows[0]["collections"] == ["Literary", "Linguistic"]
+    assert rows[0]["pub_year"] == 1801
+    assert rows[1]["title"] is None
+
+    # not saved for default format
+    cmd.path_works_parquet.unlink()
+    mock_work_metadata.return_value = iter(work_data)
+    cmd = init_cmd(path=tmp_path)
+    cmd.save_metadata()
+    assert not cmd.path_works_parquet.exists()
+
+
+@pytest.mark.parametrize(
+    "items", [[], [{"a": 1}], [{"a": 1, "b": ["x", "y"]}, {"c": "line\nbreak"}]]
+)
+def test_json_array_writer(items):
+    output = StringIO()
+    writer = generate_textcorpus.JSONArrayWriter(output)
+    for item in items:
+        writer.write(item)
+    writer.close()
+    # output should match json dump of the complete list
+    assert output.getvalue() == json.dumps(items, indent=2)
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.Command.work_metadata")
+def test_save_metadata_batches(mock_work_metadata, tmp_path):
+    work_data = [
+        {"work_id": f"w{i}", "source_id": f"w{i}", "collections": ["Literary"]}
+        for i in range(5)
+    ]
+    mock_work_metadata.return_value = iter(work_data)
+    cmd = init_cmd(path=tmp_path, format="parquet", row_group_size=2)
+    cmd.save_metadata()
+    # metadata is generated once
+    assert mock_work_metadata.call_count == 1
+    with cmd.path_works_json.open() as jsonfile:
+        assert json.load(jsonfile) == work_data
+    with cmd.path_works_csv.open(newline="") as csvfile:
+        assert [row["work_id"] for row in csv.DictReader(csvfile)] == [
+            work["work_id"] for work in work_data
+        ]
+    # one row group per batch
+    parquet_file = pq.ParquetFile(cmd.path_works_parquet)
+    assert parquet_file.metadata.num_rows == 5
+    assert parquet_file.metadata.num_row_groups == 3
+
+    # no works: empty json array, csv header only
+    mock_work_metadata.return_value = iter([])
+    cmd.save_metadata()
+    assert cmd.path_works_json.read_text() == "[]"
+    with cmd.path_works_csv.open(newline="") as csvfile:
+        assert list(csv.DictReader(csvfile)) == []
+
+
+@pytest.mark.django_db
+def test_work_metadata_queries(django_assert_num_queries):
+    call_command("loaddata", "sample_digitized_works")
+    DigitizedWork.objects.first().collections.create(name="Flotsam")
+    cmd = init_cmd()
+    total = DigitizedWork.items_to_index().count()
+    # one query for works and one to prefetch collections for each chunk
+    with django_assert_num_queries(2):
+        assert len(list(cmd.work_metadata())) == total
+    with patch.object(DigitizedWork, "index_chunk_size", 2):
+        with django_assert_num_queries(1 + -(-total // 2)):
+            work_data = list(cmd.work_metadata())
+    # sorted by work id
+    assert [work["work_id"] for work in work_data] == sorted(
+        work["work_id"] for work in work_data
+    )
+    assert any(work["collections"] == ["Flotsam"] for work in work_data)
+
+
+def test_save_datapackage_parquet(tmp_path):
+    cmd = init_cmd(path=tmp_path, format="parquet")
+    assert cmd.path_pages_json == tmp_path / "ppa_pages.parquet"
+    cmd.save_datapackage()
+    with (tmp_path / generate_textcorpus.data_package_path.name).open() as dpfile:
+        datapackage = json.load(dpfile)
+    resources = {res["name"]: res for res in datapackage["resources"]}
+    assert resources["ppa_metadata"]["path"] == "ppa_metadata.parquet"
+    assert resources["ppa_pages"]["path"] == "ppa_pages.parquet"
+    for resource in resources.values():
+        assert resource["format"] == "parquet"
+        assert resource["mediatype"] == "application/vnd.apache.parquet"
+        assert "compression" not in resource
+        assert "dialect" not in resource
+    collections_field = [
+        field
+        for field in resources["ppa_metadata"]["schema"]["fields"]
+        if field["name"] == "collections"
+    ][0]
+    assert collections_field["type"] == "array"
+
+
+def test_save_datapackage(tmp_path):
+    cmd = init_cmd(path=tmp_path)
+    cmd.save_datapackage()
+    export_datapackage = tmp_path / generate_textcorpus.data_package_path.name
+    assert export_datapackage.read_text() == (
+        generate_textcorpus.data_package_path.read_text()
+    )
+
+    # sharded export lists shard files for pages resource
+    cmd = init_cmd(path=tmp_path, shard_size=10)
+    cmd.page_shard_paths = [tmp_path / "ppa_pages-0001.jsonl.gz"]
+    cmd.save_datapackage()
+    with export_datapackage.open() as datapackage_file:
+        datapackage = json.load(datapackage_file)
+    pages_resource = [
+        res for res in datapackage["resources"] if res["name"] == "ppa_pages"
+    ][0]
+    assert pages_resource["path"] == ["ppa_pages-0001.jsonl.gz"]
+
+
+def test_handle_shard_doclimit(tmp_path):
+    with pytest.raises(CommandError, match="not supported for sharded export"):
+        call_command("generate_textcorpus", path=tmp_path, shard_size=10, doc_limit=10)
+
+
+def test_handle_shard_since(tmp_path):
+    with pytest.raises(CommandError, match="not supported for sharded export"):
+        call_command(
+            "generate_textcorpus", path=tmp_path, shard_size=10, since=tmp_path
+        )
+
+
+@pytest.mark.django_db
+def test_work_release_state():
+    call_command("loaddata", "sample_digitized_works")
+    digwork = DigitizedWork.objects.first()
+    digwork.content_fingerprint = "abc123"
+    cmd = init_cmd()
+    assert cmd.work_release_state(digwork) == {
+        "updated": digwork.updated.isoformat(),
+        "fingerprint": "abc123",
+        "pages_digital": str(digwork.pages_digital),
+    }
+    # from source: uses fingerprint for current source content
+    cmd = init_cmd(from_source=True)
+    with patch.object(digwork, "get_content_fingerprint", return_value="def456"):
+        assert cmd.work_release_state(digwork)["fingerprint"] == "def456"
+    # no fingerprint
+    with patch.object(digwork, "get_content_fingerprint", return_value=None):
+        assert cmd.work_release_state(digwork)["fingerprint"] is None
+
+    # release state includes all works to be indexed
+    release = cmd.release_state()
+    assert set(release) == {work.index_id() for work in DigitizedWork.items_to_index()}
+
+
+def test_load_release_state(tmp_path):
+    cmd = init_cmd(path=tmp_path / "new")
+    # no previous export
+    with pytest.raises(CommandError, match="No previous export found"):
+        cmd.load_release_state(tmp_path)
+
+    # export without release information: use work metadata
+    with (tmp_path / "ppa_metadata.json").open("w") as works_file:
+        json.dump([{"work_id": "a", "title": "A", "updated": "2020-01-01"}], works_file)
+    assert cmd.load_release_state(tmp_path) == {
+        "exported": None,
+        "works": {"a": {"updated": "2020-01-01"}},
+    }
+
+    # release information is used when present
+    release = {"exported": "2024-01-01", "works": {"a": {"updated": "2021-01-01"}}}
+    with (tmp_path / "ppa_release.json").open("w") as release_file:
+        json.dump(release, release_file)
+    assert cmd.load_release_state(tmp_path) == release
+
+
+def test_compare_releases():
+    cmd = init_cmd()
+    state = {"updated": "2020-01-01", "fingerprint": "abc", "pages_digital": "1-10"}
+    previous = {
+        "same": state,
+        "metadata": state,
+        "content": state,
+        "pages": state,
+        "removed": state,
+        "old": {"updated": "2020-01-01"},
+        "old_changed": {"updated": "2020-01-01"},
+    }
+    current = {
+        "same": state,
+        "metadata": {**state, "updated": "2021-01-01"},
+        "content": {**state, "fingerprint": "def"},
+        "pages": {**state, "updated": "2021-01-01", "pages_digital": "2-10"},
+        "added": state,
+        "old": state,
+        "old_changed": {**state, "updated": "2021-01-01"},
+    }
+    delta = cmd.compare_releases(previous, current)
+    assert delta["works"] == {
+        "added": ["added"],
+        "changed": ["content", "metadata", "old_changed", "pages"],
+        "removed": ["removed"],
+    }
+    # pages replaced for new works, content and page range changes,
+    # and changed works without previous fingerprint
+    assert delta["pages"] == {
+        "replaced": ["added", "content", "old_changed", "pages"],
+        "removed": ["removed"],
+    }
+
+
+@pytest.mark.django_db
+def test_prepare_delta(tmp_path):
+    call_command("loaddata", "sample_digitized_works")
+    works = list(DigitizedWork.items_to_index())
+    cmd = init_cmd(path=tmp_path / "new", since=tmp_path, verbosity=0)
+    current = cmd.release_state()
+    # previous export: first work changed, second work not yet added
+    previous = {work_id: state.copy() for work_id, state in current.items()}
+    previous[works[0].index_id()]["updated"] = "2020-01-01T00:00:00+00:00"
+    del previous[works[1].index_id()]
+    previous["removed.123"] = {"updated": "2020-01-01T00:00:00+00:00"}
+    with (tmp_path / "ppa_release.json").open("w") as release_file:
+        json.dump({"exported": "2024-01-01", "works": previous}, release_file)
+
+    cmd.release = {"exported": "2025-01-01", "works": current}
+    cmd.prepare_delta()
+    assert cmd.delta["since"] == str(tmp_path)
+    assert cmd.delta["previous_export"] == "2024-01-01"
+    assert cmd.delta["exported"] == "2025-01-01"
+    assert cmd.delta["works"]["removed"] == ["removed.123"]
+    assert cmd.metadata_works == {works[0].index_id(), works[1].index_id()}
+    # metadata change only; pages only for the added work
+    assert cmd.page_works == {works[1].index_id()}
+
+    # metadata export is limited to added and changed works
+    assert {work["work_id"] for work in cmd.work_metadata()} == cmd.metadata_works
+
+    # save release information and delta manifest
+    cmd.path.mkdir()
+    cmd.save_release()
+    with cmd.path_release.open() as release_file:
+        assert json.load(release_file) == cmd.release
+    with cmd.path_delta.open() as delta_file:
+        assert json.load(delta_file) == cmd.delta
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.iter_solr_cursor")
+def test_iter_solr_work_pages(mock_iter_solr_cursor, mock_solr_queryset):
+    mock_iter_solr_cursor.side_effect = lambda qset, batch_size: iter(
+        [{"id": f"{len(mock_iter_solr_cursor.call_args_list)}.1"}]
+    )
+    cmd = init_cmd(progress=False)
+    cmd.query_set = mock_solr_queryset()()
+    # large number of changed works
+    work_ids = {f"mdp.{i:08d}" for i in range(2550)}
+    cmd.page_works = work_ids
+    pages = list(cmd.iter_pages())
+    # one cursor stream for each batch of work ids
+    assert len(pages) == 26
+    assert mock_iter_solr_cursor.call_count == 26
+    id_filters = [
+        args[0]
+        for args, _ in cmd.query_set.filter.call_args_list
+        if args and args[0].startswith("{!terms f=group_id_s}")
+    ]
+    assert len(id_filters) == 26
+    batches = [
+        id_filter.removeprefix("{!terms f=group_id_s}").split(",")
+        for id_filter in id_filters
+    ]
+    # request size is bounded by batch size
+    assert max(len(batch) for batch in batches) == cmd.work_id_batch_size
+    # all works are included, in order
+    assert [work_id for batch in batches for work_id in batch] == sorted(work_ids)
+    cmd.query_set.filter.assert_any_call(item_type="page")
+    cmd.query_set.only.assert_called_with(**cmd.FIELDLIST["page"])
+
+    # doc limit
+    cmd.doclimit = 3
+    assert len(list(cmd.iter_pages())) == 3
+
+
+@patch("ppa.dataset.management.commands.generate_textcorpus.save_pages_file")
+@patch("ppa.dataset.management.commands.generate_textcorpus.Command.iter_pages")
+def test_save_pages_delta_unchanged(mock_iter_pages, mock_save_pages_file, tmp_path):
+    cmd = init_cmd(path=tmp_path)
+    # delta export with no page changes: save empty pages file
+    cmd.page_works = set()
+    cmd.save_pages()
+    mock_iter_pages.assert_not_called()
+    mock_save_pages_file.assert_called_with(cmd.path_pages_json, [], cmd.row_group_size)
+
+
+def test_handle_since(sample_works, tmp_path):
+    previous_dir = tmp_path / "previous"
+    call_command("generate_textcorpus", path=previous_dir, progress=False)
+    assert (previous_dir / "ppa_release.json").exists()
+
+    # change metadata for one work
+    digwork = DigitizedWork.objects.get(source_id="chi.78013704")
+    digwork.title = "A new title"
+    digwork.save()
+
+    output_dir = tmp_path / "delta"
+    call_command(
+        "generate_textcorpus", path=output_dir, since=previous_dir, progress=False
+    )
+    with (output_dir / "ppa_delta.json").open() as delta_file:
+        delta = json.load(delta_file)
+    assert delta["works"] == {
+        "added": [],
+        "changed": [digwork.index_id()],
+        "removed": [],
+    }
+    assert delta["pages"] == {"replaced": [], "removed": []}
+    with (output_dir / "ppa_metadata.json").open() as works_file:
+        works = json.load(works_file)
+    assert [work["work_id"] for work in works] == [digwork.index_id()]
+    assert list(orjsonl.stream(output_dir / "ppa_pages.jsonl.gz")) == []
+
+
+def test_handle_since_reindexed_pages(sample_works, tmp_path):
+    previous_dir = tmp_path / "previous"
+    call_command("generate_textcorpus", path=previous_dir, progress=False)
+
+    # source content changes and pages are reindexed by an indexing job
+    digwork = DigitizedWork.objects.get(source_id="chi.78013704")
+    with patch.object(digwork, "hathi") as mockhathi, patch.object(
+        digwork, "get_content_fingerprint", return_value="def456"
+    ):
+        mockhathi.page_data.return_value = [
+            {"content": "revised page text", "order": 1, "label": 1, "tags": []}
+        ]
+        IndexJob.perform(IndexJob.PAGES, [digwork])
+    assert DigitizedWork.objects.get(pk=digwork.pk).content_fingerprint == "def456"
+
+    output_dir = tmp_path / "delta"
+    call_command(
+        "generate_textcorpus", path=output_dir, since=previous_dir, progress=False
+    )
+    with (output_dir / "ppa_delta.json").open() as delta_file:
+        delta = json.load(delta_file)
+    # pages reindexed outside index_pages are included in the delta
+    assert delta["works"]["changed"] == [digwork.index_id()]
+    assert delta["pages"]["replaced"] == [digwork.index_id()]
 
 
 @pytest.mark.django_db
@@ -332,6 +1021,7 @@ def test_set_params(options, expected, tmp_path):
         assert attr_value == expected_value
 
 
+@pytest.mark.django_db
 @patch("ppa.dataset.management.commands.generate_textcorpus.Command.work_metadata")
 @patch("ppa.dataset.management.commands.generate_textcorpus.Command.iter_pages")
 @patch("ppa.dataset.management.commands.generate_textcorpus.timestamp")
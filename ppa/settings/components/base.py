@@ -22,6 +22,18 @@ ALLOWED_HOSTS = []
 # project specific.
 CACHE_MIDDLEWARE_KEY_PREFIX = PROJECT_APP
 
+# Default cache must be shared by all web and script processes, since it is
+# used to tell every process when collections, source notes, or indexed
+# content have changed. A file-based cache in the project directory is shared
+# by all processes on a server; override in local settings to use
+# memcached or redis when running on multiple servers.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+    }
+}
+
 # URL prefix for static files.
 # Example: "http://media.lawrence.com/static/"
 STATIC_URL = "/static/"
@@ -37,3 +37,9 @@ ALLOWED_HOSTS = ["*"]
 WEBPACK_LOADER = {
     "DEFAULT": {"LOADER_CLASS": "webpack_loader.loaders.FakeWebpackLoader"}
 }
+
+# use an in-memory cache for tests, so tests are isolated
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# check Solr for changes every time collection stats are used
+COLLECTION_STATS_CHECK_INTERVAL = 0